@@ -0,0 +1,132 @@
+"In-process buffer that coalesces client activity and daily visit writes"
+
+import atexit
+import datetime
+import logging
+import threading
+from typing import Optional
+from sqlalchemy.exc import SQLAlchemyError
+from . import config
+from . import database
+from . import models
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """Collects ``last_seen`` timestamps and visit increments in memory.
+
+    Entries are deduplicated per client (only the newest timestamp is kept)
+    and per day, then written in a single transaction by ``flush``. A daemon
+    thread calls ``flush`` every ``flush_interval`` seconds and an ``atexit``
+    hook drains whatever is left on shutdown.
+    """
+
+    def __init__(self, flush_interval: float = 10.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_seen: dict[int, datetime.datetime] = {}
+        self._visits: dict[datetime.date, int] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._exit_hook_registered = False
+
+    def record_seen(self, client_id: int, seen_at: datetime.datetime) -> None:
+        "Remember the latest activity time of a client"
+        with self._lock:
+            previous = self._last_seen.get(client_id)
+            if previous is None or seen_at > previous:
+                self._last_seen[client_id] = seen_at
+
+    def record_visit(self, day: datetime.date, count: int = 1) -> None:
+        "Add visits to the pending counter of the given day"
+        with self._lock:
+            self._visits[day] = self._visits.get(day, 0) + count
+
+    def pending_counts(self) -> tuple[int, int]:
+        "Return the number of buffered clients and buffered visits"
+        with self._lock:
+            return len(self._last_seen), sum(self._visits.values())
+
+    def _drain(self):
+        with self._lock:
+            last_seen, self._last_seen = self._last_seen, {}
+            visits, self._visits = self._visits, {}
+        return last_seen, visits
+
+    def _restore(self, last_seen, visits) -> None:
+        "Merge a failed batch back so it is retried on the next flush"
+        for client_id, seen_at in last_seen.items():
+            self.record_seen(client_id, seen_at)
+        for day, count in visits.items():
+            self.record_visit(day, count)
+
+    def flush(self) -> None:
+        "Write all buffered activity to the database in one transaction"
+        with self._flush_lock:
+            last_seen, visits = self._drain()
+            if not last_seen and not visits:
+                return
+            try:
+                with database.get_db_session() as db:
+                    if last_seen:
+                        existing_ids = {
+                            client_id
+                            for (client_id,) in db.query(models.Client.client_id)
+                            .filter(models.Client.client_id.in_(list(last_seen)))
+                            .all()
+                        }
+                        db.bulk_update_mappings(
+                            models.Client,
+                            [
+                                {"client_id": client_id, "last_seen": seen_at}
+                                for client_id, seen_at in last_seen.items()
+                                if client_id in existing_ids
+                            ],
+                        )
+                    if visits:
+                        stats_by_date = {
+                            stat.date: stat
+                            for stat in db.query(models.DailyStat)
+                            .filter(models.DailyStat.date.in_(list(visits)))
+                            .all()
+                        }
+                        for day, count in visits.items():
+                            daily_stat = stats_by_date.get(day)
+                            if daily_stat:
+                                daily_stat.visit_count += count
+                            else:
+                                db.add(models.DailyStat(date=day, visit_count=count))
+                    db.commit()
+            except SQLAlchemyError as error:
+                logger.error("Error flushing activity buffer: %s", error)
+                self._restore(last_seen, visits)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def start(self) -> None:
+        "Start the background flush thread once per process"
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="activity-flush", daemon=True
+        )
+        self._thread.start()
+        if not self._exit_hook_registered:
+            atexit.register(self.stop)
+            self._exit_hook_registered = True
+
+    def stop(self) -> None:
+        "Stop the background thread and flush the remaining entries"
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+            self._thread = None
+        self.flush()
+
+
+activity_buffer = ActivityBuffer(flush_interval=config.activity_flush_interval)
@@ -4,8 +4,7 @@ import os
 import math
 import uuid
 import datetime
-import shutil
-import subprocess
+import json
 import filetype
 from types import SimpleNamespace
 from flask import (
@@ -26,18 +25,28 @@ from sqlalchemy import exc, func, select, or_, case, String
 from sqlalchemy.sql.functions import count
 from sqlalchemy.orm import joinedload, subqueryload, aliased
 import bleach
-import bcrypt
 from werkzeug.utils import secure_filename
 from werkzeug.security import safe_join
 from . import config
 from . import database
 from . import constants
 from . import models
+from . import pricing
 from . import utils
+from . import dashboard_stats
+from .settings import runtime_settings
+from .login_throttle import login_throttle
+from .passwords import password_hasher
+from .presence import presence_registry
+from .broadcasts import broadcast_runner
+from . import broadcasts
+from .metrics import metrics_sampler
+from . import search_index
+from . import transactions
+from .transactions import retry_on_db_lock, save_upload
 from .auth import admin_required, admin_action_required
 
 admin_blueprint = Blueprint("admin", __name__, template_folder="admin")
-signup_disabled = False
 
 
 def _coerce_payment_status(raw_status):
@@ -73,11 +82,9 @@ def _parse_nullable_int(raw_value: str | None) -> int | None:
         return None
 
 
-def _summarize_expected_payment(
-    team, payment, active_members_count, has_approved_payment
-):
-    """Return calculated payment expectations for admin review."""
-    if active_members_count <= 0:
+def _summarize_quote(quote: pricing.Quote, active_members_count: int) -> dict:
+    """Return the admin review summary of a pricing quote."""
+    if quote.issue == pricing.NO_ACTIVE_MEMBERS:
         return {
             "expected_amount": None,
             "members_count": 0,
@@ -88,7 +95,7 @@ def _summarize_expected_payment(
             "is_new_member_payment": False,
             "status_note": "هیچ عضو فعالی برای محاسبه وجود ندارد.",
         }
-    if not team.league_one_id or not team.education_level:
+    if quote.issue in (pricing.MISSING_LEAGUE, pricing.MISSING_EDUCATION_LEVEL):
         return {
             "expected_amount": None,
             "members_count": active_members_count,
@@ -99,57 +106,34 @@ def _summarize_expected_payment(
             "is_new_member_payment": False,
             "status_note": "لیگ یا مقطع تیم نامشخص است.",
         }
-
-    selected_leagues_count = 1 + (1 if team.league_two_id is not None else 0)
-    selected_leagues_count = max(1, selected_leagues_count)
-    fee_per_person = config.payment_config.get("fee_per_person") or 0
-    fee_team = config.payment_config.get("fee_team") or 0
-    league_two_discount_percent = config.payment_config.get("league_two_discount") or 0
-    new_member_fee_per_league = (
-        config.payment_config.get("new_member_fee_per_league") or 0
-    )
-    members_basis = payment.members_paid_for or (
-        team.unpaid_members_count if has_approved_payment else active_members_count
-    )
-    members_basis = max(0, members_basis)
-
-    if has_approved_payment:
-        per_member_fee = new_member_fee_per_league * selected_leagues_count
-        expected_amount = members_basis * per_member_fee
-        return {
-            "expected_amount": int(expected_amount),
-            "members_count": members_basis,
-            "per_member_fee": int(per_member_fee),
-            "selected_leagues_count": selected_leagues_count,
-            "discount_amount": 0,
-            "league_two_cost": 0,
-            "is_new_member_payment": True,
-            "status_note": None,
-        }
-
-    members_fee = members_basis * fee_per_person
-    base_league_cost = fee_team + members_fee
-    league_two_cost = 0
-    discount_amount = 0
-    if team.league_two_id is not None:
-        league_two_cost = int(
-            round(base_league_cost * (1 - league_two_discount_percent / 100))
-        )
-        discount_amount = max(0, base_league_cost - league_two_cost)
-
-    expected_amount = base_league_cost + (league_two_cost or 0)
     return {
-        "expected_amount": int(expected_amount),
-        "members_count": members_basis,
-        "per_member_fee": int(fee_per_person),
-        "selected_leagues_count": selected_leagues_count,
-        "discount_amount": int(discount_amount),
-        "league_two_cost": int(league_two_cost),
-        "is_new_member_payment": False,
+        "expected_amount": quote.total,
+        "members_count": quote.members_count,
+        "per_member_fee": quote.per_member_fee,
+        "selected_leagues_count": quote.selected_leagues_count,
+        "discount_amount": quote.discount_amount,
+        "league_two_cost": quote.league_two_cost,
+        "is_new_member_payment": quote.is_new_member_payment,
         "status_note": None,
     }
 
 
+def _summarize_expected_payments(entries):
+    """Summarize ``(team, payment, active_members, has_approved)`` entries in one pass."""
+    quotes = pricing.quote_many(
+        pricing.TeamState.from_team(
+            team,
+            active_members,
+            has_approved,
+            members_paid_for=payment.members_paid_for,
+        )
+        for team, payment, active_members, has_approved in entries
+    )
+    return [
+        _summarize_quote(quote, entry[2]) for quote, entry in zip(quotes, entries)
+    ]
+
+
 @admin_blueprint.route("/UploadsGallery/<filename>")
 def uploaded_gallery_image(filename):
     """Serve uploaded gallery images securely"""
@@ -168,14 +152,26 @@ def get_admin_personas():
 
 
 @admin_blueprint.route("/AdminLogin", methods=["GET", "POST"])
+@retry_on_db_lock
 def admin_login():
     """admin login page and authentication"""
     if request.method == "POST":
+        ip_address = request.remote_addr or "unknown"
+        retry_after = login_throttle.retry_after("admin", ip_address)
+        if retry_after:
+            flash(
+                f"تعداد تلاش‌های ناموفق زیاد است. لطفاً {math.ceil(retry_after / 60)} دقیقه دیگر دوباره تلاش کنید.",
+                "error",
+            )
+            return render_template(constants.admin_html_names_data["admin_login"])
         admin_pass = request.form.get("password", "")
-        if config.admin_password_hash and bcrypt.checkpw(
-            admin_pass.encode("utf-8"),
-            config.admin_password_hash.encode("utf-8"),
-        ):
+        is_success = bool(config.admin_password_hash) and password_hasher.verify(
+            admin_pass, config.admin_password_hash
+        )
+        with database.get_db_session() as db:
+            login_throttle.record(db, "admin", ip_address, is_success=is_success)
+            db.commit()
+        if is_success:
             session["admin_logged_in"] = True
             flash("ورود به پنل مدیریت با موفقیت انجام شد.", "success")
             return redirect(url_for("admin.admin_dashboard"))
@@ -187,22 +183,9 @@ def admin_login():
 @admin_blueprint.route("/Admin/GetChatHistory/<int:client_id>")
 @admin_required
 def get_chat_history(client_id):
-    """Retrieve chat history for a specific client"""
+    """Retrieve a page of chat history for a specific client"""
     with database.get_db_session() as db:
-        msgs = database.get_chat_history_by_client_id(db, client_id)
-        return jsonify(
-            {
-                "messages": [
-                    {
-                        "message_text": message.message_text,
-                        "timestamp": message.timestamp.isoformat(),
-                        "message_id": message.message_id,
-                        "sender": message.sender,
-                    }
-                    for message in msgs
-                ]
-            }
-        )
+        return jsonify(utils.chat_history_page(db, client_id, request.args))
 
 
 @admin_blueprint.route("/API/GetChatClients")
@@ -217,15 +200,31 @@ def api_get_chat_clients():
     return jsonify(client_list)
 
 
+@admin_blueprint.route("/API/admin/ChatInbox")
+@admin_required
+def api_chat_inbox():
+    "api endpoint to get a page of clients with chat activity and unread counts"
+    with database.get_db_session() as db:
+        return jsonify(utils.chat_inbox_page(db, request.args))
+
+
 @admin_blueprint.route("/Admin/Chat/<int:client_id>")
 @admin_required
 def admin_chat(client_id):
     "admin chat interface for a specific client"
     with database.get_db_session() as db_session:
         client = database.get_client_by(db_session, "client_id", client_id)
-    if not client or client.status != models.EntityStatus.ACTIVE:
-        flash("کاربر مورد نظر یافت نشد یا غیرفعال است.", "error")
-        return redirect(url_for("admin.admin_select_chat"))
+        if not client or client.status != models.EntityStatus.ACTIVE:
+            flash("کاربر مورد نظر یافت نشد یا غیرفعال است.", "error")
+            return redirect(url_for("admin.admin_select_chat"))
+        try:
+            database.mark_chat_read(db_session, client_id)
+            db_session.commit()
+        except exc.SQLAlchemyError as error:
+            db_session.rollback()
+            current_app.logger.error(
+                "error marking chat of client %s read: %s", client_id, error
+            )
     return render_template(
         constants.admin_html_names_data["admin_chat"],
         client=client,
@@ -235,6 +234,7 @@ def admin_chat(client_id):
 
 @admin_blueprint.route("/Admin/AddTeam/<int:client_id>", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_add_team(client_id):
     "add a new team for a specific client"
     team_name = _normalize_nullable_text(request.form.get("team_name"))
@@ -309,30 +309,22 @@ def admin_add_team(client_id):
 def admin_select_chat():
     "Select a client for chat"
     with database.get_db_session() as db:
-        clients_query = (
-            db.query(
-                models.Client.client_id,
-                models.Client.email,
-                count(models.ChatMessage.message_id).label("unread_count"),
-                func.max(models.ChatMessage.timestamp).label("last_message_timestamp"),
-            )
-            .join(
-                models.ChatMessage,
-                models.Client.client_id == models.ChatMessage.client_id,
-            )
-            .filter(models.ChatMessage.sender.notin_(get_admin_personas()))
-            .group_by(models.Client.client_id)
-            .order_by(func.max(models.ChatMessage.timestamp).desc())
+        clients, has_more = database.get_chat_inbox(
+            db, limit=config.chat_inbox_page_size
         )
 
     return render_template(
         constants.admin_html_names_data["admin_select_chat"],
-        clients=clients_query.all(),
+        clients=clients,
+        next_before=clients[-1].last_message_id if has_more else None,
+        is_online=presence_registry.is_online,
+        is_in_chat=presence_registry.is_in_chat,
     )
 
 
 @admin_blueprint.route("/Admin/UpdatePaymentStatus/<int:team_id>", methods=["POST"])
 @admin_action_required
+@retry_on_db_lock
 def admin_update_payment_status(team_id):
     """Update the status of a payment for a specific team."""
     try:
@@ -387,6 +379,7 @@ def admin_update_payment_status(team_id):
 
 @admin_blueprint.route("/Admin/DeleteTeam/<int:team_id>", methods=["POST"])
 @admin_action_required
+@retry_on_db_lock
 def admin_delete_team(team_id):
     "Delete (archive) a team and mark its members withdrawn"
     team = None
@@ -427,6 +420,7 @@ def admin_delete_team(team_id):
 
 @admin_blueprint.route("/Admin/RestoreTeam/<int:team_id>", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_restore_team(team_id):
     """Restore an archived or inactive team and its members."""
     with database.get_db_session() as db:
@@ -449,6 +443,7 @@ def admin_restore_team(team_id):
     "/Admin/Team/<int:team_id>/DeleteMember/<int:member_id>", methods=["POST"]
 )
 @admin_action_required
+@retry_on_db_lock
 def admin_delete_member(team_id, member_id):
     "Mark a team member as withdrawn"
     with database.get_db_session() as db:
@@ -484,6 +479,7 @@ def admin_delete_member(team_id, member_id):
 
 @admin_blueprint.route("/Admin/ManageNews", methods=["GET", "POST"])
 @admin_required
+@retry_on_db_lock
 def admin_manage_news():
     """Manage news articles: create, list, and edit."""
     with database.get_db_session() as db:
@@ -535,7 +531,7 @@ def admin_manage_news():
                 safe_name = f"{uuid.uuid4()}.html"
                 os.makedirs(constants.Path.news_html_dir, exist_ok=True)
                 html_path = os.path.join(constants.Path.news_html_dir, safe_name)
-                html_file.save(html_path)
+                save_upload(html_file, html_path)
                 new_article.template_path = f"news/htmls/{safe_name}"
 
             if image_file and image_file.filename:
@@ -551,11 +547,12 @@ def admin_manage_news():
                 setattr(new_article, "image_path", image_filename)
 
                 try:
-                    image_file.save(
+                    save_upload(
+                        image_file,
                         os.path.join(
                             current_app.config["UPLOAD_FOLDER_NEWS"],
                             image_filename,
-                        )
+                        ),
                     )
                 except IOError as error:
                     current_app.logger.error("News image save failed: %s", error)
@@ -584,6 +581,7 @@ def admin_manage_news():
 
 @admin_blueprint.route("/Admin/EditNews/<int:article_id>", methods=["GET", "POST"])
 @admin_required
+@retry_on_db_lock
 def admin_edit_news(article_id):
     """Edit an existing news article"""
     with database.get_db_session() as db:
@@ -653,7 +651,7 @@ def admin_edit_news(article_id):
                             article.image_path,
                         )
 
-                    image_file.save(new_image_path)
+                    save_upload(image_file, new_image_path)
 
                     if old_image_path and os.path.exists(old_image_path):
                         try:
@@ -675,7 +673,7 @@ def admin_edit_news(article_id):
                     safe_name = f"{uuid.uuid4()}.html"
                     os.makedirs(constants.Path.news_html_dir, exist_ok=True)
                     html_path = os.path.join(constants.Path.news_html_dir, safe_name)
-                    html_file.save(html_path)
+                    save_upload(html_file, html_path)
                     article.template_path = f"news/htmls/{safe_name}"
 
                 db.commit()
@@ -693,6 +691,7 @@ def admin_edit_news(article_id):
 
 @admin_blueprint.route("/Admin/DeleteNews/<int:article_id>", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_delete_news(article_id):
     """Delete a news article and its assets."""
 
@@ -922,6 +921,7 @@ def admin_get_document(team_id, filename):
     "/Admin/ManageDocument/<int:document_id>/<action>", methods=["POST"]
 )
 @admin_required
+@retry_on_db_lock
 def admin_manage_document(document_id, action):
     """Approve or reject a document."""
     if action not in ["approve", "reject"]:
@@ -1103,6 +1103,7 @@ def admin_manage_teams():
 
 @admin_blueprint.route("/Admin/Team/<int:team_id>/AddMember", methods=["GET", "POST"])
 @admin_action_required
+@retry_on_db_lock
 def admin_add_member(team_id):
     "add a new member to a specific team from the admin panel"
     with database.get_db_session() as db:
@@ -1145,6 +1146,7 @@ def admin_add_member(team_id):
 
 @admin_blueprint.route("/Admin/EditTeam/<int:team_id>", methods=["GET", "POST"])
 @admin_required
+@retry_on_db_lock
 def admin_edit_team(team_id):
     """Edit a team's details"""
     with database.get_db_session() as db:
@@ -1276,35 +1278,12 @@ def admin_edit_team(team_id):
             .all()
         )
         last_payment = payments[0] if payments else None
-        active_members_count = sum(
-            1 for m in members if m.status == models.EntityStatus.ACTIVE
+        has_approved_payment = any(
+            p.status == models.PaymentStatus.APPROVED for p in payments
         )
-        has_approved_payment = database.check_if_team_is_paid(db, team_id)
-        fee_per_person = config.payment_config.get("fee_per_person") or 0
-        fee_team = config.payment_config.get("fee_team") or 0
-        league_two_discount = config.payment_config.get("league_two_discount") or 0
-        new_member_fee_per_league = (
-            config.payment_config.get("new_member_fee_per_league") or 0
-        )
-
-        payable_amount = 0
-        if has_approved_payment:
-            if team.unpaid_members_count > 0:
-                num_leagues = 1 + (1 if team.league_two_id else 0)
-                payable_amount = (
-                    team.unpaid_members_count * new_member_fee_per_league * num_leagues
-                )
-        else:
-            members_fee = active_members_count * fee_per_person
-            base_cost = fee_team + members_fee
-
-            league_two_cost = 0
-            if team.league_two_id:
-                league_two_cost = int(
-                    round(base_cost * (1 - league_two_discount / 100))
-                )
-
-            payable_amount = base_cost + league_two_cost
+        payable_amount = pricing.quote(
+            pricing.TeamState.from_team(team, len(members), has_approved_payment)
+        ).total
 
     return render_template(
         constants.admin_html_names_data["admin_edit_team"],
@@ -1323,6 +1302,7 @@ def admin_edit_team(team_id):
     "/Admin/Team/<int:team_id>/EditMember/<int:member_id>", methods=["POST"]
 )
 @admin_required
+@retry_on_db_lock
 def admin_edit_member(team_id, member_id):
     """Edit a team member's details."""
     with database.get_db_session() as db:
@@ -1432,6 +1412,7 @@ def admin_clients_list():
 
 @admin_blueprint.route("/Admin/AddClient", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_add_client():
     "add a new client to the database"
     email_raw = bleach.clean(
@@ -1495,9 +1476,7 @@ def admin_add_client():
                 models.Client(
                     phone_number=phone,
                     email=email,
-                    password=bcrypt.hashpw(
-                        password.encode("utf-8"), bcrypt.gensalt()
-                    ).decode("utf-8"),
+                    password=password_hasher.hash(password),
                     registration_date=registration_date_value,
                     is_phone_verified=True,
                 )
@@ -1517,6 +1496,7 @@ def admin_add_client():
 
 @admin_blueprint.route("/Admin/EditClient/<int:client_id>", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_edit_client(client_id):
     "Edit a client's details"
     with database.get_db_session() as db:
@@ -1551,6 +1531,7 @@ def admin_edit_client(client_id):
 
 @admin_blueprint.route("/Admin/DeleteClient/<int:client_id>", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_delete_client(client_id):
     "Deactivate a client and all their teams"
     with database.get_db_session() as db:
@@ -1589,6 +1570,7 @@ def admin_delete_client(client_id):
 
 @admin_blueprint.route("/Admin/RestoreClient/<int:client_id>", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_restore_client(client_id):
     """Restore a previously archived client and their teams."""
     with database.get_db_session() as db:
@@ -1618,316 +1600,90 @@ def admin_restore_client(client_id):
 @admin_required
 def admin_dashboard():
     """admin dashboard with statistics and pending payments"""
+    snapshot = dashboard_stats.dashboard_cache.get()
     with database.get_db_session() as db:
-        total_clients = (
-            db.query(models.Client)
-            .filter(models.Client.status == models.EntityStatus.ACTIVE)
-            .count()
-        )
-        total_teams = (
-            db.query(models.Team)
-            .filter(models.Team.status == models.EntityStatus.ACTIVE)
-            .count()
-        )
-        approved_teams = (
-            db.query(models.Payment.team_id)
-            .filter(models.Payment.status == models.PaymentStatus.APPROVED)
-            .distinct()
-            .count()
-        )
-        total_members = (
-            db.query(models.Member)
-            .filter(models.Member.status == models.EntityStatus.ACTIVE)
-            .count()
-        )
-        total_leaders = (
-            db.query(models.Member)
-            .filter(
-                models.Member.status == models.EntityStatus.ACTIVE,
-                models.Member.role == models.MemberRole.LEADER,
-            )
-            .count()
-        )
-        total_coaches = (
-            db.query(models.Member)
-            .filter(
-                models.Member.status == models.EntityStatus.ACTIVE,
-                models.Member.role == models.MemberRole.COACH,
-            )
-            .count()
-        )
-
-        new_clients_this_week = (
-            db.query(models.Client)
-            .filter(
-                models.Client.status == models.EntityStatus.ACTIVE,
-                models.Client.registration_date
-                >= datetime.datetime.now(datetime.timezone.utc)
-                - datetime.timedelta(days=7),
-            )
-            .count()
-        )
-        five_mins_ago = datetime.datetime.now(
-            datetime.timezone.utc
-        ) - datetime.timedelta(minutes=5)
-        online_users_count = (
-            db.query(models.Client)
-            .filter(models.Client.last_seen >= five_mins_ago)
-            .count()
-        )
-        today = datetime.date.today()
-        daily_stat = (
-            db.query(models.DailyStat).filter(models.DailyStat.date == today).first()
-        )
-        daily_visits = daily_stat.visit_count if daily_stat else 0
-        week_ago = today - datetime.timedelta(days=6)
-        weekly_rows = {
-            row.date: row.visit_count or 0
-            for row in db.query(models.DailyStat)
-            .filter(models.DailyStat.date >= week_ago)
-            .all()
-        }
-        weekly_visits = []
-        for i in range(7):
-            day = week_ago + datetime.timedelta(days=i)
-            weekly_visits.append(
-                {"date": day, "visit_count": weekly_rows.get(day, 0)}
-            )
-        weekly_min = min([w["visit_count"] for w in weekly_visits], default=0)
-        weekly_max = max([w["visit_count"] for w in weekly_visits], default=0)
-        weekly_last = weekly_visits[-1] if weekly_visits else None
-        weekly_last_count = weekly_last["visit_count"] if weekly_last else 0
-
-        gender_by_league = []
-        gender_league_rows = (
-            db.query(
-                models.League.name.label("league_name"),
-                models.Member.gender,
-                func.count(models.Member.member_id).label("count"),
-            )
-            .select_from(models.Member)
-            .join(models.Team, models.Member.team_id == models.Team.team_id)
-            .join(models.League, models.Team.league_one_id == models.League.league_id)
-            .filter(models.Member.status == models.EntityStatus.ACTIVE)
-            .group_by(models.League.name, models.Member.gender)
-            .all()
-        )
-        league_map = {}
-        for league_name, gender, count_val in gender_league_rows:
-            if league_name not in league_map:
-                league_map[league_name] = {"league": league_name, "male": 0, "female": 0, "unknown": 0}
-            key = "unknown"
-            if gender == models.Gender.MALE:
-                key = "male"
-            elif gender == models.Gender.FEMALE:
-                key = "female"
-            league_map[league_name][key] += count_val or 0
-        gender_by_league = sorted(league_map.values(), key=lambda x: (x["male"] + x["female"] + x["unknown"]), reverse=True)
-
-        stats = {
-            "total_clients": total_clients,
-            "total_teams": total_teams,
-            "approved_teams": approved_teams,
-            "total_members": total_members,
-            "total_leaders": total_leaders,
-            "total_coaches": total_coaches,
-            "new_clients_this_week": new_clients_this_week,
-            "online_users_count": online_users_count,
-            "daily_visits": daily_visits,
-            "weekly_visits": weekly_visits,
-            "weekly_min": weekly_min,
-            "weekly_max": weekly_max,
-            "weekly_last": weekly_last,
-            "weekly_last_count": weekly_last_count,
-            "gender_by_league": gender_by_league,
-        }
-        league_counts = {}
-        active_teams = (
-            db.query(models.Team)
-            .options(
-                joinedload(models.Team.league_one), joinedload(models.Team.league_two)
-            )
-            .filter(models.Team.status == models.EntityStatus.ACTIVE)
-            .all()
-        )
-        for team in active_teams:
-            if team.league_one:
-                l_id = team.league_one.league_id
-                if l_id not in league_counts:
-                    league_counts[l_id] = {
-                        "id": l_id,
-                        "name": team.league_one.name,
-                        "count": 0,
-                    }
-                league_counts[l_id]["count"] += 1
-
-            if team.league_two:
-                l_id = team.league_two.league_id
-                if l_id not in league_counts:
-                    league_counts[l_id] = {
-                        "id": l_id,
-                        "name": team.league_two.name,
-                        "count": 0,
-                    }
-                league_counts[l_id]["count"] += 1
-
-        league_stats = sorted(
-            league_counts.values(), key=lambda item: item["count"], reverse=True
-        )
-        gender_data = (
-            db.query(models.Member.gender, func.count(models.Member.member_id))
-            .filter(models.Member.status == models.EntityStatus.ACTIVE)
-            .group_by(models.Member.gender)
-            .all()
-        )
-        gender_stats = {"male": 0, "female": 0, "unknown": 0}
-        for gender_enum, count_val in gender_data:
-            if gender_enum == models.Gender.MALE:
-                gender_stats["male"] = count_val
-            elif gender_enum == models.Gender.FEMALE:
-                gender_stats["female"] = count_val
-            else:
-                gender_stats["unknown"] += count_val
-        total_gender_count = sum(gender_stats.values()) or 1
-        gender_stats["male_percent"] = round(
-            (gender_stats["male"] / total_gender_count) * 100, 1
-        )
-        gender_stats["female_percent"] = round(
-            (gender_stats["female"] / total_gender_count) * 100, 1
-        )
-        gender_age_data = (
-            db.query(models.Member.gender, models.Member.birth_date)
-            .filter(
-                models.Member.status == models.EntityStatus.ACTIVE,
-                models.Member.role == models.MemberRole.MEMBER,
-                models.Member.birth_date.isnot(None),
-            )
-            .all()
-        )
-
-        male_ages = []
-        female_ages = []
-        for gender, birth_date in gender_age_data:
-            age = utils.calculate_age(birth_date)
-            if gender == models.Gender.MALE:
-                male_ages.append(age)
-            elif gender == models.Gender.FEMALE:
-                female_ages.append(age)
-        gender_stats["average_male_age"] = (
-            round(sum(male_ages) / len(male_ages)) if male_ages else 0
-        )
-        gender_stats["average_female_age"] = (
-            round(sum(female_ages) / len(female_ages)) if female_ages else 0
-        )
-        server_stats = {}
-        try:
-            total_disk, used_disk, free_disk = shutil.disk_usage("/")
-            server_stats["disk_percent"] = round((used_disk / total_disk) * 100, 1)
-            server_stats["disk_free_gb"] = round(free_disk / (1024**3), 1)
-            server_stats["disk_total_gb"] = round(total_disk / (1024**3), 1)
-        except Exception:
-            server_stats["disk_percent"] = 0
-            server_stats["disk_free_gb"] = 0
-            server_stats["disk_total_gb"] = 0
-
-        try:
-            import psutil
-
-            server_stats["cpu_percent"] = psutil.cpu_percent(interval=0.1)
-            load_avg = os.getloadavg() if hasattr(os, "getloadavg") else (0, 0, 0)
-            server_stats["load_avg_1m"] = round(load_avg[0], 2)
-
-            vm = psutil.virtual_memory()
-            server_stats["ram_total_gb"] = round(vm.total / (1024**3), 1)
-            server_stats["ram_used_gb"] = round(vm.used / (1024**3), 1)
-            server_stats["ram_percent"] = round(vm.percent, 1)
-
-            sm = psutil.swap_memory()
-            server_stats["swap_percent"] = round(sm.percent, 1)
-        except Exception:
-            load_avg = os.getloadavg() if hasattr(os, "getloadavg") else (0, 0, 0)
-            server_stats["cpu_percent"] = 0
-            server_stats["load_avg_1m"] = round(load_avg[0], 2)
-            server_stats["ram_total_gb"] = 0
-            server_stats["ram_used_gb"] = 0
-            server_stats["ram_percent"] = 0
-            server_stats["swap_percent"] = 0
-
-        try:
-            output = subprocess.check_output(
-                [
-                    "nvidia-smi",
-                    "--query-gpu=utilization.gpu,memory.total,memory.used",
-                    "--format=csv,noheader,nounits",
-                ],
-                text=True,
-                stderr=subprocess.DEVNULL,
-            )
-            first_line = output.strip().splitlines()[0]
-            util, mem_total, mem_used = [
-                float(x.strip()) for x in first_line.split(",")
-            ]
-            server_stats["gpu_percent"] = round(util, 1)
-            server_stats["vram_total_gb"] = round(mem_total / 1024, 2)
-            server_stats["vram_used_gb"] = round(mem_used / 1024, 2)
-        except Exception:
-            server_stats["gpu_percent"] = None
-            server_stats["vram_total_gb"] = None
-            server_stats["vram_used_gb"] = None
+        stats = snapshot.stats()
+        stats["online_users_count"] = presence_registry.online_client_count()
+        stats["online_admins_count"] = presence_registry.online_admin_count()
+        league_stats = snapshot.league_stats
+        gender_stats = snapshot.gender_stats()
+        server_stats = metrics_sampler.latest()
         top_news = (
             db.query(models.News).order_by(models.News.views.desc()).limit(5).all()
         )
 
         active_member_counts = (
             db.query(
-                models.Member.team_id,
-                func.count(models.Member.member_id).label("count"),
+                models.Member.team_id.label("team_id"),
+                func.count(models.Member.member_id).label("active_members"),
             )
             .filter(models.Member.status == models.EntityStatus.ACTIVE)
             .group_by(models.Member.team_id)
-            .all()
+            .subquery()
         )
-        active_member_map = {row.team_id: row.count for row in active_member_counts}
-
+        approved_team_ids = (
+            db.query(models.Payment.team_id.label("team_id"))
+            .filter(models.Payment.status == models.PaymentStatus.APPROVED)
+            .distinct()
+            .subquery()
+        )
+        league_one_alias = aliased(models.League)
+        league_two_alias = aliased(models.League)
         pending_payments_rows = (
             db.query(
                 models.Payment,
                 models.Team,
                 models.Client.email,
                 models.Client.phone_number.label("client_phone_number"),
+                league_one_alias.name.label("league_one_name"),
+                league_two_alias.name.label("league_two_name"),
+                func.coalesce(active_member_counts.c.active_members, 0).label(
+                    "active_members"
+                ),
+                approved_team_ids.c.team_id.isnot(None).label("has_approved_payment"),
             )
             .join(models.Team, models.Payment.team_id == models.Team.team_id)
             .join(models.Client, models.Payment.client_id == models.Client.client_id)
-            .options(
-                joinedload(models.Team.league_one), joinedload(models.Team.league_two)
+            .outerjoin(
+                league_one_alias,
+                models.Team.league_one_id == league_one_alias.league_id,
+            )
+            .outerjoin(
+                league_two_alias,
+                models.Team.league_two_id == league_two_alias.league_id,
+            )
+            .outerjoin(
+                active_member_counts,
+                active_member_counts.c.team_id == models.Team.team_id,
+            )
+            .outerjoin(
+                approved_team_ids, approved_team_ids.c.team_id == models.Team.team_id
             )
             .filter(models.Payment.status == models.PaymentStatus.PENDING)
             .order_by(models.Payment.upload_date.asc())
             .all()
         )
+        expected_payments = _summarize_expected_payments(
+            [
+                (row.Team, row.Payment, row.active_members, bool(row.has_approved_payment))
+                for row in pending_payments_rows
+            ]
+        )
 
         pending_payments = []
-        for payment, team, client_email, client_phone_number in pending_payments_rows:
-            active_members = active_member_map.get(team.team_id, 0)
-            has_approved_payment = database.check_if_team_is_paid(db, team.team_id)
-            expected_payment = _summarize_expected_payment(
-                team,
-                payment,
-                active_members,
-                has_approved_payment,
-            )
-
+        for row, expected_payment in zip(pending_payments_rows, expected_payments):
+            payment, team = row.Payment, row.Team
             pending_payments.append(
                 {
                     "payment_id": payment.payment_id,
                     "client_id": payment.client_id,
                     "team_id": team.team_id,
                     "team_name": team.team_name or "نام تیم نامشخص",
-                    "league_one_name": getattr(team.league_one, "name", None),
-                    "league_two_name": getattr(team.league_two, "name", None),
+                    "league_one_name": row.league_one_name,
+                    "league_two_name": row.league_two_name,
                     "education_level": team.education_level or "—",
-                    "client_email": client_email or "ایمیل نامشخص",
-                    "client_phone": client_phone_number,
+                    "client_email": row.email or "ایمیل نامشخص",
+                    "client_phone": row.client_phone_number,
                     "amount": payment.amount,
                     "members_paid_for": payment.members_paid_for,
                     "upload_date": payment.upload_date,
@@ -1937,7 +1693,7 @@ def admin_dashboard():
                     "payer_phone": payment.payer_phone,
                     "receipt_filename": payment.receipt_filename,
                     "expected_payment": expected_payment,
-                    "active_members": active_members,
+                    "active_members": row.active_members,
                     "unpaid_members": team.unpaid_members_count,
                 }
             )
@@ -1952,6 +1708,45 @@ def admin_dashboard():
         pending_payments=pending_payments,
         pending_payments_count=len(pending_payments),
         admin_greeting_name=session.get("admin_display_name", "مدیر محترم"),
+        signup_disabled=runtime_settings.get("signup_disabled"),
+    )
+
+
+@admin_blueprint.route("/API/admin/ServerMetrics")
+@admin_required
+def api_server_metrics():
+    """Return the buffered server metrics as a time series for the dashboard chart."""
+    samples = metrics_sampler.series(since=request.args.get("since", type=float))
+    return jsonify(
+        {
+            "interval": metrics_sampler.interval,
+            "labels": [
+                datetime.datetime.fromtimestamp(s["timestamp"]).strftime("%H:%M")
+                for s in samples
+            ],
+            "timestamps": [s["timestamp"] for s in samples],
+            "cpu_percent": [s["cpu_percent"] for s in samples],
+            "ram_percent": [s["ram_percent"] for s in samples],
+            "swap_percent": [s["swap_percent"] for s in samples],
+            "disk_percent": [s["disk_percent"] for s in samples],
+            "load_avg_1m": [s["load_avg_1m"] for s in samples],
+            "gpu_percent": [s["gpu_percent"] for s in samples],
+        }
+    )
+
+
+@admin_blueprint.route("/API/admin/PoolMetrics")
+@admin_required
+def api_pool_metrics():
+    """Return database pool and write retry counters and timings."""
+    return jsonify(
+        {
+            **database.pool_metrics.snapshot(),
+            "pool_class": type(database.db_engine.pool).__name__,
+            "pool_status": database.db_engine.pool.status(),
+            "write_transactions": transactions.write_metrics.snapshot(),
+            "password_hashing": password_hasher.snapshot(),
+        }
     )
 
 
@@ -1996,6 +1791,17 @@ def admin_download_db():
         return redirect(url_for("admin.admin_dashboard"))
 
 
+def _match_order(column, ranked_ids: list[int]):
+    "Order rows by their position in a ranked search result"
+    if not ranked_ids:
+        return column.desc()
+    return case(
+        {entity_id: position for position, entity_id in enumerate(ranked_ids)},
+        value=column,
+        else_=len(ranked_ids),
+    )
+
+
 @admin_blueprint.route("/Admin/Search")
 @admin_required
 def admin_search():
@@ -2004,9 +1810,10 @@ def admin_search():
     payment_status = (request.args.get("payment_status", "") or "").strip()
     client_status = request.args.get("client_status", "all")
     team_status = request.args.get("team_status", "all")
-    client_sort = request.args.get("client_sort", "recent")
-    team_sort = request.args.get("team_sort", "recent")
-    payment_sort = request.args.get("payment_sort", "recent")
+    default_sort = "relevance" if query else "recent"
+    client_sort = request.args.get("client_sort") or default_sort
+    team_sort = request.args.get("team_sort") or default_sort
+    payment_sort = request.args.get("payment_sort") or default_sort
     league_id_1 = _parse_nullable_int(request.args.get("league_id"))
     league_id_2 = _parse_nullable_int(request.args.get("league_id_2"))
     education_filter = _normalize_nullable_text(request.args.get("education_level"))
@@ -2017,14 +1824,23 @@ def admin_search():
         teams = []
         payments = []
 
+        matches = {}
+        if query:
+            matches = {
+                kind: search_index.search(db, query, kind, config.search_result_limit)
+                for kind in (
+                    search_index.CLIENT,
+                    search_index.TEAM,
+                    search_index.MEMBER,
+                    search_index.PAYMENT,
+                )
+            }
+
         client_query = db.query(models.Client)
-        client_keyword = f"%{query}%" if query else "%"
-        client_query = client_query.filter(
-            or_(
-                models.Client.email.ilike(client_keyword),
-                models.Client.phone_number.ilike(client_keyword),
+        if query:
+            client_query = client_query.filter(
+                models.Client.client_id.in_(matches[search_index.CLIENT])
             )
-        )
         if client_status == "archived":
             client_query = client_query.filter(
                 models.Client.status != models.EntityStatus.ACTIVE
@@ -2036,36 +1852,28 @@ def admin_search():
 
         if client_sort == "email":
             client_query = client_query.order_by(func.lower(models.Client.email))
+        elif client_sort == "relevance" and query:
+            client_query = client_query.order_by(
+                _match_order(models.Client.client_id, matches[search_index.CLIENT])
+            )
         elif client_sort == "oldest":
             client_query = client_query.order_by(models.Client.registration_date.asc())
         else:
             client_query = client_query.order_by(models.Client.registration_date.desc())
         clients = client_query.limit(150).all()
 
-        league_one_alias = aliased(models.League)
-        league_two_alias = aliased(models.League)
-        team_query = (
-            db.query(models.Team)
-            .join(models.Client)
-            .outerjoin(league_one_alias, models.Team.league_one_id == league_one_alias.league_id)
-            .outerjoin(league_two_alias, models.Team.league_two_id == league_two_alias.league_id)
-            .options(
-                joinedload(models.Team.client),
-                joinedload(models.Team.league_one),
-                joinedload(models.Team.league_two),
-                joinedload(models.Team.documents),
-            )
+        team_query = db.query(models.Team).options(
+            joinedload(models.Team.client),
+            joinedload(models.Team.league_one),
+            joinedload(models.Team.league_two),
+            joinedload(models.Team.documents),
         )
         if query:
-            keyword_like = f"%{query}%"
+            # Teams also match through their client's email or phone.
             team_query = team_query.filter(
                 or_(
-                    models.Team.team_name.ilike(keyword_like),
-                    models.Client.email.ilike(keyword_like),
-                    models.Client.phone_number.ilike(keyword_like),
-                    func.cast(models.Team.team_id, String).ilike(keyword_like),
-                    league_one_alias.name.ilike(keyword_like),
-                    league_two_alias.name.ilike(keyword_like),
+                    models.Team.team_id.in_(matches[search_index.TEAM]),
+                    models.Team.client_id.in_(matches[search_index.CLIENT]),
                 )
             )
         if team_status == "archived":
@@ -2105,11 +1913,15 @@ def admin_search():
 
         if team_sort == "name":
             team_query = team_query.order_by(func.lower(models.Team.team_name))
+        elif team_sort == "relevance" and query:
+            team_query = team_query.order_by(
+                _match_order(models.Team.team_id, matches[search_index.TEAM])
+            )
         elif team_sort == "oldest":
             team_query = team_query.order_by(models.Team.team_registration_date.asc())
         else:
             team_query = team_query.order_by(models.Team.team_registration_date.desc())
-        teams = team_query.distinct(models.Team.team_id).limit(300).all()
+        teams = team_query.limit(300).all()
 
         payment_query = db.query(models.Payment)
         if payment_status:
@@ -2122,16 +1934,8 @@ def admin_search():
                 payment_query = payment_query.filter(False)
 
         if query:
-            keyword_like = f"%{query}%"
             payment_query = payment_query.filter(
-                or_(
-                    func.cast(models.Payment.payment_id, String).ilike(keyword_like),
-                    func.cast(models.Payment.team_id, String).ilike(keyword_like),
-                    models.Payment.payer_name.ilike(keyword_like),
-                    models.Payment.payer_phone.ilike(keyword_like),
-                    models.Payment.tracking_number.ilike(keyword_like),
-                    models.Payment.receipt_filename.ilike(keyword_like),
-                )
+                models.Payment.payment_id.in_(matches[search_index.PAYMENT])
             )
 
         payment_query = payment_query.options(
@@ -2141,6 +1945,10 @@ def admin_search():
 
         if payment_sort == "amount":
             payment_query = payment_query.order_by(models.Payment.amount.desc())
+        elif payment_sort == "relevance" and query:
+            payment_query = payment_query.order_by(
+                _match_order(models.Payment.payment_id, matches[search_index.PAYMENT])
+            )
         else:
             payment_query = payment_query.order_by(models.Payment.upload_date.desc())
         payments = payment_query.limit(200).all()
@@ -2151,13 +1959,8 @@ def admin_search():
             joinedload(models.Member.city).joinedload(models.City.province),
         )
         if query:
-            keyword_like = f"%{query}%"
             member_query = member_query.filter(
-                or_(
-                    models.Member.name.ilike(keyword_like),
-                    models.Member.national_id.ilike(keyword_like),
-                    models.Member.phone_number.ilike(keyword_like),
-                )
+                models.Member.member_id.in_(matches[search_index.MEMBER])
             )
         if team_status == "archived":
             member_query = member_query.filter(
@@ -2168,7 +1971,13 @@ def admin_search():
                 models.Member.status == models.EntityStatus.ACTIVE
             )
 
-        members = member_query.order_by(models.Member.member_id.desc()).limit(400).all()
+        if query:
+            member_query = member_query.order_by(
+                _match_order(models.Member.member_id, matches[search_index.MEMBER])
+            )
+        else:
+            member_query = member_query.order_by(models.Member.member_id.desc())
+        members = member_query.limit(400).all()
 
         return render_template(
             constants.admin_html_names_data["admin_search"],
@@ -2191,21 +2000,103 @@ def admin_search():
         )
 
 
+def _suggestion_payloads(db, hits: list[tuple[str, int]]) -> list[dict]:
+    "Describe type-ahead hits with a label, a detail line and a target page"
+    ids: dict[str, list[int]] = {}
+    for kind, entity_id in hits:
+        ids.setdefault(kind, []).append(entity_id)
+    entities = {}
+    for kind, key in (
+        (search_index.CLIENT, models.Client.client_id),
+        (search_index.TEAM, models.Team.team_id),
+        (search_index.MEMBER, models.Member.member_id),
+        (search_index.PAYMENT, models.Payment.payment_id),
+    ):
+        if kind in ids:
+            for entity in db.query(key.class_).filter(key.in_(ids[kind])):
+                entities[(kind, getattr(entity, key.key))] = entity
+    payloads = []
+    for kind, entity_id in hits:
+        entity = entities.get((kind, entity_id))
+        if entity is None:
+            continue
+        if kind == search_index.CLIENT:
+            label = entity.email or entity.phone_number
+            detail = entity.phone_number if entity.email else f"کاربر #{entity_id}"
+            url = url_for("admin.admin_manage_client", client_id=entity_id)
+        elif kind == search_index.TEAM:
+            label, detail = entity.team_name, f"تیم #{entity_id}"
+            url = url_for("admin.admin_edit_team", team_id=entity_id)
+        elif kind == search_index.MEMBER:
+            label, detail = entity.name, entity.national_id
+            url = url_for("admin.admin_edit_team", team_id=entity.team_id)
+        else:
+            label = entity.tracking_number or f"پرداخت #{entity_id}"
+            detail = entity.payer_name or f"تیم #{entity.team_id}"
+            url = url_for("admin.admin_edit_team", team_id=entity.team_id)
+        status = getattr(entity, "status", None)
+        payloads.append(
+            {
+                "type": kind,
+                "id": entity_id,
+                "label": label,
+                "detail": detail,
+                "url": url,
+                "archived": isinstance(status, models.EntityStatus)
+                and status != models.EntityStatus.ACTIVE,
+            }
+        )
+    return payloads
+
+
+@admin_blueprint.route("/API/admin/SearchSuggest")
+@admin_required
+def api_search_suggest():
+    "Type-ahead matches across clients, teams, members and payments"
+    query = (request.args.get("q", "") or "").strip()
+    limit = min(
+        max(request.args.get("limit", config.search_suggest_limit, type=int), 1), 20
+    )
+    with database.get_db_session() as db:
+        hits = search_index.suggest(
+            db, query, limit=limit, budget_ms=config.search_suggest_budget_ms
+        )
+        results = _suggestion_payloads(db, hits or [])
+    response = jsonify({"query": query, "results": results, "truncated": hits is None})
+    # Keystrokes repeat prefixes (typing, then backspace), so let the browser
+    # reuse answers briefly; a cut-off answer must not be reused.
+    if hits is None:
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        response.headers["Cache-Control"] = (
+            f"private, max-age={config.search_suggest_cache_seconds}"
+        )
+    response.vary.add("Cookie")
+    return response
+
+
 @admin_blueprint.route("/Admin/SignupStatus")
 @admin_required
 def admin_signup_status():
-    return jsonify({"signup_disabled": signup_disabled})
+    return jsonify({"signup_disabled": runtime_settings.get("signup_disabled")})
 
 
 @admin_blueprint.route("/Admin/ToggleSignup", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_toggle_signup():
-    global signup_disabled
     disabled_value = request.form.get("disabled")
     if disabled_value is None and request.is_json:
         payload = request.get_json(silent=True) or {}
         disabled_value = payload.get("disabled")
-    signup_disabled = str(disabled_value).lower() in ("1", "true", "yes", "on")
+    try:
+        signup_disabled = runtime_settings.update({"signup_disabled": disabled_value})[
+            "signup_disabled"
+        ]
+    except exc.SQLAlchemyError as error:
+        current_app.logger.error(f"Error saving signup setting: {error}")
+        flash("خطا در ذخیره تنظیمات ثبت‌نام.", "error")
+        return redirect(request.referrer or url_for("admin.admin_dashboard"))
     flash(
         "ثبت‌نام کاربران غیر فعال شد." if signup_disabled else "ثبت‌نام کاربران فعال شد.",
         "success",
@@ -2213,8 +2104,45 @@ def admin_toggle_signup():
     return redirect(request.referrer or url_for("admin.admin_dashboard"))
 
 
+@admin_blueprint.route("/API/admin/Presence")
+@admin_required
+def api_presence():
+    "Online clients and admins, and who has a socket in a chat room"
+    snapshot = presence_registry.snapshot()
+    room = request.args.get("room")
+    if room:
+        snapshot["room"] = {"room": room, **presence_registry.room_members(room)}
+    return jsonify(snapshot)
+
+
+@admin_blueprint.route("/API/admin/RuntimeSettings", methods=["GET", "POST"])
+@admin_required
+@retry_on_db_lock
+def api_runtime_settings():
+    "Read or change runtime settings without restarting the server"
+    if request.method == "POST":
+        changes = request.get_json(silent=True) if request.is_json else None
+        if changes is None:
+            changes = {
+                key: value for key, value in request.form.items() if key != "csrf_token"
+            }
+        if not isinstance(changes, dict) or not changes:
+            return jsonify({"error": "no settings given"}), 400
+        try:
+            runtime_settings.update(changes)
+        except KeyError as error:
+            return jsonify({"error": f"unknown setting {error}"}), 400
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        except exc.SQLAlchemyError as error:
+            current_app.logger.error(f"Error saving runtime settings: {error}")
+            return jsonify({"error": "database error"}), 500
+    return jsonify(runtime_settings.values())
+
+
 @admin_blueprint.route("/Admin/MoveMember", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_move_member():
     member_id = _parse_nullable_int(request.form.get("member_id"))
     target_team_id = _parse_nullable_int(request.form.get("team_id"))
@@ -2255,6 +2183,7 @@ def admin_move_member():
     "/Admin/ManagePayment/<int:payment_id>/<action>", methods=["POST"]
 )
 @admin_required
+@retry_on_db_lock
 def admin_manage_payment(payment_id, action):
     "Approve or reject a pending payment"
     if action not in ["approve", "reject"]:
@@ -2341,7 +2270,7 @@ def _save_receipt_file(client_id: int, file_storage, old_filename: str | None =
     new_name = f"{uuid.uuid4()}.{extension}" if extension else str(uuid.uuid4())
     target_dir = os.path.join(constants.Path.receipts_dir, str(client_id))
     os.makedirs(target_dir, exist_ok=True)
-    file_storage.save(os.path.join(target_dir, new_name))
+    save_upload(file_storage, os.path.join(target_dir, new_name))
 
     if old_filename:
         old_path = os.path.join(target_dir, old_filename)
@@ -2355,6 +2284,7 @@ def _save_receipt_file(client_id: int, file_storage, old_filename: str | None =
 
 @admin_blueprint.route("/Admin/Payment/<int:payment_id>/Update", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_update_payment(payment_id):
     """Update a payment record (amount, members count, status, payer info, paid_at)."""
     with database.get_db_session() as db_session:
@@ -2410,6 +2340,7 @@ def admin_update_payment(payment_id):
 
 @admin_blueprint.route("/Admin/Payment/Add", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_add_payment():
     """Create a manual payment entry for a team."""
     team_id = _parse_nullable_int(request.form.get("team_id"))
@@ -2477,6 +2408,7 @@ def admin_add_payment():
 
 @admin_blueprint.route("/Admin/Payment/<int:payment_id>/DeleteReceipt", methods=["POST"])
 @admin_required
+@retry_on_db_lock
 def admin_delete_payment_receipt(payment_id):
     """Remove receipt file reference and delete the file from disk."""
     with database.get_db_session() as db_session:
@@ -2518,3 +2450,125 @@ def admin_logs():
             constants.admin_html_names_data["admin_logs"],
             logs=logs,
         )
+
+
+def _broadcast_summary(broadcast, progress) -> dict:
+    return {
+        "broadcast_id": broadcast.broadcast_id,
+        "channel": broadcast.channel.value,
+        "subject": broadcast.subject,
+        "status": broadcast.status.value,
+        "filters": json.loads(broadcast.filters or "{}"),
+        "total_recipients": broadcast.total_recipients,
+        "queued": broadcast.queued_count,
+        "delivery": progress,
+        "created_at": broadcast.created_at.isoformat(),
+        "finished_at": (
+            broadcast.finished_at.isoformat() if broadcast.finished_at else None
+        ),
+    }
+
+
+@admin_blueprint.route("/Admin/Broadcasts", methods=["GET", "POST"])
+@admin_required
+@retry_on_db_lock
+def admin_broadcasts():
+    """Create SMS/email announcements for filtered clients and follow their progress."""
+    with database.get_db_session() as db:
+        if request.method == "POST":
+            try:
+                channel = models.NotificationChannel(request.form.get("channel", ""))
+                filters = broadcasts.clean_filters(request.form)
+            except ValueError:
+                flash("کانال یا فیلترهای انتخاب شده نامعتبر است.", "error")
+                return redirect(url_for("admin.admin_broadcasts"))
+            body = request.form.get("body", "").strip()
+            subject = request.form.get("subject", "").strip() or None
+            if channel == models.NotificationChannel.EMAIL:
+                body = bleach.clean(
+                    body,
+                    tags=constants.AppConfig.allowed_bleach_tags,
+                    attributes=constants.AppConfig.allowed_bleach_attrs,
+                ).strip()
+            if not body or (channel == models.NotificationChannel.EMAIL and not subject):
+                flash("متن پیام و برای ایمیل، عنوان آن الزامی است.", "error")
+                return redirect(url_for("admin.admin_broadcasts"))
+            if (
+                channel == models.NotificationChannel.SMS
+                and not config.melli_payamak["template_id_broadcast"]
+            ):
+                flash(
+                    "قالب پیامک اطلاع‌رسانی تنظیم نشده است؛ "
+                    "ابتدا mellipayamak_template_id_broadcast را مقداردهی کنید.",
+                    "error",
+                )
+                return redirect(url_for("admin.admin_broadcasts"))
+            try:
+                # Counted before the insert so the count does not run while
+                # this session holds the SQLite write lock.
+                recipients = broadcasts.count_recipients(db, channel, filters)
+                broadcast = broadcast_runner.create(
+                    db, channel, body, subject=subject, filters=filters
+                )
+                broadcast.total_recipients = recipients
+                db.commit()
+            except exc.SQLAlchemyError as error:
+                db.rollback()
+                current_app.logger.error(f"Error creating broadcast: {error}")
+                flash("خطا در ثبت اطلاعیه.", "error")
+                return redirect(url_for("admin.admin_broadcasts"))
+            broadcast_runner.wake()
+            flash(
+                f"اطلاعیه برای {recipients} گیرنده در صف ارسال قرار گرفت.", "success"
+            )
+            return redirect(url_for("admin.admin_broadcasts"))
+
+        broadcast_list = (
+            db.query(models.Broadcast)
+            .order_by(models.Broadcast.broadcast_id.desc())
+            .limit(50)
+            .all()
+        )
+        progress = broadcast_runner.progress(
+            db, [broadcast.broadcast_id for broadcast in broadcast_list]
+        )
+        return render_template(
+            constants.admin_html_names_data["admin_broadcasts"],
+            broadcasts=broadcast_list,
+            progress=progress,
+            leagues=db.query(models.League).order_by(models.League.league_id).all(),
+            education_levels=list(constants.education_levels),
+        )
+
+
+@admin_blueprint.route("/Admin/Broadcasts/<int:broadcast_id>/Cancel", methods=["POST"])
+@admin_action_required
+def admin_cancel_broadcast(broadcast_id):
+    """Stop a broadcast and drop the messages that were not sent yet."""
+    if broadcast_runner.cancel(broadcast_id):
+        flash("ارسال اطلاعیه متوقف شد.", "success")
+    else:
+        flash("این اطلاعیه در حال ارسال نیست.", "warning")
+    return redirect(url_for("admin.admin_broadcasts"))
+
+
+@admin_blueprint.route("/API/admin/Broadcasts")
+@admin_required
+def api_broadcasts():
+    "Progress of the most recent broadcasts, for live updates"
+    with database.get_db_session() as db:
+        broadcast_list = (
+            db.query(models.Broadcast)
+            .order_by(models.Broadcast.broadcast_id.desc())
+            .limit(50)
+            .all()
+        )
+        progress = broadcast_runner.progress(
+            db, [broadcast.broadcast_id for broadcast in broadcast_list]
+        )
+        return jsonify(
+            [
+                _broadcast_summary(broadcast, progress[broadcast.broadcast_id])
+                for broadcast in broadcast_list
+            ]
+        )
@@ -1,17 +1,20 @@
 "Backend application for the airocup website using Flask framework"
 
 import os
+import re
 import sys
 import getpass
 import traceback
+import uuid
 import datetime
+import functools
 import logging
-import bcrypt
+import threading
+import click
 import jdatetime
 from persiantools.digits import en_to_fa
-from sqlalchemy import exc, func
+from sqlalchemy import exc, func, text
 import bleach
-from waitress import serve
 from flask import (
     Flask,
     render_template,
@@ -27,8 +30,22 @@ from . import database
 from . import constants
 from . import models
 from . import admin
+from . import broker
 from . import client
 from . import globals as globals_file
+from . import migrations
+from . import passwords
+from . import search_index
+from . import server
+from . import transactions
+from . import utils
+from .activity import activity_buffer
+from .chat_writer import PendingMessage, chat_writer
+from .metrics import metrics_sampler
+from .presence import ADMIN, CLIENT, presence_registry
+from .notifications import notification_outbox
+from .broadcasts import broadcast_runner
+from .settings import runtime_settings
 from .auth import admin_required
 from .extensions import csrf_protector, limiter, socket_io
 
@@ -41,7 +58,11 @@ flask_app = Flask(
 
 flask_app.secret_key = config.secret_key
 csrf_protector.init_app(flask_app)
-socket_io.init_app(flask_app)
+socket_io.init_app(
+    flask_app,
+    async_mode="threading",
+    **broker.socketio_queue_options(config.socketio_message_queue),
+)
 limiter.init_app(flask_app)
 
 flask_app.config.update(
@@ -57,21 +78,67 @@ flask_app.config.update(
 )
 
 
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+
+def bootstrap() -> None:
+    """Brings the schema up to date and starts background workers, once per process."""
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        migrations.ensure_current()
+        activity_buffer.start()
+        chat_writer.start()
+        presence_registry.start()
+        metrics_sampler.start()
+        notification_outbox.start()
+        broadcast_runner.start()
+        _bootstrapped = True
+
+
+def shutdown() -> None:
+    """Stops background workers and flushes buffered writes before exit."""
+    metrics_sampler.stop()
+    presence_registry.stop()
+    broadcast_runner.stop()
+    notification_outbox.stop()
+    chat_writer.stop()
+    activity_buffer.stop()
+    passwords.password_hasher.shutdown()
+
+
+@flask_app.before_request
+def bootstrap_on_first_request():
+    """Defers database bootstrap from import time to the first request."""
+    bootstrap()
+
+
+def _presence_identity():
+    "Return the presence session key, kind and identity of a logged-in session"
+    if session.get("admin_logged_in"):
+        session_key = session.setdefault("presence_id", uuid.uuid4().hex)
+        return session_key, ADMIN, session_key
+    client_id = session.get("client_id")
+    if not client_id:
+        return None
+    return session.setdefault("presence_id", uuid.uuid4().hex), CLIENT, client_id
+
+
 @flask_app.before_request
 def update_activity():
-    """Tracks user activity and daily site visits."""
+    """Tracks user activity and daily site visits through the activity buffer."""
     now = datetime.datetime.now(datetime.timezone.utc)
     today = now.date()
     client_id = session.get("client_id")
     if client_id:
-        try:
-            with database.get_db_session() as db:
-                db.query(models.Client).filter(
-                    models.Client.client_id == client_id
-                ).update({"last_seen": now})
-                db.commit()
-        except Exception as e:
-            flask_app.logger.error(f"Error updating last_seen: {e}")
+        activity_buffer.record_seen(client_id, now)
+    presence = _presence_identity() if request.endpoint != "static" else None
+    if presence:
+        presence_registry.heartbeat(*presence)
     last_updated_str = session.get("daily_stat_updated")
     should_update = False
 
@@ -86,29 +153,15 @@ def update_activity():
             should_update = True
 
     if should_update:
-        try:
-            with database.get_db_session() as db:
-                daily_stat = (
-                    db.query(models.DailyStat)
-                    .filter(models.DailyStat.date == today)
-                    .first()
-                )
-                if daily_stat:
-                    daily_stat.visit_count += 1
-                else:
-                    daily_stat = models.DailyStat(date=today, visit_count=1)
-                    db.add(daily_stat)
-                db.commit()
-            session["daily_stat_updated"] = today.isoformat()
-        except Exception as e:
-            flask_app.logger.error(f"Error updating daily stats: {e}")
-
-
-database.create_database()
-database.ensure_schema_upgrades()
-with database.get_db_session() as _db_bootstrap_session:
-    database.populate_geography_data(_db_bootstrap_session)
-    database.populate_leagues(_db_bootstrap_session)
+        activity_buffer.record_visit(today)
+        session["daily_stat_updated"] = today.isoformat()
+
+
+@flask_app.teardown_request
+def close_request_session(error=None):
+    """Commits or rolls back the request-scoped database session."""
+    database.close_request_session(error)
+
 
 flask_app.register_blueprint(admin.admin_blueprint)
 flask_app.register_blueprint(client.client_blueprint)
@@ -124,7 +177,8 @@ for path in [
     os.makedirs(path, exist_ok=True)
 
 
-def _compute_static_version_token() -> str:
+@functools.lru_cache(maxsize=None)
+def static_version_token() -> str:
     """Return a cache-busting token derived from core static asset mtimes."""
 
     tracked_assets = [
@@ -148,9 +202,6 @@ def _compute_static_version_token() -> str:
     return str(int(datetime.datetime.now().timestamp()))
 
 
-STATIC_VERSION_TOKEN = _compute_static_version_token()
-
-
 @flask_app.template_filter("formatdate")
 def format_date_filter(date_object):
     """Formats a datetime/date object to a Jalali date string (YYYY-MM-DD)."""
@@ -196,13 +247,14 @@ def inject_global_variables():
         "client_id": session.get("client_id") if has_request_context() else None,
         "provinces_data": constants.provinces_data,
     }
+    payment_config = runtime_settings.payment_config()
 
     return {
         "path": constants.Path,
         "app_config": {
             "max_team_per_client": constants.AppConfig.max_team_per_client,
             "max_members_per_team": constants.AppConfig.max_members_per_team,
-            "new_member_fee_per_league": config.payment_config.get(
+            "new_member_fee_per_league": payment_config.get(
                 "new_member_fee_per_league"
             ),
         },
@@ -216,12 +268,12 @@ def inject_global_variables():
         "cooperation_opportunities": constants.cooperation_opportunities_data,
         "jdatetime": jdatetime,
         "airocup_data": airocup_data,
-        "payment": config.payment_config,
+        "payment": payment_config,
         "committee_members": constants.committee_members_data,
         "technical_committee_members": constants.technical_committee_members,
         "homepage_sponsors": constants.homepage_sponsors_data,
         "app_version": config.app_version,
-        "static_version": STATIC_VERSION_TOKEN,
+        "static_version": static_version_token(),
     }
 
 
@@ -267,6 +319,28 @@ def handle_forbidden(error):
     return render_template(constants.global_html_names_data["403"]), 403
 
 
+@flask_app.errorhandler(503)
+def handle_service_unavailable(error):
+    """Handles 503 Service Unavailable errors, keeping any Retry-After header."""
+    flask_app.logger.warning(
+        "Service unavailable (503) at %s from %s: %s",
+        request.url,
+        request.remote_addr,
+        error,
+    )
+    headers = {}
+    if getattr(error, "retry_after", None):
+        headers["Retry-After"] = str(error.retry_after)
+    return (
+        render_template(
+            constants.global_html_names_data["503"],
+            retry_after=getattr(error, "retry_after", None),
+        ),
+        503,
+        headers,
+    )
+
+
 @flask_app.errorhandler(500)
 def handle_server_error(error):
     """Handles 500 Internal Server errors."""
@@ -289,6 +363,67 @@ def handle_server_error(error):
     return render_template(constants.global_html_names_data["500"]), 500
 
 
+ADMIN_INBOX_ROOM = "admin_inbox"
+CLIENT_MESSAGE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{8,64}")
+
+
+def _push_inbox_update(client_id: int) -> None:
+    "Send admins watching the inbox the fresh row for one client's chat"
+    with database.get_db_session() as db:
+        rows, _ = database.get_chat_inbox(db, client_id=client_id, limit=1)
+    if rows:
+        socket_io.emit(
+            "inbox_update", utils.chat_inbox_payload(rows[0]), to=ADMIN_INBOX_ROOM
+        )
+
+
+def _on_chat_saved(saved) -> None:
+    "Tell each room the stored ids of its messages and refresh the admin inbox"
+    by_room: dict[int, list[dict]] = {}
+    for message, message_id in saved:
+        by_room.setdefault(message.client_id, []).append(
+            {"client_message_id": message.client_message_id, "message_id": message_id}
+        )
+    for client_id, messages in by_room.items():
+        socket_io.emit(
+            "message_saved",
+            {"room": str(client_id), "messages": messages},
+            to=str(client_id),
+        )
+        _push_inbox_update(client_id)
+
+
+def _on_chat_failed(failed) -> None:
+    "Tell each room which messages could not be stored so senders can resend"
+    for message in failed:
+        socket_io.emit(
+            "message_failed",
+            {
+                "room": str(message.client_id),
+                "client_message_id": message.client_message_id,
+            },
+            to=str(message.client_id),
+        )
+
+
+chat_writer.on_saved = _on_chat_saved
+chat_writer.on_failed = _on_chat_failed
+
+
+@socket_io.on("connect")
+def handle_connect(auth=None):  # pylint: disable=unused-argument
+    """Registers the socket of a logged-in client or admin as online."""
+    presence = _presence_identity()
+    if presence:
+        presence_registry.connect(request.sid, presence[1], presence[2])
+
+
+@socket_io.on("disconnect")
+def handle_disconnect(*_args):
+    """Drops the socket from the presence registry."""
+    presence_registry.disconnect(request.sid)
+
+
 @socket_io.on("join")
 def on_join_message(data_dictionary):
     """Handles a user joining a chat room."""
@@ -297,9 +432,11 @@ def on_join_message(data_dictionary):
 
     if session.get("admin_logged_in", False):
         join_room(room_name)
+        presence_registry.join(request.sid, room_name)
         flask_app.logger.info("admin joined room %s", room_name)
     elif client_id and str(client_id) == str(room_name):
         join_room(str(client_id))
+        presence_registry.join(request.sid, str(client_id))
         flask_app.logger.info("client %s joined their room", client_id)
     else:
         flask_app.logger.warning(
@@ -310,9 +447,63 @@ def on_join_message(data_dictionary):
         return
 
 
+@socket_io.on("sync_history")
+def handle_sync_history(data_dictionary):
+    """Sends a (re)connecting socket the messages after its last seen id."""
+    bootstrap()
+    if not isinstance(data_dictionary, dict):
+        return
+    room_name = data_dictionary.get("room")
+    client_id = session.get("client_id") or session.get("client_id_for_resolution")
+    if not session.get("admin_logged_in", False) and not (
+        client_id and str(client_id) == str(room_name)
+    ):
+        flask_app.logger.warning(
+            "Unauthorized chat history sync by session %s for room %s",
+            client_id,
+            room_name,
+        )
+        return
+    try:
+        with database.get_db_session() as db:
+            page = utils.chat_history_page(
+                db,
+                int(room_name),
+                {
+                    "after": data_dictionary.get("after", 0),
+                    "limit": data_dictionary.get("limit"),
+                },
+            )
+    except (ValueError, TypeError, exc.SQLAlchemyError) as error:
+        flask_app.logger.error("Chat history sync error: %s", error)
+        return
+    emit("chat_history", {"room": str(room_name), **page})
+
+
+@socket_io.on("mark_read")
+def handle_mark_read(data_dictionary):
+    """Moves the admin read marker of a chat and refreshes every open inbox."""
+    bootstrap()
+    if not session.get("admin_logged_in", False) or not isinstance(
+        data_dictionary, dict
+    ):
+        return
+    try:
+        client_id = int(data_dictionary.get("room"))
+        message_id = data_dictionary.get("message_id")
+        message_id = int(message_id) if message_id is not None else None
+        transactions.run_write_transaction(
+            lambda db: database.mark_chat_read(db, client_id, message_id)
+        )
+        _push_inbox_update(client_id)
+    except (ValueError, TypeError, exc.SQLAlchemyError) as error:
+        flask_app.logger.error("Chat read marker error: %s", error)
+
+
 @socket_io.on("send_message")
 def handle_send_message(json_data):
     """Handles incoming chat messages and broadcasts them to the appropriate room."""
+    bootstrap()
     try:
         if not isinstance(json_data, dict):
             return
@@ -343,28 +534,44 @@ def handle_send_message(json_data):
         if len(sanitized_message) > 1000:
             sanitized_message = sanitized_message[:1000]
 
-        with database.get_db_session() as db:
-            saved_message = database.save_chat_message(
-                db, int(target_room), sanitized_message, sender_type
-            )
-
-        current_time = saved_message.timestamp
+        client_message_id = str(json_data.get("client_message_id") or "")
+        if not CLIENT_MESSAGE_ID_PATTERN.fullmatch(client_message_id):
+            client_message_id = uuid.uuid4().hex
+        pending = PendingMessage(
+            client_message_id=client_message_id,
+            client_id=int(target_room),
+            sender=sender_type,
+            message_text=sanitized_message,
+            timestamp=datetime.datetime.now(datetime.timezone.utc),
+        )
         emit(
             "new_message",
             {
                 "message": sanitized_message,
-                "timestamp": current_time.isoformat(),
-                "message_id": getattr(saved_message, "message_id", None),
+                "timestamp": pending.timestamp.isoformat(),
+                "client_message_id": client_message_id,
                 "sender": sender_type,
             },
             to=str(target_room),
             include_self=False,
         )
+        chat_writer.submit(pending)
+        return {
+            "client_message_id": client_message_id,
+            "timestamp": pending.timestamp.isoformat(),
+        }
 
     except (ValueError, TypeError, exc.SQLAlchemyError) as error:
         flask_app.logger.error("Chat message error: %s", error)
 
 
+@flask_app.route("/API/Presence/Heartbeat", methods=["POST"])
+@csrf_protector.exempt
+def presence_heartbeat():
+    "Keeps an open page counted as online; the lease is renewed in before_request"
+    return "", 204
+
+
 @flask_app.route("/uploads/receipts/<int:client_id>/<filename>")
 @admin_required
 def uploaded_receipt_file(client_id, filename):
@@ -461,7 +668,20 @@ def print_startup_message(host: str, port: int, mode: str) -> None:
     logger.info("🚀 airocup backend Server is launching...")
     logger.info("   - Version: %s", config.app_version)
     logger.info("   - Mode: %s", mode)
+    if not config.debug:
+        logger.info(
+            "   - Server: %s, %s worker(s) x %s threads, backlog %s",
+            config.server_mode,
+            config.server_workers,
+            config.server_threads,
+            config.server_backlog,
+        )
     logger.info("   - Database: Verified and connected successfully.")
+    logger.info(
+        "   - SQLite profile: %s %s",
+        database.sqlite_pragma_profile,
+        database.report_sqlite_pragmas(),
+    )
     logger.info("   - Listening on: http://%s:%s", host, port)
     logger.info(border)
 
@@ -469,13 +689,174 @@ def print_startup_message(host: str, port: int, mode: str) -> None:
 @flask_app.cli.command("init-db")
 def initialize_database_command() -> None:
     """Creates the database tables and populates geography/league data."""
-    database.create_database()
+    migrations.migrate()
+    logger.info("Database initialized successfully.")
 
-    with database.get_db_session() as db:
-        database.populate_geography_data(db)
-        database.populate_leagues(db)
 
-    logger.info("Database initialized successfully.")
+@flask_app.cli.command("db-migrate")
+@click.option("--status", is_flag=True, help="Only report the schema version.")
+def migrate_database_command(status) -> None:
+    """Applies pending schema migrations under the migration file lock."""
+    version = migrations.current_version()
+    if status:
+        logger.info(
+            "Schema version %s of %s; pending: %s",
+            version,
+            migrations.LATEST_VERSION,
+            [m.name for m in migrations.pending_migrations(version)] or "none",
+        )
+        return
+    applied = migrations.migrate()
+    logger.info(
+        "Applied %s migration(s); schema is at version %s.",
+        len(applied),
+        migrations.current_version(),
+    )
+
+
+@flask_app.cli.command("search-index")
+@click.option("--rebuild", is_flag=True, help="Reindex every searchable row.")
+def search_index_command(rebuild) -> None:
+    """Reports the admin search index size or rebuilds it from the tables."""
+    if rebuild:
+        with database.db_engine.begin() as connection:
+            counts = search_index.rebuild(connection)
+        logger.info("Search index rebuilt: %s", counts)
+        return
+    with database.db_engine.connect() as connection:
+        total = connection.execute(
+            text("SELECT count(*) FROM search_index")
+        ).scalar()
+    logger.info("Search index holds %s documents.", total)
+
+
+@flask_app.cli.command("db-pragmas")
+def report_database_pragmas_command() -> None:
+    """Prints the SQLite pragma profile and the values in effect."""
+    logger.info("SQLite pragma profile: %s", database.sqlite_pragma_profile)
+    for pragma, value in database.report_sqlite_pragmas().items():
+        logger.info("   - %s = %s", pragma, value)
+
+
+@flask_app.cli.command("db-benchmark")
+@click.option(
+    "--profile",
+    "profiles",
+    multiple=True,
+    type=click.Choice(list(database.SQLITE_PRAGMA_PROFILES)),
+    help="Profile to benchmark; repeat for several (default: all).",
+)
+@click.option("--writers", default=8, show_default=True, help="Concurrent writers.")
+@click.option("--readers", default=2, show_default=True, help="Concurrent readers.")
+@click.option("--seconds", default=5.0, show_default=True, help="Duration per profile.")
+def benchmark_database_command(profiles, writers, readers, seconds) -> None:
+    """Compares SQLite pragma profiles under concurrent writers on scratch files."""
+    from . import benchmarks
+
+    for result in benchmarks.benchmark_pragma_profiles(
+        profiles, writers=writers, readers=readers, seconds=seconds
+    ):
+        logger.info(
+            "%-10s commits/s=%-8s reads/s=%-8s lock_errors=%-4s "
+            "p50=%sms p95=%sms max=%sms",
+            result["profile"],
+            result["commits_per_second"],
+            result["reads_per_second"],
+            result["lock_errors"],
+            result["p50_ms"],
+            result["p95_ms"],
+            result["max_ms"],
+        )
+
+
+@flask_app.cli.command("chat-benchmark")
+@click.option(
+    "--mode",
+    "modes",
+    multiple=True,
+    type=click.Choice(list(server.SERVER_MODES)),
+    help="Server mode to benchmark; repeat for several (default: all).",
+)
+@click.option("--clients", default=100, show_default=True, help="Chat connections.")
+@click.option("--seconds", default=10.0, show_default=True, help="Hold duration.")
+@click.option("--threads", default=50, show_default=True, help="Server threads.")
+def benchmark_chat_command(modes, clients, seconds, threads) -> None:
+    """Compares concurrent chat connections across production server modes."""
+    from . import benchmarks
+
+    for result in benchmarks.benchmark_chat_connections(
+        modes, clients=clients, seconds=seconds, threads=threads
+    ):
+        logger.info(
+            "%-9s websocket=%-5s polling=%-5s failed=%-5s handshake p50=%sms "
+            "p95=%sms | page p50=%sms p95=%sms failures=%s",
+            result["mode"],
+            result["websocket"],
+            result["polling"],
+            result["failed"],
+            result["handshake_p50_ms"],
+            result["handshake_p95_ms"],
+            result["page_p50_ms"],
+            result["page_p95_ms"],
+            result["page_failures"],
+        )
+
+
+@flask_app.cli.command("socketio-broker")
+@click.option(
+    "--url",
+    default=lambda: config.socketio_message_queue or "tcp://127.0.0.1:6380",
+    show_default="socketio_message_queue",
+    help="tcp://host:port address to listen on.",
+)
+def run_socketio_broker_command(url) -> None:
+    """Runs the in-repo Socket.IO message queue for multi-process chat."""
+    broker.run_broker(url)
+
+
+@flask_app.cli.command("chat-delivery-check")
+@click.option("--messages", default=20, show_default=True, help="Messages each way.")
+def check_chat_delivery_command(messages) -> None:
+    """Checks that chat messages reach sockets held by another server process."""
+    from . import benchmarks
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config["SESSION_COOKIE_NAME"]
+    result = benchmarks.check_cross_process_delivery(
+        lambda data: f"{cookie_name}={serializer.dumps(data)}",
+        messages=messages,
+    )
+    logger.info(
+        "Delivered %s/%s (admin->client %s, client->admin %s) p50=%sms p95=%sms",
+        result["delivered"],
+        result["sent"],
+        result["admin_to_client"],
+        result["client_to_admin"],
+        result["p50_ms"],
+        result["p95_ms"],
+    )
+    if result["delivered"] != result["sent"]:
+        raise SystemExit(1)
+
+
+@flask_app.cli.command("notifications")
+@click.option("--retry-failed", is_flag=True, help="Requeue failed notifications.")
+@click.option("--drain", is_flag=True, help="Deliver due notifications, then exit.")
+def notifications_command(retry_failed, drain) -> None:
+    """Reports the notification outbox and optionally requeues or drains it."""
+    if retry_failed:
+        requeued = notification_outbox.requeue_failed()
+        logger.info("Requeued %s failed notifications.", requeued)
+    if drain:
+        delivered = 0
+        while True:
+            claimed = notification_outbox.run_once()
+            if not claimed:
+                break
+            delivered += claimed
+        logger.info("Processed %s notifications.", delivered)
+    for status, count in notification_outbox.counts().items():
+        logger.info("   - %s: %s", status, count)
 
 
 wsgi_app = flask_app
@@ -491,9 +872,7 @@ if __name__ == "__main__":
                 logger.info("-" * 50)
                 logger.info(
                     "admin_password_hash='%s'",
-                    bcrypt.hashpw(
-                        admin_password.encode("utf-8"), bcrypt.gensalt()
-                    ).decode("utf-8"),
+                    passwords.password_hasher.hash(admin_password),
                 )
                 logger.info("-" * 50)
             else:
@@ -502,12 +881,14 @@ if __name__ == "__main__":
             logger.error("خطایی رخ داد: %s", error)
         sys.exit()
 
-    host, port = "0.0.0.0", 5000
+    host, port = config.host, config.port
     MODE = "✅ Debug" if config.debug else "⛔ Production"
     if os.environ.get("WERKZEUG_RUN_MAIN") != "true":
         print_startup_message(host, port, MODE)
 
     if config.debug:
+        bootstrap()
         socket_io.run(flask_app, host=host, port=port, debug=config.debug)
     else:
-        serve(flask_app, host=host, port=port)
+        migrations.ensure_current()
+        server.run(flask_app, host, port, bootstrap, shutdown)
@@ -18,11 +18,7 @@ def login_required(decorated_route):
 
         if not session.get("needs_contact_completion"):
             with database.get_db_session() as db:
-                client = (
-                    db.query(models.Client)
-                    .filter(models.Client.client_id == session.get("client_id"))
-                    .first()
-                )
+                client = db.get(models.Client, session.get("client_id"))
 
                 if not client:
                     session.clear()
@@ -0,0 +1,434 @@
+"Micro-benchmarks and deployment checks run from the Flask CLI"
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Iterable, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from . import database
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _run_pragma_profile(
+    profile: str, directory: str, writers: int, readers: int, seconds: float
+) -> dict:
+    path = os.path.join(directory, f"bench_{profile}.db")
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=writers + readers,
+        max_overflow=0,
+    )
+    database.configure_sqlite_engine(engine, profile)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE bench_messages ("
+                "message_id INTEGER PRIMARY KEY, client_id INTEGER NOT NULL, "
+                "message_text TEXT NOT NULL, timestamp TEXT NOT NULL)"
+            )
+        )
+        connection.execute(
+            text("CREATE INDEX bench_messages_client_idx ON bench_messages(client_id)")
+        )
+
+    lock = threading.Lock()
+    latencies: list[float] = []
+    totals = {"commits": 0, "lock_errors": 0, "reads": 0}
+    deadline = time.monotonic() + seconds
+
+    def write_loop(worker_id: int) -> None:
+        local_latencies = []
+        commits = errors = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                with engine.begin() as connection:
+                    connection.execute(
+                        text(
+                            "INSERT INTO bench_messages "
+                            "(client_id, message_text, timestamp) "
+                            "VALUES (:client_id, :message_text, datetime('now'))"
+                        ),
+                        {"client_id": worker_id, "message_text": "x" * 120},
+                    )
+                commits += 1
+                local_latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            totals["commits"] += commits
+            totals["lock_errors"] += errors
+
+    def read_loop(worker_id: int) -> None:
+        reads = 0
+        while time.monotonic() < deadline:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(
+                        text(
+                            "SELECT message_id FROM bench_messages "
+                            "WHERE client_id = :client_id "
+                            "ORDER BY message_id DESC LIMIT 50"
+                        ),
+                        {"client_id": worker_id % max(1, writers)},
+                    ).all()
+                reads += 1
+            except OperationalError:
+                pass
+        with lock:
+            totals["reads"] += reads
+
+    threads = [
+        threading.Thread(target=write_loop, args=(i,)) for i in range(writers)
+    ] + [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        "profile": profile,
+        "commits": totals["commits"],
+        "commits_per_second": round(totals["commits"] / seconds, 1),
+        "reads_per_second": round(totals["reads"] / seconds, 1),
+        "lock_errors": totals["lock_errors"],
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "max_ms": round(max(latencies, default=0) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0,
+    }
+
+
+def benchmark_pragma_profiles(
+    profiles: Optional[Iterable[str]] = None,
+    writers: int = 8,
+    readers: int = 2,
+    seconds: float = 5.0,
+) -> list[dict]:
+    """Run concurrent chat-style inserts against a scratch database per profile."""
+    profiles = list(profiles or database.SQLITE_PRAGMA_PROFILES)
+    with tempfile.TemporaryDirectory(prefix="airocup-bench-") as directory:
+        return [
+            _run_pragma_profile(profile, directory, writers, readers, seconds)
+            for profile in profiles
+        ]
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _start_server(
+    mode: str, port: int, database_path: str, threads: int, **env_overrides
+):
+    "Launch ``python -m src.python.app`` in production mode on a scratch database"
+    import requests
+
+    env = dict(
+        os.environ,
+        flask_debug="false",
+        server_mode=mode,
+        server_workers="1",
+        server_threads=str(threads),
+        host="127.0.0.1",
+        port=str(port),
+        database_url=f"sqlite:///{database_path}",
+        **env_overrides,
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.python.app"],
+        cwd=_REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with code {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=2)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} server did not start within 60 seconds")
+
+
+def _hold_websocket(port: int, deadline: float) -> float:
+    "Open a Socket.IO connection over WebSocket and keep it until ``deadline``"
+    import simple_websocket
+
+    started = time.perf_counter()
+    ws = simple_websocket.Client.connect(
+        f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket"
+    )
+    try:
+        if not str(ws.receive(timeout=10) or "").startswith("0"):
+            raise ConnectionError("no Engine.IO open packet")
+        ws.send("40")
+        if not str(ws.receive(timeout=10) or "").startswith("40"):
+            raise ConnectionError("Socket.IO connect was not acknowledged")
+        handshake = time.perf_counter() - started
+        try:
+            while time.monotonic() < deadline:
+                if ws.receive(timeout=max(0.1, deadline - time.monotonic())) == "2":
+                    ws.send("3")
+        except simple_websocket.ConnectionClosed:
+            pass
+        return handshake
+    finally:
+        ws.close()
+
+
+def _hold_long_polling(port: int, deadline: float) -> float:
+    "Open a Socket.IO connection over HTTP long-polling and poll until ``deadline``"
+    import requests
+
+    url = f"http://127.0.0.1:{port}/socket.io/?EIO=4&transport=polling"
+    started = time.perf_counter()
+    with requests.Session() as http:
+        opened = http.get(url, timeout=30)
+        if not opened.text.startswith("0"):
+            raise ConnectionError("no Engine.IO open packet")
+        sid = opened.text.split('"sid":"', 1)[1].split('"', 1)[0]
+        url = f"{url}&sid={sid}"
+        http.post(url, data="40", timeout=30).raise_for_status()
+        if "40" not in http.get(url, timeout=30).text:
+            raise ConnectionError("Socket.IO connect was not acknowledged")
+        handshake = time.perf_counter() - started
+        try:
+            while time.monotonic() < deadline:
+                if http.get(url, timeout=60).text == "2":
+                    http.post(url, data="3", timeout=30)
+        except requests.RequestException:
+            pass
+        return handshake
+
+
+def _run_chat_connections(
+    mode: str, directory: str, clients: int, seconds: float, threads: int
+) -> dict:
+    import requests
+
+    port = _free_port()
+    process = _start_server(
+        mode, port, os.path.join(directory, f"chat_{mode}.db"), threads
+    )
+    lock = threading.Lock()
+    handshakes: list[float] = []
+    transports = {"websocket": 0, "polling": 0, "failed": 0}
+    deadline = time.monotonic() + seconds
+
+    def chat_client() -> None:
+        for transport, hold in (
+            ("websocket", _hold_websocket),
+            ("polling", _hold_long_polling),
+        ):
+            try:
+                handshake = hold(port, deadline)
+            except Exception:  # pylint: disable=broad-except
+                continue
+            with lock:
+                transports[transport] += 1
+                handshakes.append(handshake)
+            return
+        with lock:
+            transports["failed"] += 1
+
+    threads_list = [
+        threading.Thread(target=chat_client, daemon=True) for _ in range(clients)
+    ]
+    try:
+        for thread in threads_list:
+            thread.start()
+        probe_latencies: list[float] = []
+        probe_failures = 0
+        time.sleep(min(2.0, seconds / 4))
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                requests.get(f"http://127.0.0.1:{port}/", timeout=5).raise_for_status()
+                probe_latencies.append(time.perf_counter() - started)
+            except requests.RequestException:
+                probe_failures += 1
+            time.sleep(0.2)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    for thread in threads_list:
+        thread.join(timeout=5)
+
+    return {
+        "mode": mode,
+        "clients": clients,
+        "websocket": transports["websocket"],
+        "polling": transports["polling"],
+        "failed": transports["failed"],
+        "handshake_p50_ms": round(_percentile(handshakes, 0.5) * 1000, 2),
+        "handshake_p95_ms": round(_percentile(handshakes, 0.95) * 1000, 2),
+        "page_p50_ms": round(_percentile(probe_latencies, 0.5) * 1000, 2),
+        "page_p95_ms": round(_percentile(probe_latencies, 0.95) * 1000, 2),
+        "page_failures": probe_failures,
+    }
+
+
+def benchmark_chat_connections(
+    modes: Optional[Iterable[str]] = None,
+    clients: int = 100,
+    seconds: float = 10.0,
+    threads: int = 50,
+) -> list[dict]:
+    """Hold ``clients`` chat connections per server mode while timing page loads.
+
+    Each mode runs as a real ``python -m src.python.app`` process on a scratch
+    database. Clients try WebSocket first and fall back to long-polling like
+    the browser does; a page request every 200 ms shows whether held chat
+    connections starve ordinary HTTP traffic.
+    """
+    from . import server
+
+    modes = list(modes or server.SERVER_MODES)
+    with tempfile.TemporaryDirectory(prefix="airocup-bench-") as directory:
+        return [
+            _run_chat_connections(mode, directory, clients, seconds, threads)
+            for mode in modes
+        ]
+
+
+def _socketio_connect(port: int, cookie: str):
+    "Open a WebSocket Socket.IO connection carrying the given session cookie"
+    import simple_websocket
+
+    ws = simple_websocket.Client.connect(
+        f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket",
+        headers={"Cookie": cookie},
+    )
+    if not str(ws.receive(timeout=10) or "").startswith("0"):
+        raise ConnectionError("no Engine.IO open packet")
+    ws.send("40")
+    if not str(ws.receive(timeout=10) or "").startswith("40"):
+        raise ConnectionError("Socket.IO connect was not acknowledged")
+    return ws
+
+
+def _socketio_emit(ws, event: str, payload: dict) -> None:
+    ws.send("42" + json.dumps([event, payload]))
+
+
+def _socketio_wait(ws, event: str, timeout: float) -> Optional[dict]:
+    "Return the payload of the next ``event`` packet, or ``None`` on timeout"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        packet = ws.receive(timeout=max(0.01, deadline - time.monotonic()))
+        if packet == "2":
+            ws.send("3")
+        elif isinstance(packet, str) and packet.startswith("42"):
+            name, data = json.loads(packet[2:])
+            if name == event:
+                return data
+    return None
+
+
+def check_cross_process_delivery(
+    session_cookie: Callable[[dict], str],
+    messages: int = 20,
+    timeout: float = 5.0,
+) -> dict:
+    """Send chat messages between two gunicorn processes joined by the broker.
+
+    A client socket on the first process and an admin socket on the second
+    both join the client's room; messages then go both ways and every one
+    has to arrive on the other process within ``timeout`` seconds.
+    ``session_cookie`` turns session data into a ``Cookie`` header value.
+    """
+    from . import broker
+
+    broker_port = _free_port()
+    hub = broker.BrokerServer(("127.0.0.1", broker_port))
+    threading.Thread(target=hub.serve_forever, daemon=True).start()
+    processes = []
+    sockets = []
+    latencies: list[float] = []
+    delivered = {"admin_to_client": 0, "client_to_admin": 0}
+    try:
+        with tempfile.TemporaryDirectory(prefix="airocup-check-") as directory:
+            database_path = os.path.join(directory, "delivery.db")
+            ports = [_free_port(), _free_port()]
+            for port in ports:
+                processes.append(
+                    _start_server(
+                        "gunicorn",
+                        port,
+                        database_path,
+                        threads=20,
+                        socketio_message_queue=f"tcp://127.0.0.1:{broker_port}",
+                    )
+                )
+            client_ws = _socketio_connect(ports[0], session_cookie({"client_id": 1}))
+            admin_ws = _socketio_connect(
+                ports[1], session_cookie({"admin_logged_in": True})
+            )
+            sockets = [client_ws, admin_ws]
+            for ws in sockets:
+                _socketio_emit(ws, "join", {"room": "1"})
+            time.sleep(1.0)
+
+            for index in range(messages):
+                for direction, sender, receiver in (
+                    ("admin_to_client", admin_ws, client_ws),
+                    ("client_to_admin", client_ws, admin_ws),
+                ):
+                    text_value = f"{direction} {index}"
+                    started = time.perf_counter()
+                    _socketio_emit(
+                        sender, "send_message", {"message": text_value, "room": "1"}
+                    )
+                    payload = _socketio_wait(receiver, "new_message", timeout)
+                    if payload and payload.get("message") == text_value:
+                        delivered[direction] += 1
+                        latencies.append(time.perf_counter() - started)
+    finally:
+        for ws in sockets:
+            ws.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=40)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        hub.shutdown()
+        hub.server_close()
+
+    return {
+        "sent": messages * 2,
+        "delivered": sum(delivered.values()),
+        **delivered,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+    }
@@ -0,0 +1,472 @@
+"Admin announcements fanned out to filtered clients through the notification outbox"
+
+import atexit
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Mapping, Optional
+from sqlalchemy import and_, exists, func, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from . import config
+from . import constants
+from . import database
+from . import models
+from . import transactions
+from .notifications import notification_outbox
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_FILTERS = ("approved", "pending", "rejected", "unpaid")
+_ACTIVE_STATUSES = (models.BroadcastStatus.QUEUED, models.BroadcastStatus.RUNNING)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def clean_filters(raw: Mapping[str, Any]) -> dict[str, Any]:
+    """Validate submitted filters; raises ``ValueError`` on unknown values."""
+    filters: dict[str, Any] = {}
+    league_id = str(raw.get("league_id") or "").strip()
+    if league_id:
+        filters["league_id"] = int(league_id)
+    education_level = str(raw.get("education_level") or "").strip()
+    if education_level:
+        if education_level not in constants.allowed_education:
+            raise ValueError(f"unknown education level {education_level!r}")
+        filters["education_level"] = education_level
+    payment_status = str(raw.get("payment_status") or "").strip()
+    if payment_status:
+        if payment_status not in PAYMENT_FILTERS:
+            raise ValueError(f"unknown payment status {payment_status!r}")
+        filters["payment_status"] = payment_status
+    return filters
+
+
+def recipients_query(
+    channel: models.NotificationChannel, filters: Mapping[str, Any], after_id: int = 0
+):
+    """Active clients matching ``filters`` with an address for ``channel``.
+
+    Any team filter restricts the audience to clients owning an active team
+    that matches all of them; without filters every active client is a
+    recipient. Rows come back ordered by ``client_id`` so ``after_id`` pages.
+    """
+    client = models.Client
+    team = models.Team
+    payment = models.Payment
+    address = (
+        client.phone_number
+        if channel == models.NotificationChannel.SMS
+        else client.email
+    )
+    query = select(client.client_id, address.label("recipient")).where(
+        client.status == models.EntityStatus.ACTIVE,
+        address.isnot(None),
+        address != "",
+        client.client_id > after_id,
+    )
+    team_conditions = []
+    if filters.get("league_id"):
+        team_conditions.append(
+            or_(
+                team.league_one_id == filters["league_id"],
+                team.league_two_id == filters["league_id"],
+            )
+        )
+    if filters.get("education_level"):
+        team_conditions.append(team.education_level == filters["education_level"])
+    payment_status = filters.get("payment_status")
+    if payment_status == "unpaid":
+        team_conditions.append(
+            ~exists().where(
+                payment.team_id == team.team_id,
+                payment.status == models.PaymentStatus.APPROVED,
+            )
+        )
+    elif payment_status:
+        team_conditions.append(
+            exists().where(
+                payment.team_id == team.team_id,
+                payment.status == models.PaymentStatus(payment_status),
+            )
+        )
+    if team_conditions:
+        query = query.where(
+            exists().where(
+                and_(
+                    team.client_id == client.client_id,
+                    team.status == models.EntityStatus.ACTIVE,
+                    *team_conditions,
+                )
+            )
+        )
+    return query.order_by(client.client_id)
+
+
+def count_recipients(
+    db: Session, channel: models.NotificationChannel, filters: Mapping[str, Any]
+) -> int:
+    "Number of clients a broadcast with these filters would reach"
+    return db.execute(
+        select(func.count()).select_from(
+            recipients_query(channel, filters).order_by(None).subquery()
+        )
+    ).scalar_one()
+
+
+class BroadcastRunner:
+    """Turns queued broadcasts into outbox rows at a steady rate.
+
+    Recipients are read in keyset pages of ``batch_size`` clients, so memory
+    stays flat and no read transaction is held while the runner waits. Each
+    page is inserted into the outbox in the same transaction that advances
+    the broadcast's ``last_client_id``, which makes progress resumable after
+    a restart without sending anyone the message twice. Pages are paced to
+    ``rate_per_second`` and held back while more than ``max_backlog`` of the
+    broadcast's messages are still waiting for delivery; the outbox claims
+    messages outside any broadcast first, so verification codes never queue
+    behind an announcement. A lease keeps two processes
+    from running the same broadcast.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        rate_per_second: float = 5.0,
+        max_backlog: int = 200,
+        lease: float = 120.0,
+        poll_interval: float = 5.0,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.rate_per_second = rate_per_second
+        self.max_backlog = max(self.batch_size, max_backlog)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._exit_hook_registered = False
+
+    @staticmethod
+    def _owner() -> str:
+        # Read per call: forked server workers must not share the master's id.
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def create(
+        self,
+        db: Session,
+        channel: models.NotificationChannel,
+        body: str,
+        subject: Optional[str] = None,
+        filters: Optional[Mapping[str, Any]] = None,
+    ) -> models.Broadcast:
+        "Queue a broadcast in ``db``; the runner picks it up after the commit"
+        broadcast = models.Broadcast(
+            channel=channel,
+            subject=subject,
+            body=body,
+            template_id=(
+                config.melli_payamak["template_id_broadcast"]
+                if channel == models.NotificationChannel.SMS
+                else None
+            ),
+            filters=json.dumps(dict(filters or {}), ensure_ascii=False),
+            status=models.BroadcastStatus.QUEUED,
+            queued_count=0,
+            last_client_id=0,
+            created_at=_utcnow(),
+        )
+        db.add(broadcast)
+        return broadcast
+
+    def cancel(self, broadcast_id: int) -> bool:
+        "Stop a broadcast and drop its undelivered messages"
+
+        def _cancel(db: Session) -> bool:
+            now = _utcnow()
+            cancelled = db.execute(
+                update(models.Broadcast)
+                .where(
+                    models.Broadcast.broadcast_id == broadcast_id,
+                    models.Broadcast.status.in_(_ACTIVE_STATUSES),
+                )
+                .values(
+                    status=models.BroadcastStatus.CANCELLED,
+                    finished_at=now,
+                    lease_owner=None,
+                    lease_until=None,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.execute(
+                update(models.Notification)
+                .where(
+                    models.Notification.broadcast_id == broadcast_id,
+                    models.Notification.status == models.NotificationStatus.PENDING,
+                )
+                .values(
+                    status=models.NotificationStatus.FAILED,
+                    last_error="broadcast cancelled",
+                )
+                .execution_options(synchronize_session=False)
+            )
+            return bool(cancelled)
+
+        return transactions.run_write_transaction(_cancel)
+
+    @staticmethod
+    def progress(db: Session, broadcast_ids: list[int]) -> dict[int, dict[str, int]]:
+        "Delivery counts per outbox status for each broadcast"
+        totals = {
+            broadcast_id: {status.value: 0 for status in models.NotificationStatus}
+            for broadcast_id in broadcast_ids
+        }
+        if not broadcast_ids:
+            return totals
+        rows = db.execute(
+            select(
+                models.Notification.broadcast_id,
+                models.Notification.status,
+                func.count(),
+            )
+            .where(models.Notification.broadcast_id.in_(broadcast_ids))
+            .group_by(models.Notification.broadcast_id, models.Notification.status)
+        ).all()
+        for broadcast_id, status, count in rows:
+            totals[broadcast_id][status.value] = count
+        return totals
+
+    def claim(self):
+        "Lease the oldest unfinished broadcast to this process, if any"
+        broadcast = models.Broadcast
+        owner = self._owner()
+
+        def _claim(db: Session):
+            now = _utcnow()
+            claimable = and_(
+                broadcast.status.in_(_ACTIVE_STATUSES),
+                or_(
+                    broadcast.lease_until.is_(None),
+                    broadcast.lease_until < now,
+                    broadcast.lease_owner == owner,
+                ),
+            )
+            candidate = (
+                select(broadcast.broadcast_id)
+                .where(claimable)
+                .order_by(broadcast.broadcast_id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            return db.execute(
+                update(broadcast)
+                .where(broadcast.broadcast_id == candidate, claimable)
+                .values(
+                    status=models.BroadcastStatus.RUNNING,
+                    lease_owner=owner,
+                    lease_until=now + datetime.timedelta(seconds=self.lease),
+                    started_at=func.coalesce(broadcast.started_at, now),
+                )
+                .returning(
+                    broadcast.broadcast_id,
+                    broadcast.channel,
+                    broadcast.subject,
+                    broadcast.body,
+                    broadcast.template_id,
+                    broadcast.filters,
+                    broadcast.last_client_id,
+                    broadcast.total_recipients,
+                )
+                .execution_options(synchronize_session=False)
+            ).first()
+
+        return transactions.run_write_transaction(_claim)
+
+    def _owned(self, broadcast_id: int):
+        return and_(
+            models.Broadcast.broadcast_id == broadcast_id,
+            models.Broadcast.lease_owner == self._owner(),
+            models.Broadcast.status == models.BroadcastStatus.RUNNING,
+        )
+
+    def _store_batch(self, claimed, recipients: list) -> bool:
+        "Queue one page and advance the cursor; False once the lease is lost"
+
+        def _store(db: Session) -> bool:
+            renewed = db.execute(
+                update(models.Broadcast)
+                .where(self._owned(claimed.broadcast_id))
+                .values(
+                    last_client_id=recipients[-1].client_id,
+                    queued_count=models.Broadcast.queued_count + len(recipients),
+                    lease_until=_utcnow() + datetime.timedelta(seconds=self.lease),
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not renewed:
+                return False
+            notification_outbox.enqueue_many(
+                db,
+                [
+                    {
+                        "client_id": row.client_id,
+                        "broadcast_id": claimed.broadcast_id,
+                        "channel": claimed.channel,
+                        "recipient": row.recipient,
+                        "subject": claimed.subject,
+                        "body": claimed.body,
+                        "template_id": claimed.template_id,
+                    }
+                    for row in recipients
+                ],
+            )
+            return True
+
+        return transactions.run_write_transaction(_store)
+
+    def _finish(self, broadcast_id: int) -> None:
+        def _complete(db: Session) -> None:
+            db.execute(
+                update(models.Broadcast)
+                .where(self._owned(broadcast_id))
+                .values(
+                    status=models.BroadcastStatus.COMPLETED,
+                    finished_at=_utcnow(),
+                    lease_owner=None,
+                    lease_until=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        transactions.run_write_transaction(_complete)
+
+    def _release(self, broadcast_id: int) -> None:
+        "Hand a running broadcast back so any process can resume it at once"
+        transactions.run_write_transaction(
+            lambda db: db.execute(
+                update(models.Broadcast)
+                .where(self._owned(broadcast_id))
+                .values(lease_owner=None, lease_until=None)
+                .execution_options(synchronize_session=False)
+            )
+        )
+
+    def _backlog(self, broadcast_id: int) -> int:
+        with database.get_db_session() as db:
+            return db.execute(
+                select(func.count()).where(
+                    models.Notification.broadcast_id == broadcast_id,
+                    models.Notification.status.in_(
+                        (
+                            models.NotificationStatus.PENDING,
+                            models.NotificationStatus.SENDING,
+                        )
+                    ),
+                )
+            ).scalar_one()
+
+    def _wait_for_backlog(self, broadcast_id: int) -> None:
+        while (
+            not self._stop_event.is_set()
+            and self._backlog(broadcast_id) > self.max_backlog - self.batch_size
+        ):
+            self._stop_event.wait(1.0)
+
+    def run(self, claimed) -> None:
+        "Queue the rest of a claimed broadcast, page by page"
+        filters = json.loads(claimed.filters or "{}")
+        if claimed.total_recipients is None:
+            with database.get_db_session() as db:
+                total = count_recipients(db, claimed.channel, filters)
+            transactions.run_write_transaction(
+                lambda db: db.execute(
+                    update(models.Broadcast)
+                    .where(models.Broadcast.broadcast_id == claimed.broadcast_id)
+                    .values(total_recipients=total)
+                    .execution_options(synchronize_session=False)
+                )
+            )
+        cursor = claimed.last_client_id
+        while not self._stop_event.is_set():
+            self._wait_for_backlog(claimed.broadcast_id)
+            started = time.monotonic()
+            with database.get_db_session() as db:
+                recipients = db.execute(
+                    recipients_query(claimed.channel, filters, cursor).limit(
+                        self.batch_size
+                    )
+                ).all()
+            if not recipients:
+                self._finish(claimed.broadcast_id)
+                logger.info("Broadcast %s fully queued", claimed.broadcast_id)
+                return
+            if not self._store_batch(claimed, recipients):
+                logger.info("Broadcast %s stopped or taken over", claimed.broadcast_id)
+                return
+            cursor = recipients[-1].client_id
+            if self.rate_per_second > 0:
+                pause = len(recipients) / self.rate_per_second
+                self._stop_event.wait(max(0.0, pause - (time.monotonic() - started)))
+        self._release(claimed.broadcast_id)
+
+    def run_once(self) -> bool:
+        "Claim and run one broadcast; return whether there was one"
+        claimed = self.claim()
+        if claimed is None:
+            return False
+        logger.info(
+            "Running broadcast %s from client %s",
+            claimed.broadcast_id,
+            claimed.last_client_id,
+        )
+        self.run(claimed)
+        return True
+
+    def wake(self) -> None:
+        "Look for queued broadcasts now instead of at the next poll"
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except SQLAlchemyError as error:
+                logger.error("Error running broadcasts: %s", error)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        "Start the broadcast thread once per process"
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="broadcast-runner", daemon=True
+        )
+        self._thread.start()
+        if not self._exit_hook_registered:
+            atexit.register(self.stop)
+            self._exit_hook_registered = True
+
+    def stop(self) -> None:
+        "Stop after the current page, leaving the broadcast for any process to resume"
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 15)
+            self._thread = None
+
+
+broadcast_runner = BroadcastRunner(
+    batch_size=config.broadcast_batch_size,
+    rate_per_second=config.broadcast_rate_per_second,
+    max_backlog=config.broadcast_max_backlog,
+    lease=config.broadcast_lease,
+)
@@ -0,0 +1,251 @@
+"Socket.IO message queue that fans chat events out across server processes"
+
+import json
+import logging
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+import socketio
+
+logger = logging.getLogger(__name__)
+
+_SUBSCRIBE = b"SUBSCRIBE\n"
+
+
+def _parse_address(url: str) -> tuple[str, int]:
+    parsed = urlparse(url)
+    if parsed.scheme != "tcp" or not parsed.hostname or not parsed.port:
+        raise ValueError(f"expected a tcp://host:port broker URL, got {url!r}")
+    return parsed.hostname, parsed.port
+
+
+class _Subscriber:
+    """Outgoing queue of one subscriber, drained by its own writer thread.
+
+    Only the writer thread sends on the socket, so lines published from
+    several handler threads never interleave inside one ``sendall``.
+    """
+
+    def __init__(self, connection: socket.socket, backlog: int):
+        self.connection = connection
+        self.lines: queue.Queue = queue.Queue(maxsize=backlog)
+        self.writer = threading.Thread(
+            target=self._write, name="broker-subscriber", daemon=True
+        )
+
+    def offer(self, line: bytes) -> bool:
+        "Queue ``line`` for sending; False when the subscriber has fallen behind"
+        try:
+            self.lines.put_nowait(line)
+        except queue.Full:
+            return False
+        return True
+
+    def stop(self) -> None:
+        "Let the writer thread finish and close the connection"
+        try:
+            self.lines.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _write(self) -> None:
+        while True:
+            line = self.lines.get()
+            if line is None:
+                return
+            try:
+                self.connection.sendall(line)
+            except OSError:
+                self.stop()
+                return
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        broker: BrokerServer = self.server
+        first_line = self.rfile.readline()
+        if first_line == _SUBSCRIBE:
+            broker.add_subscriber(self.request)
+            try:
+                while True:
+                    try:
+                        if not self.request.recv(4096):
+                            break
+                    except TimeoutError:
+                        continue
+            except OSError:
+                pass
+            finally:
+                broker.remove_subscriber(self.request)
+            return
+        line = first_line
+        while line:
+            broker.publish(line)
+            line = self.rfile.readline()
+
+
+class BrokerServer(socketserver.ThreadingTCPServer):
+    """Line-oriented pub/sub hub: every published line goes to every subscriber.
+
+    Publishers and subscribers use separate connections; a connection becomes
+    a subscriber by sending ``SUBSCRIBE`` as its first line. Each subscriber
+    has its own writer thread and a queue of up to ``subscriber_backlog``
+    lines; a subscriber whose queue is full, or that cannot take a line
+    within ``send_timeout``, is dropped rather than stalling the others.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        send_timeout: float = 5.0,
+        subscriber_backlog: int = 10000,
+    ):
+        super().__init__(address, _BrokerHandler)
+        self.send_timeout = send_timeout
+        self.subscriber_backlog = subscriber_backlog
+        self._lock = threading.Lock()
+        self._subscribers: dict[socket.socket, _Subscriber] = {}
+
+    def add_subscriber(self, connection: socket.socket) -> None:
+        "Start delivering published lines to ``connection``"
+        connection.settimeout(self.send_timeout)
+        subscriber = _Subscriber(connection, self.subscriber_backlog)
+        with self._lock:
+            self._subscribers[connection] = subscriber
+        subscriber.writer.start()
+
+    def remove_subscriber(self, connection: socket.socket) -> None:
+        "Stop delivering to ``connection``"
+        with self._lock:
+            subscriber = self._subscribers.pop(connection, None)
+        if subscriber is not None:
+            subscriber.stop()
+
+    def publish(self, line: bytes) -> None:
+        "Queue ``line`` for every subscriber, dropping the ones that fell behind"
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for subscriber in subscribers:
+            if not subscriber.offer(line):
+                logger.warning("Dropping a broker subscriber that fell behind")
+                self.remove_subscriber(subscriber.connection)
+
+
+def run_broker(url: str) -> None:
+    "Serve the broker on the address in ``url`` until interrupted"
+    with BrokerServer(_parse_address(url)) as broker:
+        logger.info("Socket.IO broker listening on %s", url)
+        broker.serve_forever()
+
+
+class BrokerClient:
+    """Publishes to and listens on one channel of a ``BrokerServer``.
+
+    Frames are JSON lines ``{"channel": ..., "data": ...}``; ``listen``
+    yields the ``data`` of frames on this channel and reconnects with
+    backoff when the broker goes away.
+    """
+
+    def __init__(self, url: str, channel: str, json_module=None):
+        self.channel = channel
+        self.json = json_module or json
+        self._address = _parse_address(url)
+        self._publish_lock = threading.Lock()
+        self._publisher: Optional[socket.socket] = None
+
+    def _frame(self, data) -> bytes:
+        return (self.json.dumps({"channel": self.channel, "data": data}) + "\n").encode()
+
+    def publish(self, data) -> None:
+        "Send ``data`` to every listener of the channel, reconnecting once"
+        frame = self._frame(data)
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = socket.create_connection(
+                            self._address, timeout=5
+                        )
+                    self._publisher.sendall(frame)
+                    return
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt:
+                        raise
+
+    def listen(self) -> Iterator:
+        "Yield the data of every frame published on the channel, forever"
+        delay = 1
+        while True:
+            try:
+                with socket.create_connection(self._address) as connection:
+                    connection.sendall(_SUBSCRIBE)
+                    delay = 1
+                    for line in connection.makefile("rb"):
+                        try:
+                            message = self.json.loads(line.decode("utf-8"))
+                        except (UnicodeDecodeError, ValueError):
+                            continue
+                        if message.get("channel") == self.channel:
+                            yield message.get("data")
+            except OSError as error:
+                logger.error("Socket.IO broker connection failed: %s", error)
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+class BrokerManager(socketio.PubSubManager):
+    """Socket.IO client manager that shares events through ``BrokerServer``.
+
+    Used for ``tcp://host:port`` message queue URLs; each server process
+    publishes its emits and room changes to the broker and replays what the
+    other processes publish.
+    """
+
+    name = "airocup"
+
+    def __init__(
+        self,
+        url: str = "tcp://127.0.0.1:6380",
+        channel: str = "socketio",
+        write_only: bool = False,
+        logger=None,  # pylint: disable=redefined-outer-name
+        json=None,  # pylint: disable=redefined-outer-name
+    ):
+        super().__init__(
+            channel=channel, write_only=write_only, logger=logger, json=json
+        )
+        self._client = BrokerClient(url, channel, self.json)
+
+    def _publish(self, data):
+        self._client.publish(data)
+
+    def _listen(self):
+        yield from self._client.listen()
+
+
+def socketio_queue_options(url: Optional[str]) -> dict:
+    """Keyword arguments for ``SocketIO.init_app`` selecting the message queue.
+
+    ``tcp://`` URLs use the in-repo ``BrokerManager``; any other URL (for
+    example ``redis://``) is handed to Flask-SocketIO as ``message_queue``.
+    An empty URL keeps events inside the current process.
+    """
+    if not url:
+        return {}
+    if url.startswith("tcp://"):
+        return {"client_manager": BrokerManager(url)}
+    return {"message_queue": url}
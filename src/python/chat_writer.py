@@ -0,0 +1,207 @@
+"Group-commit buffer that persists chat messages off the Socket.IO event thread"
+
+import atexit
+import datetime
+import logging
+import threading
+from typing import Callable, NamedTuple, Optional
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from . import config
+from . import models
+from . import transactions
+
+logger = logging.getLogger(__name__)
+
+
+class PendingMessage(NamedTuple):
+    """A chat message already delivered to the room but not yet stored."""
+
+    client_message_id: str
+    client_id: int
+    sender: str
+    message_text: str
+    timestamp: datetime.datetime
+
+
+SavedCallback = Callable[[list[tuple[PendingMessage, int]]], None]
+FailedCallback = Callable[[list[PendingMessage]], None]
+
+
+class ChatWriteBuffer:
+    """Stores chat messages in batches, one write transaction per batch.
+
+    ``submit`` only queues the message, so the event handler can emit it at
+    once. A single writer thread waits up to ``flush_interval`` seconds after
+    the first queued message (less when ``batch_size`` messages are waiting)
+    and inserts the whole batch with one multi-row INSERT in arrival order,
+    so ``message_id`` follows the order messages reached this process.
+
+    Rows are keyed by ``(client_id, client_message_id)`` and inserted with
+    ``ON CONFLICT DO NOTHING``: a sender that never saw its message confirmed
+    can resend it after a crash or reconnect without creating a duplicate.
+    Lock timeouts put the batch back at the head of the queue; any other
+    error falls back to one transaction per message so a single bad row
+    cannot drop its neighbours. ``on_saved`` and ``on_failed`` receive the
+    outcome of every flush.
+    """
+
+    def __init__(self, flush_interval: float = 0.005, batch_size: int = 100):
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.on_saved: Optional[SavedCallback] = None
+        self.on_failed: Optional[FailedCallback] = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending: list[PendingMessage] = []
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._exit_hook_registered = False
+
+    def submit(self, message: PendingMessage) -> None:
+        "Queue a message; it is written inline when no writer thread runs"
+        with self._condition:
+            self._pending.append(message)
+            queued = len(self._pending)
+            if queued == 1 or queued >= self.batch_size:
+                self._condition.notify()
+        if self._thread is None or not self._thread.is_alive():
+            self.flush()
+
+    def pending_count(self) -> int:
+        "Return the number of messages waiting to be written"
+        with self._condition:
+            return len(self._pending)
+
+    def _insert(self, db, batch: list[PendingMessage]) -> dict[tuple[int, str], int]:
+        statement = sqlite_insert(models.ChatMessage).on_conflict_do_nothing(
+            index_elements=["client_id", "client_message_id"]
+        )
+        db.execute(
+            statement,
+            [
+                {
+                    "client_id": message.client_id,
+                    "client_message_id": message.client_message_id,
+                    "sender": message.sender,
+                    "message_text": message.message_text,
+                    "timestamp": message.timestamp,
+                }
+                for message in batch
+            ],
+        )
+        # Resent messages keep the id they were first stored with. Filtering
+        # on both columns lets SQLite search the unique index instead of
+        # scanning it.
+        rows = db.query(
+            models.ChatMessage.client_id,
+            models.ChatMessage.client_message_id,
+            models.ChatMessage.message_id,
+        ).filter(
+            models.ChatMessage.client_id.in_({message.client_id for message in batch}),
+            models.ChatMessage.client_message_id.in_(
+                {message.client_message_id for message in batch}
+            ),
+        )
+        return {
+            (client_id, client_message_id): message_id
+            for client_id, client_message_id, message_id in rows
+        }
+
+    def _write(self, batch: list[PendingMessage]):
+        try:
+            ids = transactions.run_write_transaction(lambda db: self._insert(db, batch))
+        except SQLAlchemyError as error:
+            if isinstance(error, OperationalError) and transactions.is_lock_error(
+                error
+            ):
+                raise
+            logger.error(
+                "Chat batch of %s failed, writing one by one: %s", len(batch), error
+            )
+            ids = {}
+            for message in batch:
+                try:
+                    ids.update(
+                        transactions.run_write_transaction(
+                            lambda db, message=message: self._insert(db, [message])
+                        )
+                    )
+                except SQLAlchemyError as message_error:
+                    logger.error(
+                        "Chat message %s for client %s not stored: %s",
+                        message.client_message_id,
+                        message.client_id,
+                        message_error,
+                    )
+        saved: list[tuple[PendingMessage, int]] = []
+        failed: list[PendingMessage] = []
+        for message in batch:
+            message_id = ids.get((message.client_id, message.client_message_id))
+            if message_id is None:
+                failed.append(message)
+            else:
+                saved.append((message, message_id))
+        return saved, failed
+
+    def flush(self) -> None:
+        "Write every queued message, keeping arrival order"
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                saved, failed = self._write(batch)
+            except OperationalError as error:
+                logger.warning("Chat write postponed, database busy: %s", error)
+                with self._condition:
+                    self._pending[:0] = batch
+                return
+        for callback, outcome in ((self.on_saved, saved), (self.on_failed, failed)):
+            if callback is not None and outcome:
+                try:
+                    callback(outcome)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Chat write callback failed")
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                if len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+    def start(self) -> None:
+        "Start the writer thread once per process"
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="chat-writer", daemon=True
+        )
+        self._thread.start()
+        if not self._exit_hook_registered:
+            atexit.register(self.stop)
+            self._exit_hook_registered = True
+
+    def stop(self) -> None:
+        "Stop the writer thread and write the remaining messages"
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+chat_writer = ChatWriteBuffer(
+    flush_interval=config.chat_flush_interval_ms / 1000,
+    batch_size=config.chat_flush_batch_size,
+)
@@ -1,15 +1,14 @@
 "client-side routes and logic for the web application"
 
 import io
+import math
 import os
 import random
 import string
 import uuid
 import datetime
 import secrets
-from typing import Any, cast
-from threading import Thread
-import bcrypt
+from typing import Any
 import jdatetime
 import filetype
 from persiantools.digits import fa_to_en
@@ -30,18 +29,22 @@ from flask import (
     url_for,
     jsonify,
     current_app,
-    Flask,
 )
 
 from . import config
 from . import database
 from . import constants
 from . import models
+from . import pricing
 from . import utils
 from . import auth
-from . import admin as admin_module
 from .extensions import csrf_protector, limiter
 from .auth import login_required
+from .transactions import retry_on_db_lock, save_upload
+from .settings import runtime_settings
+from .login_throttle import login_throttle
+from .passwords import password_hasher
+from .notifications import notification_outbox
 
 client_blueprint = Blueprint("client", __name__)
 
@@ -105,20 +108,17 @@ def _seconds_since(dt: datetime.datetime | None) -> float | None:
     return (datetime.datetime.now(datetime.timezone.utc) - dt_aware).total_seconds()
 
 
-def _get_current_app() -> Flask:
-    """Return the underlying Flask app instance for type checkers."""
-    return cast(Flask, current_app._get_current_object())
-
-
 @client_blueprint.route("/signup", methods=["GET", "POST"])
+@retry_on_db_lock
 def signup():
     """Render and handle the client sign-up page"""
-    if admin_module.signup_disabled:
+    signup_disabled = runtime_settings.get("signup_disabled")
+    if signup_disabled:
         flash("ثبت‌نام موقتاً غیرفعال است. لطفاً بعداً تلاش کنید یا وارد حساب شوید.", "warning")
         if request.method == "GET":
-            return redirect(url_for("auth.login_page"))
-    if request.method == "POST" and admin_module.signup_disabled:
-        return redirect(url_for("auth.login_page"))
+            return redirect(url_for("client.login_client"))
+    if request.method == "POST" and signup_disabled:
+        return redirect(url_for("client.login_client"))
     if request.method == "POST":
         csrf_protector.protect()
 
@@ -155,14 +155,12 @@ def signup():
         if response is None:
             with database.get_db_session() as db:
                 try:
-                    hashed_password = bcrypt.hashpw(
-                        password.encode("utf-8"), bcrypt.gensalt()
-                    )
+                    hashed_password = password_hasher.hash(password)
                     verification_code = "".join(random.choices(string.digits, k=6))
                     new_client = models.Client(
                         phone_number=phone,
                         email=email,
-                        password=hashed_password.decode("utf-8"),
+                        password=hashed_password,
                         registration_date=datetime.datetime.now(datetime.timezone.utc),
                         phone_verification_code=verification_code,
                         verification_code_timestamp=datetime.datetime.now(
@@ -170,19 +168,15 @@ def signup():
                         ),
                     )
                     db.add(new_client)
+                    db.flush()
+                    notification_outbox.queue_sms(
+                        db,
+                        new_client,
+                        config.melli_payamak["template_id_verification"],
+                        verification_code,
+                    )
                     db.commit()
 
-                    Thread(
-                        target=utils.send_templated_sms_async,
-                        args=(
-                            _get_current_app(),
-                            new_client.client_id,
-                            config.melli_payamak["template_id_verification"],
-                            verification_code,
-                            config.melli_payamak,
-                        ),
-                    ).start()
-
                     response = redirect(
                         url_for(
                             "client.verify_code",
@@ -285,6 +279,7 @@ def resolve_data_issues():
 
 @client_blueprint.route("/Login", methods=["GET", "POST"])
 @limiter.limit("15 per minute")
+@retry_on_db_lock
 def login_client():
     """Render and handle the client login page"""
     next_url = request.args.get("next")
@@ -292,18 +287,29 @@ def login_client():
         csrf_protector.protect()
         ip_address = request.remote_addr or "unknown"
         identifier = fa_to_en(request.form.get("identifier", "").strip())
-        password = request.form.get("password", "").encode("utf-8")
+        password = request.form.get("password", "")
         next_url_from_form = request.form.get("next")
 
+        retry_after = login_throttle.retry_after(identifier, ip_address)
+        if retry_after:
+            flash(
+                f"تعداد تلاش‌های ناموفق زیاد است. لطفاً {math.ceil(retry_after / 60)} دقیقه دیگر دوباره تلاش کنید.",
+                "error",
+            )
+            return redirect(
+                url_for("client.login_client", next=next_url_from_form or "")
+            )
+
         with database.get_db_session() as db:
             client_check = database.get_client_by(
                 db, "email", identifier
             ) or database.get_client_by(db, "phone_number", identifier)
 
-            if not client_check or not bcrypt.checkpw(
-                password, client_check.password.encode("utf-8")
+            if not client_check or not password_hasher.verify(
+                password, client_check.password
             ):
-                database.log_login_attempt(db, identifier, ip_address, is_success=False)
+                login_throttle.record(db, identifier, ip_address, is_success=False)
+                db.commit()
                 flash("ایمیل/شماره تلفن یا رمز عبور نامعتبر است.", "error")
                 return redirect(
                     url_for("client.login_client", next=next_url_from_form or "")
@@ -316,9 +322,38 @@ def login_client():
                 )
                 return redirect(url_for("client.login_client"))
 
-            database.log_login_attempt(db, identifier, ip_address, is_success=True)
+            upgraded_hash = password_hasher.rehash_if_needed(
+                password, client_check.password
+            )
+            if upgraded_hash:
+                client_check.password = upgraded_hash
+            login_throttle.record(db, identifier, ip_address, is_success=True)
+
+            # Every write of a successful login goes into this one commit, so
+            # retry_on_db_lock can replay the view if it hits a lock.
+            missing_contact = not client_check.email or not client_check.phone_number
+            needs_verification = (
+                not missing_contact and client_check.is_phone_verified is not True
+            )
+            if needs_verification:
+                new_code = "".join(random.choices(string.digits, k=6))
+                client_check.phone_verification_code = new_code
+                client_check.verification_code_timestamp = datetime.datetime.now(
+                    datetime.timezone.utc
+                )
+                notification_outbox.queue_sms(
+                    db,
+                    client_check,
+                    config.melli_payamak["template_id_verification"],
+                    new_code,
+                )
+            elif not missing_contact and client_check.registration_date is None:
+                client_check.registration_date = datetime.datetime.now(
+                    datetime.timezone.utc
+                )
+            db.commit()
 
-            if not client_check.email or not client_check.phone_number:
+            if missing_contact:
                 session.clear()
                 session["client_id"] = client_check.client_id
                 session["needs_contact_completion"] = True
@@ -329,23 +364,7 @@ def login_client():
                 )
                 return redirect(url_for("client.complete_profile"))
 
-            if client_check.is_phone_verified is not True:
-                new_code = "".join(random.choices(string.digits, k=6))
-                client_check.phone_verification_code = new_code
-                client_check.verification_code_timestamp = datetime.datetime.now(
-                    datetime.timezone.utc
-                )
-                db.commit()
-                Thread(
-                    target=utils.send_templated_sms_async,
-                    args=(
-                        current_app._get_current_object(),
-                        client_check.client_id,
-                        config.melli_payamak["template_id_verification"],
-                        new_code,
-                        config.melli_payamak,
-                    ),
-                ).start()
+            if needs_verification:
                 flash(
                     "حساب شما هنوز فعال نشده است. یک کد تایید جدید به شماره موبایل شما ارسال شد.",
                     "warning",
@@ -358,12 +377,6 @@ def login_client():
                     )
                 )
 
-            if client_check.registration_date is None:
-                client_check.registration_date = datetime.datetime.now(
-                    datetime.timezone.utc
-                )
-                db.commit()
-
             incomplete_team = utils.get_first_incomplete_team(
                 db, client_check.client_id
             )
@@ -419,15 +432,12 @@ def login_client():
 
 @client_blueprint.route("/CompleteProfile", methods=["GET", "POST"])
 @login_required
+@retry_on_db_lock
 def complete_profile():
     """Prompt the logged-in user to complete missing contact information."""
 
     with database.get_db_session() as db:
-        client = (
-            db.query(models.Client)
-            .filter(models.Client.client_id == session.get("client_id"))
-            .first()
-        )
+        client = db.get(models.Client, session.get("client_id"))
 
         if not client:
             session.clear()
@@ -585,6 +595,7 @@ def my_history():
 
 @client_blueprint.route("/Team/<int:team_id>/Update", methods=["GET", "POST"])
 @auth.login_required
+@retry_on_db_lock
 def update_team(team_id):
     """Render and handle updates to a specific team's information"""
     with database.get_db_session() as db:
@@ -752,11 +763,7 @@ def support_chat():
                 client_id = resolution_id
         client_user = None
         if client_id:
-            client_user = (
-                db.query(models.Client)
-                .filter(models.Client.client_id == client_id)
-                .first()
-            )
+            client_user = db.get(models.Client, client_id)
 
         if not client_user:
             flash("برای دسترسی به پشتیبانی ابتدا وارد حساب کاربری شوید.", "warning")
@@ -772,6 +779,7 @@ def support_chat():
     "/Team/<int:team_id>/EditMember/<int:member_id>", methods=["GET", "POST"]
 )
 @auth.login_required
+@retry_on_db_lock
 def edit_member(team_id, member_id):
     """Render and handle editing a member's information in a specific team"""
     template_name = constants.client_html_names_data["edit_member"]
@@ -939,6 +947,7 @@ def get_receipt(client_id, filename):
 
 @client_blueprint.route("/CreateTeam", methods=["GET", "POST"])
 @auth.login_required
+@retry_on_db_lock
 def create_team():
     """Render and handle the create team page"""
     with database.get_db_session() as db:
@@ -1030,6 +1039,7 @@ def create_team():
 
 
 @client_blueprint.route("/Verify", methods=["GET", "POST"])
+@retry_on_db_lock
 def verify_code():
     """verify code route"""
     if request.method == "POST":
@@ -1221,6 +1231,7 @@ def verify_code():
 
 @client_blueprint.route("/ForgotPassword", methods=["GET", "POST"])
 @limiter.limit("5 per 15 minutes")
+@retry_on_db_lock
 def forgot_password():
     """Render and handle the forgot password page"""
     if request.method == "POST":
@@ -1264,33 +1275,20 @@ def forgot_password():
                         timestamp=timestamp,
                     )
                     db.add(new_reset_record)
-                db.commit()
 
                 if identifier_type == "email":
                     subject = "بازیابی رمز عبور آیروکاپ"
                     body = f"کد بازیابی رمز عبور شما در آیروکاپ: {reset_code}"
-                    Thread(
-                        target=utils.send_async_email,
-                        args=(
-                            _get_current_app(),
-                            client_check.client_id,
-                            subject,
-                            body,
-                            config.mail_configuration,
-                        ),
-                    ).start()
+                    notification_outbox.queue_email(db, client_check, subject, body)
 
                 elif identifier_type == "phone_number":
-                    Thread(
-                        target=utils.send_templated_sms_async,
-                        args=(
-                            _get_current_app(),
-                            client_check.client_id,
-                            config.melli_payamak["template_id_password_reset"],
-                            reset_code,
-                            config.melli_payamak,
-                        ),
-                    ).start()
+                    notification_outbox.queue_sms(
+                        db,
+                        client_check,
+                        config.melli_payamak["template_id_password_reset"],
+                        reset_code,
+                    )
+                db.commit()
 
             flash(success_message, "info")
             return redirect(
@@ -1306,6 +1304,7 @@ def forgot_password():
 
 
 @client_blueprint.route("/ResetPassword", methods=["GET", "POST"])
+@retry_on_db_lock
 def reset_password():
     "Render and handle the reset password page"
     token = request.args.get("token")
@@ -1361,9 +1360,7 @@ def reset_password():
                             db, reset_record.identifier_type, reset_record.identifier
                         )
                         if client_to_update:
-                            hashed_password = bcrypt.hashpw(
-                                new_password.encode("utf-8"), bcrypt.gensalt()
-                            ).decode("utf-8")
+                            hashed_password = password_hasher.hash(new_password)
 
                             client_to_update.password = hashed_password
                             db.delete(reset_record)
@@ -1389,6 +1386,7 @@ def reset_password():
 
 @client_blueprint.route("/Team/<int:team_id>/Payment", methods=["GET", "POST"])
 @auth.login_required
+@retry_on_db_lock
 def payment(team_id):
     """Render and handle the payment page for a team."""
     with database.get_db_session() as db:
@@ -1519,6 +1517,7 @@ def payment(team_id):
 
 @client_blueprint.route("/ResendCode", methods=["POST"])
 @limiter.limit("5 per 15 minutes")
+@retry_on_db_lock
 def resend_code():
     """resend code route"""
     request_data = request.get_json() or {}
@@ -1565,18 +1564,13 @@ def resend_code():
             client.verification_code_timestamp = datetime.datetime.now(
                 datetime.timezone.utc
             )
-            db.commit()
-
-        Thread(
-            target=utils.send_templated_sms_async,
-            args=(
-                _get_current_app(),
-                client.client_id,
+            notification_outbox.queue_sms(
+                db,
+                client,
                 config.melli_payamak["template_id_verification"],
                 new_code,
-                config.melli_payamak,
-            ),
-        ).start()
+            )
+            db.commit()
 
         return jsonify({"success": True, "message": "کد جدید ارسال شد."}), 200
 
@@ -1630,31 +1624,23 @@ def resend_code():
                     )
                 )
 
-            db.commit()
-
-        if identifier_type == "email":
-            Thread(
-                target=utils.send_async_email,
-                args=(
-                    _get_current_app(),
-                    client.client_id,
+            if identifier_type == "email":
+                notification_outbox.queue_email(
+                    db,
+                    client,
                     "کد بازیابی رمز عبور آیروکاپ",
                     f"کد بازیابی رمز عبور شما: {new_code}",
-                    config.mail_configuration,
-                ),
-            ).start()
-
-        elif identifier_type == "phone_number":
-            Thread(
-                target=utils.send_templated_sms_async,
-                args=(
-                    _get_current_app(),
-                    client.client_id,
+                )
+
+            elif identifier_type == "phone_number":
+                notification_outbox.queue_sms(
+                    db,
+                    client,
                     config.melli_payamak["template_id_password_reset"],
                     new_code,
-                    config.melli_payamak,
-                ),
-            ).start()
+                )
+
+            db.commit()
 
         return jsonify({"success": True, "message": "کد جدید ارسال شد."}), 200
 
@@ -1737,12 +1723,13 @@ def dashboard():
     return render_template(
         constants.client_html_names_data["dashboard"],
         teams=teams,
-        payment=config.payment_config,
+        payment=runtime_settings.payment_config(),
     )
 
 
 @client_blueprint.route("/SubmitResolution", methods=["POST"])
 @auth.resolution_required
+@retry_on_db_lock
 def submit_data_resolution():
     """Handle submission of the data resolution form."""
     csrf_protector.protect()
@@ -1925,6 +1912,7 @@ def submit_data_resolution():
 
 @client_blueprint.route("/Team/<int:team_id>/Delete", methods=["POST"])
 @auth.login_required
+@retry_on_db_lock
 def delete_team(team_id):
     "archive a team and its members"
     csrf_protector.protect()
@@ -1970,6 +1958,7 @@ def delete_team(team_id):
     "/Team/<int:team_id>/DeleteMember/<int:member_id>", methods=["POST"]
 )
 @auth.login_required
+@retry_on_db_lock
 def delete_member(team_id, member_id):
     "archive a member from a specific team."
     csrf_protector.protect()
@@ -2033,7 +2022,7 @@ def delete_member(team_id, member_id):
 
 @client_blueprint.route("/get_my_chat_history")
 def get_my_chat_history():
-    "Return the chat history for the logged-in or resolving client as JSON"
+    "Return a page of the logged-in or resolving client's chat history as JSON"
 
     client_id = session.get("client_id")
     if not isinstance(client_id, int):
@@ -2044,21 +2033,14 @@ def get_my_chat_history():
         return jsonify({"messages": []}), 401
 
     with database.get_db_session() as db:
-        messages = [
-            {
-                "message_text": message.message_text,
-                "timestamp": message.timestamp.isoformat(),
-                "message_id": message.message_id,
-                "sender": message.sender,
-            }
-            for message in database.get_chat_history_by_client_id(db, client_id)
-        ]
+        page = utils.chat_history_page(db, client_id, request.args)
 
-    return jsonify({"messages": messages})
+    return jsonify(page)
 
 
 @client_blueprint.route("/Team/<int:team_id>/UploadDocument", methods=["POST"])
 @login_required
+@retry_on_db_lock
 def upload_document(team_id):
     """Handle document upload for a specific team."""
     csrf_protector.protect()
@@ -2181,7 +2163,7 @@ def upload_document(team_id):
                 current_app.config["UPLOAD_FOLDER_DOCUMENTS"], str(team_id)
             )
             os.makedirs(document_folder, exist_ok=True)
-            file.save(os.path.join(document_folder, secure_name))
+            save_upload(file, os.path.join(document_folder, secure_name))
             db.add(new_document)
             db.commit()
             flash("مستندات با موفقیت بارگذاری شد.", "success")
@@ -2228,6 +2210,7 @@ def get_document(team_id, filename):
 
 @client_blueprint.route("/Team/<int:team_id>/AddMember", methods=["POST"])
 @auth.login_required
+@retry_on_db_lock
 def add_member(team_id):
     "Handle adding a new member to a specific team"
     csrf_protector.protect()
@@ -2284,7 +2267,7 @@ def add_member(team_id):
             selected_leagues_count = 1 + (1 if team.league_two_id is not None else 0)
             selected_leagues_count = max(1, selected_leagues_count)
             new_member_fee_per_league = (
-                config.payment_config.get("new_member_fee_per_league") or 0
+                pricing.current_fee_schedule().new_member_fee_per_league
             )
             receipt_file = (
                 request.files.get("member_receipt") if has_any_payment else None
@@ -2416,6 +2399,7 @@ def add_member(team_id):
 
 @client_blueprint.route("/Team/<int:team_id>/SelectLeague", methods=["GET", "POST"])
 @auth.login_required
+@retry_on_db_lock
 def select_league(team_id):
     "Render and handle the league selection page for a specific team"
     with database.get_db_session() as db:
@@ -2527,90 +2511,55 @@ def _calculate_payment_details(db, team) -> tuple[dict[str, Any], str, str, bool
         or 0
     )
 
-    if active_members_count == 0:
-        return (
-            {},
+    fees = pricing.current_fee_schedule()
+    quote = pricing.quote(
+        pricing.TeamState.from_team(
+            team,
+            active_members_count,
+            is_new_member_payment=latest_payment is not None,
+        ),
+        fees,
+    )
+    blocking_messages = {
+        pricing.NO_ACTIVE_MEMBERS: (
             "برای پرداخت، ابتدا باید حداقل یک عضو فعال در تیم ثبت شده باشد.",
             "warning",
-            True,
-        )
-
-    if not team.league_one_id:
-        return (
-            {},
+        ),
+        pricing.MISSING_LEAGUE: (
             "لطفاً ابتدا لیگ اصلی تیم را از بخش «انتخاب لیگ» مشخص کنید.",
             "warning",
-            True,
-        )
-
-    if not team.education_level:
-        return (
-            {},
+        ),
+        pricing.MISSING_EDUCATION_LEVEL: (
             "لطفاً ابتدا مقطع تحصیلی تیم را از بخش «انتخاب مقطع و لیگ» تعیین کنید.",
             "warning",
-            True,
-        )
-
-    has_any_payment = database.has_team_made_any_payment(db, team.team_id)
-    is_new_member_payment = has_any_payment
-    fee_per_person = config.payment_config.get("fee_per_person") or 0
-    fee_team = config.payment_config.get("fee_team") or 0
-    league_two_discount_percent = config.payment_config.get("league_two_discount") or 0
-    new_member_fee_per_league = (
-        config.payment_config.get("new_member_fee_per_league") or 0
-    )
-    selected_leagues_count = 1 + (1 if team.league_two_id is not None else 0)
-    selected_leagues_count = max(1, selected_leagues_count)
-
-    members_to_pay_for = 0
-    total_cost = 0
-    league_one_cost = 0
-    league_two_cost = 0
-    discount_amount = 0
-    per_member_total = 0
-
-    if is_new_member_payment:
-        members_to_pay_for = team.unpaid_members_count or 0
-        if members_to_pay_for <= 0:
-            return (
-                {},
-                "در حال حاضر عضو جدیدی برای پرداخت وجود ندارد.",
-                "info",
-                True,
-            )
-
-        per_member_total = new_member_fee_per_league * selected_leagues_count
-        total_cost = members_to_pay_for * per_member_total
-    else:
-        members_to_pay_for = active_members_count
-        members_fee = members_to_pay_for * fee_per_person
-        base_league_cost = fee_team + members_fee
-        league_one_cost = base_league_cost
-        total_cost = league_one_cost
-
-        if team.league_two_id is not None:
-            league_two_cost = int(
-                round(base_league_cost * (1 - league_two_discount_percent / 100))
-            )
-            discount_amount = max(0, base_league_cost - league_two_cost)
-            total_cost += max(league_two_cost, 0)
+        ),
+        pricing.NO_UNPAID_MEMBERS: (
+            "در حال حاضر عضو جدیدی برای پرداخت وجود ندارد.",
+            "info",
+        ),
+    }
+    if quote.issue:
+        message, category = blocking_messages[quote.issue]
+        return {}, message, category, True
 
     context = {
-        "is_new_member_payment": is_new_member_payment,
-        "members_to_pay_for": members_to_pay_for,
-        "total_fee": int(total_cost),
+        "is_new_member_payment": quote.is_new_member_payment,
+        "members_to_pay_for": quote.members_count,
+        "total_fee": quote.total,
         "num_members": active_members_count,
-        "league_one_cost": int(league_one_cost),
-        "league_two_cost": int(league_two_cost),
-        "discount_amount": int(discount_amount),
+        "league_one_cost": quote.league_one_cost,
+        "league_two_cost": quote.league_two_cost,
+        "discount_amount": quote.discount_amount,
         "latest_payment": latest_payment,
         "bank_info_complete": all(
-            config.payment_config.get(field)
+            runtime_settings.get(f"payment_{field}")
             for field in ("bank_name", "owner_name", "card_number", "iban")
         ),
-        "new_member_fee_per_league": int(new_member_fee_per_league),
-        "selected_leagues_count": selected_leagues_count,
-        "new_member_total_per_member": int(per_member_total),
+        "new_member_fee_per_league": int(fees.new_member_fee_per_league),
+        "selected_leagues_count": quote.selected_leagues_count,
+        "new_member_total_per_member": (
+            quote.per_member_fee if quote.is_new_member_payment else 0
+        ),
     }
     return context, None, None, False
 
@@ -2714,7 +2663,7 @@ def _process_payment_submission(
             str(session["client_id"]),
         )
         os.makedirs(user_receipts_folder, exist_ok=True)
-        receipt_file.save(os.path.join(user_receipts_folder, secure_name))
+        save_upload(receipt_file, os.path.join(user_receipts_folder, secure_name))
         db.flush()
         return True, "متشکریم! رسید شما با موفقیت بارگذاری و برای بررسی ارسال شد."
     except (IOError, OSError, exc.SQLAlchemyError) as error:
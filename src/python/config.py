@@ -86,6 +86,9 @@ melli_payamak = {
     "template_id_password_reset": get_env(
         "mellipayamak_template_id_password_reset", 0, cast=int
     ),
+    "template_id_broadcast": get_env(
+        "mellipayamak_template_id_broadcast", 0, cast=int
+    ),
 }
 
 payment_config = {
@@ -101,8 +104,73 @@ payment_config = {
     "iban": get_env("payment_iban"),
 }
 
+activity_flush_interval = get_env("activity_flush_interval_seconds", 10, cast=int)
+system_metrics_interval = get_env("system_metrics_interval_seconds", 15, cast=int)
+system_metrics_retention = get_env("system_metrics_retention_seconds", 3600, cast=int)
+dashboard_cache_ttl = get_env("dashboard_cache_ttl_seconds", 30, cast=int)
+runtime_settings_ttl = get_env("runtime_settings_ttl_seconds", 5, cast=int)
+login_throttle_window = get_env("login_throttle_window_seconds", 900, cast=int)
+login_throttle_pair_limit = get_env("login_throttle_pair_limit", 5, cast=int)
+login_throttle_identifier_limit = get_env(
+    "login_throttle_identifier_limit", 20, cast=int
+)
+login_throttle_ip_limit = get_env("login_throttle_ip_limit", 50, cast=int)
+login_throttle_sync_interval = get_env("login_throttle_sync_seconds", 2, cast=int)
+bcrypt_rounds = get_env("bcrypt_rounds", 12, cast=int)
+password_hash_workers = get_env(
+    "password_hash_workers", max(1, (os.cpu_count() or 2) // 2), cast=int
+)
+password_hash_queue_limit = get_env("password_hash_queue_limit", 16, cast=int)
+password_hash_timeout = get_env("password_hash_timeout_seconds", 10, cast=int)
+notification_provider = get_env("notification_provider", "live")
+notification_workers = get_env("notification_workers", 2, cast=int)
+notification_batch_size = get_env("notification_batch_size", 10, cast=int)
+notification_poll_interval = get_env("notification_poll_seconds", 1, cast=int)
+notification_max_attempts = get_env("notification_max_attempts", 5, cast=int)
+notification_backoff_base = get_env("notification_backoff_base_seconds", 5, cast=int)
+notification_backoff_max = get_env("notification_backoff_max_seconds", 600, cast=int)
+notification_lease = get_env("notification_lease_seconds", 60, cast=int)
+notification_retention_days = get_env("notification_retention_days", 30, cast=int)
+notification_smtp_idle = get_env("notification_smtp_idle_seconds", 60, cast=int)
+broadcast_batch_size = get_env("broadcast_batch_size", 100, cast=int)
+broadcast_rate_per_second = get_env("broadcast_rate_per_second", 5, cast=int)
+broadcast_max_backlog = get_env("broadcast_max_backlog", 200, cast=int)
+broadcast_lease = get_env("broadcast_lease_seconds", 120, cast=int)
+chat_history_page_size = get_env("chat_history_page_size", 50, cast=int)
+chat_history_max_page_size = get_env("chat_history_max_page_size", 200, cast=int)
+chat_inbox_page_size = get_env("chat_inbox_page_size", 25, cast=int)
+chat_flush_interval_ms = get_env("chat_flush_interval_ms", 5, cast=int)
+chat_flush_batch_size = get_env("chat_flush_batch_size", 100, cast=int)
+
+database_url = get_env("database_url")
+db_pool_size = get_env("db_pool_size", 10, cast=int)
+db_max_overflow = get_env("db_max_overflow", 10, cast=int)
+db_pool_timeout = get_env("db_pool_timeout_seconds", 30, cast=int)
+db_pool_recycle = get_env("db_pool_recycle_seconds", 1800, cast=int)
+sqlite_pragma_profile = get_env("sqlite_pragma_profile", "balanced")
+sqlite_cache_budget_mb = get_env("sqlite_cache_budget_mb", 256, cast=int)
+db_write_retries = get_env("db_write_retries", 5, cast=int)
+db_write_backoff_base_ms = get_env("db_write_backoff_base_ms", 50, cast=int)
+db_write_backoff_max_ms = get_env("db_write_backoff_max_ms", 2000, cast=int)
+db_serialize_writes = get_bool("db_serialize_writes", False)
+db_auto_migrate = get_bool("db_auto_migrate", True)
+
 host = get_env("host", "0.0.0.0")
 port = get_env("port", 5000, cast=int)
+server_mode = get_env("server_mode", "gunicorn")
+server_workers = get_env("server_workers", 1, cast=int)
+server_threads = get_env("server_threads", 200, cast=int)
+server_connections = get_env("server_connections", 1000, cast=int)
+server_backlog = get_env("server_backlog", 2048, cast=int)
+server_keepalive = get_env("server_keepalive_seconds", 5, cast=int)
+server_worker_timeout = get_env("server_worker_timeout_seconds", 60, cast=int)
+server_graceful_timeout = get_env("server_graceful_timeout_seconds", 30, cast=int)
+socketio_message_queue = get_env("socketio_message_queue", "")
+presence_ttl_seconds = get_env("presence_ttl_seconds", 90, cast=int)
+search_result_limit = get_env("search_result_limit", 500, cast=int)
+search_suggest_limit = get_env("search_suggest_limit", 8, cast=int)
+search_suggest_budget_ms = get_env("search_suggest_budget_ms", 50, cast=int)
+search_suggest_cache_seconds = get_env("search_suggest_cache_seconds", 15, cast=int)
 session_cookie_secure = get_bool("session_cookie_secure", False)
 session_cookie_httponly = get_bool("session_cookie_httponly", True)
 session_cookie_samesite = _normalize_samesite(
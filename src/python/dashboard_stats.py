@@ -0,0 +1,359 @@
+"Aggregate statistics for the admin dashboard computed in a few SQL round trips"
+
+import dataclasses
+import datetime
+import logging
+import threading
+import time
+from typing import Optional
+from sqlalchemy import Integer, case, cast, event, func, literal, select, true, union_all
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from . import config
+from . import database
+from . import models
+from .activity import activity_buffer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class DashboardSnapshot:
+    """Point-in-time counters shown on the admin dashboard."""
+
+    total_clients: int
+    total_teams: int
+    approved_teams: int
+    total_members: int
+    total_leaders: int
+    total_coaches: int
+    new_clients_this_week: int
+    male_members: int
+    female_members: int
+    unknown_members: int
+    average_male_age: int
+    average_female_age: int
+    weekly_visits: list[dict]
+    gender_by_league: list[dict]
+    league_stats: list[dict]
+    computed_at: datetime.datetime
+
+    @property
+    def daily_visits(self) -> int:
+        "Visits recorded for today, the last day of the weekly window"
+        return self.weekly_visits[-1]["visit_count"] if self.weekly_visits else 0
+
+    def stats(self) -> dict:
+        "Return the ``stats`` mapping consumed by the dashboard template"
+        counts = [day["visit_count"] for day in self.weekly_visits]
+        weekly_last = self.weekly_visits[-1] if self.weekly_visits else None
+        return {
+            "total_clients": self.total_clients,
+            "total_teams": self.total_teams,
+            "approved_teams": self.approved_teams,
+            "total_members": self.total_members,
+            "total_leaders": self.total_leaders,
+            "total_coaches": self.total_coaches,
+            "new_clients_this_week": self.new_clients_this_week,
+            "daily_visits": self.daily_visits,
+            "weekly_visits": self.weekly_visits,
+            "weekly_min": min(counts, default=0),
+            "weekly_max": max(counts, default=0),
+            "weekly_last": weekly_last,
+            "weekly_last_count": weekly_last["visit_count"] if weekly_last else 0,
+            "gender_by_league": self.gender_by_league,
+        }
+
+    def gender_stats(self) -> dict:
+        "Return the ``gender_stats`` mapping consumed by the dashboard template"
+        total = (self.male_members + self.female_members + self.unknown_members) or 1
+        return {
+            "male": self.male_members,
+            "female": self.female_members,
+            "unknown": self.unknown_members,
+            "male_percent": round((self.male_members / total) * 100, 1),
+            "female_percent": round((self.female_members / total) * 100, 1),
+            "average_male_age": self.average_male_age,
+            "average_female_age": self.average_female_age,
+        }
+
+
+def _sql_age(birth_date_column, today: datetime.date):
+    "SQLite expression for the age in completed years at ``today``"
+    today_text = literal(today.isoformat())
+    return (
+        cast(func.strftime("%Y", today_text), Integer)
+        - cast(func.strftime("%Y", birth_date_column), Integer)
+        - case(
+            (
+                func.strftime("%m-%d", today_text)
+                < func.strftime("%m-%d", birth_date_column),
+                1,
+            ),
+            else_=0,
+        )
+    )
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _average(total, count_val) -> int:
+    return round(total / count_val) if count_val else 0
+
+
+def _load_counters(db: Session, now: datetime.datetime, today: datetime.date):
+    "Fetch every scalar counter with one SELECT over single-row aggregates"
+    client = models.Client
+    member = models.Member
+    active_member = member.status == models.EntityStatus.ACTIVE
+    aged_member = (
+        active_member
+        & (member.role == models.MemberRole.MEMBER)
+        & member.birth_date.isnot(None)
+    )
+    is_male = member.gender == models.Gender.MALE
+    is_female = member.gender == models.Gender.FEMALE
+    age = _sql_age(member.birth_date, today)
+
+    client_counts = select(
+        _count_if(client.status == models.EntityStatus.ACTIVE).label("total"),
+        _count_if(
+            (client.status == models.EntityStatus.ACTIVE)
+            & (client.registration_date >= now - datetime.timedelta(days=7))
+        ).label("new_this_week"),
+    ).subquery()
+    team_counts = select(
+        _count_if(models.Team.status == models.EntityStatus.ACTIVE).label("total")
+    ).subquery()
+    approved_counts = select(
+        func.count(func.distinct(models.Payment.team_id)).label("total")
+    ).where(models.Payment.status == models.PaymentStatus.APPROVED).subquery()
+    member_counts = select(
+        _count_if(active_member).label("total"),
+        _count_if(active_member & (member.role == models.MemberRole.LEADER)).label(
+            "leaders"
+        ),
+        _count_if(active_member & (member.role == models.MemberRole.COACH)).label(
+            "coaches"
+        ),
+        _count_if(active_member & is_male).label("male"),
+        _count_if(active_member & is_female).label("female"),
+        _count_if(aged_member & is_male).label("male_aged"),
+        _count_if(aged_member & is_female).label("female_aged"),
+        func.coalesce(func.sum(case((aged_member & is_male, age), else_=0)), 0).label(
+            "male_age_sum"
+        ),
+        func.coalesce(
+            func.sum(case((aged_member & is_female, age), else_=0)), 0
+        ).label("female_age_sum"),
+    ).subquery()
+
+    return db.execute(
+        select(
+            client_counts.c.total.label("total_clients"),
+            client_counts.c.new_this_week,
+            team_counts.c.total.label("total_teams"),
+            approved_counts.c.total.label("approved_teams"),
+            member_counts,
+        )
+        .select_from(client_counts)
+        .join(team_counts, true())
+        .join(approved_counts, true())
+        .join(member_counts, true())
+    ).one()
+
+
+def _load_weekly_visits(db: Session, today: datetime.date) -> list[dict]:
+    week_ago = today - datetime.timedelta(days=6)
+    rows = dict(
+        db.execute(
+            select(models.DailyStat.date, models.DailyStat.visit_count).where(
+                models.DailyStat.date >= week_ago
+            )
+        ).all()
+    )
+    return [
+        {"date": day, "visit_count": rows.get(day) or 0}
+        for day in (week_ago + datetime.timedelta(days=i) for i in range(7))
+    ]
+
+
+def _load_gender_by_league(db: Session) -> list[dict]:
+    member = models.Member
+    rows = db.execute(
+        select(
+            models.League.name,
+            _count_if(member.gender == models.Gender.MALE),
+            _count_if(member.gender == models.Gender.FEMALE),
+            func.count(member.member_id),
+        )
+        .select_from(member)
+        .join(models.Team, member.team_id == models.Team.team_id)
+        .join(models.League, models.Team.league_one_id == models.League.league_id)
+        .where(member.status == models.EntityStatus.ACTIVE)
+        .group_by(models.League.name)
+    ).all()
+    result = [
+        {
+            "league": league_name,
+            "male": male,
+            "female": female,
+            "unknown": total - male - female,
+        }
+        for league_name, male, female, total in rows
+    ]
+    return sorted(
+        result,
+        key=lambda x: (x["male"] + x["female"] + x["unknown"]),
+        reverse=True,
+    )
+
+
+def _load_league_stats(db: Session) -> list[dict]:
+    team = models.Team
+    active = team.status == models.EntityStatus.ACTIVE
+    league_slots = union_all(
+        select(team.league_one_id.label("league_id")).where(active),
+        select(team.league_two_id.label("league_id")).where(active),
+    ).subquery()
+    rows = db.execute(
+        select(
+            models.League.league_id,
+            models.League.name,
+            func.count().label("count"),
+        )
+        .join(league_slots, league_slots.c.league_id == models.League.league_id)
+        .group_by(models.League.league_id, models.League.name)
+    ).all()
+    league_stats = [
+        {"id": league_id, "name": name, "count": count_val}
+        for league_id, name, count_val in rows
+    ]
+    return sorted(league_stats, key=lambda item: (-item["count"], item["id"]))
+
+
+def compute_dashboard_snapshot(
+    db: Session, now: Optional[datetime.datetime] = None
+) -> DashboardSnapshot:
+    """Compute all dashboard aggregates in four queries independent of table size."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    today = datetime.date.today()
+    counters = _load_counters(db, now, today)
+    total_members = counters.total
+    return DashboardSnapshot(
+        total_clients=counters.total_clients,
+        total_teams=counters.total_teams,
+        approved_teams=counters.approved_teams,
+        total_members=total_members,
+        total_leaders=counters.leaders,
+        total_coaches=counters.coaches,
+        new_clients_this_week=counters.new_this_week,
+        male_members=counters.male,
+        female_members=counters.female,
+        unknown_members=total_members - counters.male - counters.female,
+        average_male_age=_average(counters.male_age_sum, counters.male_aged),
+        average_female_age=_average(counters.female_age_sum, counters.female_aged),
+        weekly_visits=_load_weekly_visits(db, today),
+        gender_by_league=_load_gender_by_league(db),
+        league_stats=_load_league_stats(db),
+        computed_at=now,
+    )
+
+
+_TRACKED_MODELS = (
+    models.Client,
+    models.Team,
+    models.Member,
+    models.Payment,
+    models.DailyStat,
+)
+
+
+class DashboardSnapshotCache:
+    """Keeps the last ``DashboardSnapshot`` in memory, keyed on a data version.
+
+    The version is bumped from ``after_flush`` whenever a tracked model is
+    inserted, updated or deleted. A snapshot is fresh while its version is
+    current and it is younger than ``ttl``; otherwise the stale snapshot is
+    still served and a single background thread recomputes it.
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._data_version = 0
+        self._snapshot: Optional[DashboardSnapshot] = None
+        self._snapshot_version = -1
+        self._snapshot_time = 0.0
+
+    @property
+    def data_version(self) -> int:
+        "Current value of the data version counter"
+        return self._data_version
+
+    def bump(self) -> None:
+        "Mark every cached snapshot as outdated"
+        with self._lock:
+            self._data_version += 1
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and self._snapshot_version == self._data_version
+            and time.monotonic() - self._snapshot_time < self.ttl
+        )
+
+    def refresh(self) -> Optional[DashboardSnapshot]:
+        "Recompute the snapshot unless another thread is already doing so"
+        if not self._refresh_lock.acquire(blocking=self._snapshot is None):
+            return self._snapshot
+        try:
+            if self._is_fresh():
+                return self._snapshot
+            activity_buffer.flush()
+            version = self._data_version
+            started = time.monotonic()
+            with database.get_db_session() as db:
+                snapshot = compute_dashboard_snapshot(db)
+            with self._lock:
+                self._snapshot = snapshot
+                self._snapshot_version = version
+                self._snapshot_time = started
+            return snapshot
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except SQLAlchemyError as error:
+            logger.error("Error refreshing dashboard snapshot: %s", error)
+
+    def get(self) -> DashboardSnapshot:
+        "Return a snapshot, serving a stale one while a refresh runs"
+        if self._is_fresh():
+            return self._snapshot
+        if self._snapshot is None or self.ttl <= 0:
+            return self.refresh()
+        if not self._refresh_lock.locked():
+            threading.Thread(
+                target=self._refresh_in_background,
+                name="dashboard-snapshot",
+                daemon=True,
+            ).start()
+        return self._snapshot
+
+
+dashboard_cache = DashboardSnapshotCache(ttl=config.dashboard_cache_ttl)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_dashboard_version(session, _flush_context):
+    "Invalidate the dashboard snapshot when a tracked model changes"
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, _TRACKED_MODELS):
+            dashboard_cache.bump()
+            return
@@ -1,17 +1,24 @@
 """DataBase Code For adding Editing and Deleting Members, Teams and Clients"""
 
 import datetime
+import logging
 import os
+import threading
+import time
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Iterator, List, Optional, Tuple
-import bcrypt
-from sqlalchemy import create_engine, func, text
-from sqlalchemy.orm import Session, sessionmaker
+from flask import g, has_request_context
+from sqlalchemy import create_engine, event, exc, func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.util import typing as sa_typing
+from . import config
 from . import constants
 from . import models
 from . import utils
+from .passwords import password_hasher
 
 
 if hasattr(sa_typing, "make_union_type"):
@@ -34,14 +41,251 @@ if hasattr(sa_typing, "make_union_type"):
 
     sa_typing.make_union_type = _patched_make_union_type
 
-_normalized_sqlite_path = Path(constants.Path.database).as_posix()
+logger = logging.getLogger(__name__)
 
-db_engine = create_engine(
-    f"sqlite:///{_normalized_sqlite_path}",
-    connect_args={"check_same_thread": False},
+_normalized_sqlite_path = Path(constants.Path.database).as_posix()
+database_url = config.database_url or f"sqlite:///{_normalized_sqlite_path}"
+
+
+_checkout_started = threading.local()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that notes when a thread starts waiting for a connection."""
+
+    def connect(self):
+        _checkout_started.at = time.perf_counter()
+        return super().connect()
+
+
+class PoolMetrics:
+    """Counts connection pool traffic and times checkout waits and hold times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        "Zero every counter"
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checked_out = 0
+            self.peak_checked_out = 0
+            self.waits = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.hold_total = 0.0
+            self.hold_max = 0.0
+
+    def on_connect(self, _dbapi_connection, _connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, _dbapi_connection, connection_record, _proxy) -> None:
+        now = time.perf_counter()
+        connection_record.info["checked_out_at"] = now
+        started = getattr(_checkout_started, "at", None)
+        if started is not None:
+            _checkout_started.at = None
+            self.record_wait(now - started)
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def on_checkin(self, _dbapi_connection, connection_record) -> None:
+        started = connection_record.info.pop("checked_out_at", None)
+        held = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+            self.hold_total += held
+            self.hold_max = max(self.hold_max, held)
+
+    def on_invalidate(self, _dbapi_connection, _connection_record, _exception) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def record_wait(self, seconds: float) -> None:
+        "Record how long a checkout waited to obtain its connection"
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        "Return the counters together with derived averages in milliseconds"
+        with self._lock:
+            waits = self.waits or 1
+            checkins = self.checkins or 1
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "avg_wait_ms": round(self.wait_total / waits * 1000, 3),
+                "max_wait_ms": round(self.wait_max * 1000, 3),
+                "avg_hold_ms": round(self.hold_total / checkins * 1000, 3),
+                "max_hold_ms": round(self.hold_max * 1000, 3),
+            }
+
+
+SQLITE_PRAGMA_PROFILES: dict[str, dict[str, Any]] = {
+    "legacy": {},
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -20000,
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 10000,
+        "cache_size": -20000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 15000,
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+}
+REPORTED_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
 )
 
 
+def resolve_pragma_profile(name: Optional[str]) -> str:
+    "Return a known profile name, falling back to ``balanced``"
+    if name in SQLITE_PRAGMA_PROFILES:
+        return name
+    logger.warning("Unknown sqlite pragma profile %r, using 'balanced'", name)
+    return "balanced"
+
+
+def apply_sqlite_pragmas(
+    dbapi_connection, profile: str, cache_kib: Optional[int] = None
+) -> None:
+    "Apply every pragma of ``profile``, with ``cache_size`` capped at ``cache_kib``"
+    pragmas = dict(SQLITE_PRAGMA_PROFILES[profile])
+    if cache_kib is not None and "cache_size" in pragmas:
+        # Negative cache sizes are in KiB; the larger value is the smaller cache.
+        pragmas["cache_size"] = max(pragmas["cache_size"], -cache_kib)
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_engine(
+    engine, profile: str, max_connections: Optional[int] = None
+) -> None:
+    """Register a connect hook that applies ``profile`` to each new connection.
+
+    With ``max_connections`` the page cache of each connection is cut so all
+    of them together stay within ``sqlite_cache_budget_mb``.
+    """
+    cache_kib = None
+    if max_connections:
+        cache_kib = max(1024, config.sqlite_cache_budget_mb * 1024 // max_connections)
+
+    def _on_connect(dbapi_connection, _connection_record):
+        apply_sqlite_pragmas(dbapi_connection, profile, cache_kib)
+
+    event.listen(engine, "connect", _on_connect)
+
+
+def report_sqlite_pragmas(engine=None) -> dict[str, Any]:
+    "Read back the pragmas that are in effect on a pooled connection"
+    engine = engine or db_engine
+    if engine.dialect.name != "sqlite":
+        return {}
+    with engine.connect() as connection:
+        return {
+            pragma: connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            for pragma in REPORTED_PRAGMAS
+        }
+
+
+# Threads that hold a connection outside requests: the notification workers,
+# the broadcast runner, the chat writer, the activity flusher and the
+# dashboard refresher.
+BACKGROUND_DB_THREADS = config.notification_workers + 4
+
+
+def sqlite_pool_size() -> int:
+    """Connections for requests plus one per background thread.
+
+    SQLite runs one writer at a time and sessions only hold a connection
+    while they query, so request threads share ``db_pool_size`` connections
+    and wait on checkout rather than each keeping a private page cache.
+    """
+    return config.db_pool_size + BACKGROUND_DB_THREADS
+
+
+def _build_engine(url: str):
+    """Create the engine with the pool policy that suits the backend."""
+    if url.startswith("sqlite"):
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            return create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+            )
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=TimedQueuePool,
+            pool_size=sqlite_pool_size(),
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+        )
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+db_engine = _build_engine(database_url)
+sqlite_pragma_profile = resolve_pragma_profile(config.sqlite_pragma_profile)
+if db_engine.dialect.name == "sqlite":
+    configure_sqlite_engine(
+        db_engine,
+        sqlite_pragma_profile,
+        max_connections=sqlite_pool_size() + config.db_max_overflow,
+    )
+pool_metrics = PoolMetrics()
+event.listen(db_engine, "connect", pool_metrics.on_connect)
+event.listen(db_engine, "checkout", pool_metrics.on_checkout)
+event.listen(db_engine, "checkin", pool_metrics.on_checkin)
+event.listen(db_engine, "invalidate", pool_metrics.on_invalidate)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+
+
 def create_database():
     "Create the database and its tables if they do not exist"
     os.makedirs(os.path.dirname(constants.Path.database), exist_ok=True)
@@ -248,11 +492,81 @@ def ensure_schema_upgrades():
         )
 
 
+def _mark_flushed(session, _flush_context):
+    session.info["has_uncommitted_flush"] = True
+
+
+def _clear_flushed(session, *_args):
+    session.info.pop("has_uncommitted_flush", None)
+
+
+event.listen(SessionLocal, "after_flush", _mark_flushed)
+event.listen(SessionLocal, "after_commit", _clear_flushed)
+event.listen(SessionLocal, "after_rollback", _clear_flushed)
+
+
+def _has_uncommitted_changes(db: Session) -> bool:
+    "Whether closing ``db`` would discard pending or flushed work"
+    transaction = db.get_transaction()
+    return bool(
+        db.new
+        or db.dirty
+        or db.deleted
+        or db.info.get("has_uncommitted_flush")
+        or (transaction is not None and not transaction.is_active)
+    )
+
+
+def get_request_session() -> Session:
+    """Return the session shared by everything that runs in the current request.
+
+    Its identity map doubles as a per-request cache: a ``Client`` loaded by
+    ``login_required`` is returned by ``db.get`` in the view without another
+    SELECT. ``close_request_session`` commits or rolls it back on teardown.
+    """
+    db = g.get("db_session")
+    if db is None:
+        # No connection is checked out until the first query, so requests
+        # that never reach the database, or do slow work first, hold none.
+        db = SessionLocal()
+        g.db_session = db
+        g.db_session_depth = 0
+    return db
+
+
+def close_request_session(error: Optional[BaseException] = None) -> None:
+    "Commit the request session, or roll it back if the request failed"
+    db = g.pop("db_session", None)
+    g.pop("db_session_depth", None)
+    if db is None:
+        return
+    try:
+        if error is None and db.get_transaction() is not None:
+            db.commit()
+        else:
+            db.rollback()
+    except exc.SQLAlchemyError as error:
+        logger.error("Error committing request session: %s", error)
+        db.rollback()
+    finally:
+        db.close()
+
+
 @contextmanager
 def get_db_session() -> Iterator[Session]:
-    "Get a database session"
-    session_local = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
-    db = session_local()
+    "Get a database session, reusing the request-scoped one inside a request"
+    if has_request_context():
+        db = get_request_session()
+        g.db_session_depth += 1
+        try:
+            yield db
+        finally:
+            g.db_session_depth -= 1
+            if g.db_session_depth == 0 and _has_uncommitted_changes(db):
+                db.close()
+        return
+
+    db = SessionLocal()
     try:
         yield db
     finally:
@@ -419,9 +733,7 @@ def update_client_details(db: Session, client_id: int, clean_data: dict):
     if "registration_date" in clean_data:
         client_to_update.registration_date = clean_data["registration_date"]
     if "password" in clean_data:
-        client_to_update.password = bcrypt.hashpw(
-            clean_data["password"].encode("utf-8"), bcrypt.gensalt()
-        ).decode("utf-8")
+        client_to_update.password = password_hasher.hash(clean_data["password"])
     if "status" in clean_data:
         client_to_update.status = clean_data["status"]
     if "is_phone_verified" in clean_data:
@@ -456,16 +768,18 @@ def get_article_by_id(db: Session, article_id: int):
     return db.query(models.News).filter(models.News.news_id == article_id).first()
 
 
-def log_login_attempt(db: Session, identifier: str, ip_address: str, is_success: bool):
+def log_login_attempt(
+    db: Session, identifier: str, ip_address: str, is_success: bool
+) -> models.LoginAttempt:
     "Log a login attempt to the database"
-    db.add(
-        models.LoginAttempt(
-            identifier=identifier,
-            ip_address=ip_address,
-            timestamp=datetime.datetime.now(datetime.timezone.utc),
-            is_success=is_success,
-        )
+    attempt = models.LoginAttempt(
+        identifier=identifier,
+        ip_address=ip_address,
+        timestamp=datetime.datetime.now(datetime.timezone.utc),
+        is_success=is_success,
     )
+    db.add(attempt)
+    return attempt
 
 
 def populate_leagues(db: Session):
@@ -588,32 +902,133 @@ def log_action(
     )
 
 
-def save_chat_message(
-    db: Session, client_id: int, message_text: str, sender: str
-) -> models.ChatMessage:
-    "Save a chat message to the database and return it."
-    message = models.ChatMessage(
-        client_id=client_id,
-        message_text=message_text,
-        sender=sender,
-        timestamp=datetime.datetime.now(datetime.timezone.utc),
+def get_chat_history_by_client_id(
+    db: Session,
+    client_id: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> tuple[list[models.ChatMessage], bool]:
+    """Return one page of a client's chat, oldest first, and whether more remain.
+
+    ``after`` pages forward from a message id (for catching up after a
+    reconnect); otherwise the page holds the newest ``limit`` messages older
+    than ``before``, or the newest overall. Both walk the
+    ``(client_id, message_id, sender)`` index.
+    """
+    query = db.query(models.ChatMessage).filter(
+        models.ChatMessage.client_id == client_id
     )
-    db.add(message)
-    db.commit()
-    db.refresh(message)
-    return message
-
+    if after is not None:
+        query = query.filter(models.ChatMessage.message_id > after).order_by(
+            models.ChatMessage.message_id.asc()
+        )
+    else:
+        if before is not None:
+            query = query.filter(models.ChatMessage.message_id < before)
+        query = query.order_by(models.ChatMessage.message_id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+    messages = query.all()
+    has_more = limit is not None and len(messages) > limit
+    if has_more:
+        messages = messages[:limit]
+    if after is None:
+        messages.reverse()
+    return messages, has_more
+
+
+def get_chat_inbox(
+    db: Session,
+    before: Optional[int] = None,
+    limit: Optional[int] = None,
+    client_id: Optional[int] = None,
+) -> tuple[list[Any], bool]:
+    """Return active clients with chat messages, newest conversation first.
+
+    One grouped query over ``chat_messages`` yields each client's last message
+    id and the count of client messages past the admin read marker; the rows
+    carry the client's email and the last message. ``before`` is the
+    ``last_message_id`` of the previous page's final row.
+    """
+    message = models.ChatMessage
+    marker = models.ChatReadMarker
+    summary = (
+        db.query(
+            message.client_id.label("client_id"),
+            func.max(message.message_id).label("last_message_id"),
+            func.count(message.message_id)
+            .filter(
+                message.sender == "client",
+                message.message_id
+                > func.coalesce(marker.last_read_message_id, 0),
+            )
+            .label("unread_count"),
+        )
+        .outerjoin(marker, marker.client_id == message.client_id)
+        .group_by(message.client_id)
+    )
+    if client_id is not None:
+        summary = summary.filter(message.client_id == client_id)
+    if before is not None:
+        summary = summary.having(func.max(message.message_id) < before)
+    summary = summary.subquery()
 
-def get_chat_history_by_client_id(
-    db: Session, client_id: int
-) -> list[models.ChatMessage]:
-    "Retrieve chat history for a specific client"
-    return (
-        db.query(models.ChatMessage)
+    last_message = aliased(models.ChatMessage)
+    query = (
+        db.query(
+            models.Client.client_id,
+            models.Client.email,
+            summary.c.last_message_id,
+            summary.c.unread_count,
+            last_message.message_text,
+            last_message.sender,
+            last_message.timestamp,
+        )
+        .join(summary, summary.c.client_id == models.Client.client_id)
+        .join(last_message, last_message.message_id == summary.c.last_message_id)
+        .filter(models.Client.status == models.EntityStatus.ACTIVE)
+        .order_by(summary.c.last_message_id.desc())
+    )
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = query.all()
+    has_more = limit is not None and len(rows) > limit
+    return rows[:limit] if has_more else rows, has_more
+
+
+def mark_chat_read(
+    db: Session, client_id: int, message_id: Optional[int] = None
+) -> int:
+    """Move the admin read marker for a client forward and return its position.
+
+    The marker never moves backwards or past the client's newest message;
+    ``message_id`` defaults to that newest message. The caller commits.
+    """
+    latest = (
+        db.query(func.max(models.ChatMessage.message_id))
         .filter(models.ChatMessage.client_id == client_id)
-        .order_by(models.ChatMessage.timestamp.asc())
-        .all()
+        .scalar()
+        or 0
+    )
+    position = latest if message_id is None else min(message_id, latest)
+    statement = sqlite_insert(models.ChatReadMarker).values(
+        client_id=client_id,
+        last_read_message_id=position,
+        updated_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["client_id"],
+        set_={
+            "last_read_message_id": func.max(
+                models.ChatReadMarker.last_read_message_id,
+                statement.excluded.last_read_message_id,
+            ),
+            "updated_at": statement.excluded.updated_at,
+        },
     )
+    db.execute(statement)
+    return position
 
 
 def has_team_made_any_payment(db: Session, team_id: int) -> bool:
@@ -5,8 +5,13 @@ from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_socketio import SocketIO
+from . import constants
+from . import limiter_storage  # noqa: F401  registers the sqlite:// storage
 
 csrf_protector = CSRFProtect()
-limiter_storage_uri = os.getenv("AIROCUP_RATE_LIMIT_STORAGE", "memory://")
+limiter_storage_uri = os.getenv(
+    "AIROCUP_RATE_LIMIT_STORAGE",
+    f"sqlite:///{os.path.join(constants.Path.database_dir, 'ratelimits.db')}",
+)
 limiter = Limiter(key_func=get_remote_address, storage_uri=limiter_storage_uri)
 socket_io = SocketIO()
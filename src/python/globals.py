@@ -18,13 +18,25 @@ from . import database
 
 global_blueprint = Blueprint("global", __name__)
 
-gallery_images = sorted(
-    [
-        f
-        for f in os.listdir(constants.Path.gallery_dir)
-        if os.path.isfile(os.path.join(constants.Path.gallery_dir, f))
-    ]
-)
+_gallery_cache = {"mtime": None, "images": []}
+
+
+def get_gallery_images():
+    "List the gallery images, rescanning only when the directory changes"
+    try:
+        mtime = os.stat(constants.Path.gallery_dir).st_mtime_ns
+    except OSError:
+        return []
+    if _gallery_cache["mtime"] != mtime:
+        _gallery_cache["images"] = sorted(
+            [
+                f
+                for f in os.listdir(constants.Path.gallery_dir)
+                if os.path.isfile(os.path.join(constants.Path.gallery_dir, f))
+            ]
+        )
+        _gallery_cache["mtime"] = mtime
+    return _gallery_cache["images"]
 
 
 @global_blueprint.route("/")
@@ -137,7 +149,7 @@ def gallery():
     "Gallery page"
     return render_template(
         constants.global_html_names_data["gallery"],
-        gallery_images=gallery_images,
+        gallery_images=get_gallery_images(),
         gallery_videos=constants.gallery_videos_data,
     )
 
@@ -0,0 +1,66 @@
+"Fail when importing the application exceeds its import-time budget"
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULE = "src.python.app"
+DEFAULT_BUDGET_MS = 1000
+
+
+def measure(module: str = DEFAULT_MODULE) -> dict[str, tuple[int, int]]:
+    """Import ``module`` in a fresh interpreter and return ``{name: (self_us, cumulative_us)}``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        timings[name] = (int(fields[0]), int(fields[1]))
+    if module not in timings:
+        raise RuntimeError(f"no import timing reported for {module}")
+    return timings
+
+
+def main(argv=None) -> int:
+    "Measure the import a few times and compare the fastest run to the budget"
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get("import_time_budget_ms", DEFAULT_BUDGET_MS)),
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    fastest = min(runs, key=lambda timings: timings[args.module][1])
+    total_ms = fastest[args.module][1] / 1000
+
+    print(f"{args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, (self_us, cumulative_us) in sorted(
+        fastest.items(), key=lambda item: item[1][0], reverse=True
+    )[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if total_ms > args.budget_ms:
+        print(f"Import time budget exceeded by {total_ms - args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"SQLite-file storage for Flask-Limiter counters shared by every local worker"
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from limits.storage import Storage
+
+_PURGE_INTERVAL = 60.0
+
+
+def _path_from_uri(uri: str) -> str:
+    "Map ``sqlite:///relative.db`` and ``sqlite:////absolute.db`` to a file path"
+    path = uri.split("://", 1)[1]
+    return path[1:] if path.startswith("/") else path
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in one SQLite file, registered as ``sqlite://``.
+
+    Every worker on the host opens the same file, so a limit holds across
+    processes and restarts without running Redis. Each increment is a short
+    ``BEGIN IMMEDIATE`` transaction; expired rows are purged at most once a
+    minute. Use ``redis://`` instead when workers run on several hosts.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = _path_from_uri(uri)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, count INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        with self._transaction() as connection:
+            if now - self._last_purge > _PURGE_INTERVAL:
+                connection.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+                self._last_purge = now
+            else:
+                connection.execute(
+                    "DELETE FROM rate_limits WHERE key = ? AND expires_at <= ?",
+                    (key, now),
+                )
+            connection.execute(
+                "INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET count = count + excluded.count",
+                (key, amount, now + expiry),
+            )
+            return connection.execute(
+                "SELECT count FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()[0]
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        with self._transaction() as connection:
+            return connection.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
@@ -0,0 +1,195 @@
+"Sliding-window login throttle fed by the login_attempts table"
+
+import collections
+import datetime
+import logging
+import threading
+import time
+from typing import Optional
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from . import config
+from . import database
+from . import models
+
+logger = logging.getLogger(__name__)
+
+_PENDING_ATTEMPTS = "login_attempts_pending"
+
+
+def _as_epoch(timestamp: datetime.datetime) -> float:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.timestamp()
+
+
+class LoginThrottle:
+    """Counts recent failed logins per identifier+IP, per identifier and per IP.
+
+    Failures live in memory as ``(attempt_id, time)`` entries. Every
+    ``sync_interval`` seconds the process tails ``login_attempts`` past the
+    last id it has seen, so failures recorded by other workers count too,
+    while checks themselves never touch the database. A successful login
+    clears the failures of its identifier+IP pair.
+    """
+
+    def __init__(
+        self,
+        window: float = 900.0,
+        pair_limit: int = 5,
+        identifier_limit: int = 20,
+        ip_limit: int = 50,
+        sync_interval: float = 2.0,
+    ):
+        self.window = window
+        self.pair_limit = pair_limit
+        self.identifier_limit = identifier_limit
+        self.ip_limit = ip_limit
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._failures: dict[tuple, collections.OrderedDict] = {}
+        self._last_attempt_id: Optional[int] = None
+        self._synced_at = 0.0
+
+    @staticmethod
+    def _keys(identifier: str, ip_address: str) -> tuple[tuple, tuple, tuple]:
+        identifier = (identifier or "").strip().lower()
+        return (
+            ("pair", identifier, ip_address),
+            ("identifier", identifier),
+            ("ip", ip_address),
+        )
+
+    def _add_failure(self, identifier: str, ip_address: str, attempt_id, at: float):
+        for key in self._keys(identifier, ip_address):
+            self._failures.setdefault(key, collections.OrderedDict())[attempt_id] = at
+
+    def _clear_pair(self, identifier: str, ip_address: str) -> None:
+        pair_key, identifier_key, ip_key = self._keys(identifier, ip_address)
+        attempt_ids = self._failures.pop(pair_key, {})
+        for key in (identifier_key, ip_key):
+            entries = self._failures.get(key)
+            if entries:
+                for attempt_id in attempt_ids:
+                    entries.pop(attempt_id, None)
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        for key in list(self._failures):
+            entries = self._failures[key]
+            while entries and next(iter(entries.values())) < cutoff:
+                entries.popitem(last=False)
+            if not entries:
+                del self._failures[key]
+
+    def _apply(self, rows) -> None:
+        for attempt_id, identifier, ip_address, timestamp, is_success in rows:
+            if is_success:
+                self._clear_pair(identifier, ip_address)
+            else:
+                self._add_failure(
+                    identifier, ip_address, attempt_id, _as_epoch(timestamp)
+                )
+
+    def sync(self, force: bool = False) -> None:
+        "Pull attempts other workers recorded since the last sync"
+        if not force and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            attempt = models.LoginAttempt
+            query = select(
+                attempt.attempt_id,
+                attempt.identifier,
+                attempt.ip_address,
+                attempt.timestamp,
+                attempt.is_success,
+            ).order_by(attempt.attempt_id)
+            if self._last_attempt_id is None:
+                since = datetime.datetime.now(
+                    datetime.timezone.utc
+                ) - datetime.timedelta(seconds=self.window)
+                query = query.where(attempt.timestamp >= since)
+            else:
+                query = query.where(attempt.attempt_id > self._last_attempt_id)
+            try:
+                with database.get_db_session() as db:
+                    rows = db.execute(query).all()
+            except SQLAlchemyError as error:
+                logger.error("Error syncing login attempts: %s", error)
+                return
+            with self._lock:
+                self._apply(rows)
+                if rows:
+                    self._last_attempt_id = rows[-1].attempt_id
+                elif self._last_attempt_id is None:
+                    self._last_attempt_id = 0
+                self._prune(time.time())
+            self._synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def retry_after(self, identifier: str, ip_address: str) -> int:
+        "Seconds until another attempt is allowed, or 0 when it is allowed now"
+        self.sync()
+        now = time.time()
+        limits = (self.pair_limit, self.identifier_limit, self.ip_limit)
+        wait = 0.0
+        with self._lock:
+            for key, limit in zip(self._keys(identifier, ip_address), limits):
+                entries = self._failures.get(key)
+                if not entries or limit <= 0:
+                    continue
+                recent = [at for at in entries.values() if at > now - self.window]
+                if len(recent) >= limit:
+                    oldest_blocking = recent[len(recent) - limit]
+                    wait = max(wait, oldest_blocking + self.window - now)
+        return int(wait) + 1 if wait > 0 else 0
+
+    def record(
+        self, db: Session, identifier: str, ip_address: str, is_success: bool
+    ) -> None:
+        """Add the attempt to ``db``; it counts in this process once ``db`` commits.
+
+        The caller commits, so the attempt lands in the same transaction as
+        the rest of the login. The sync cursor is left alone so rows other
+        workers committed with lower ids are still picked up; entries are
+        keyed by id, so seeing this row again on the next sync does not count
+        it twice.
+        """
+        attempt = database.log_login_attempt(db, identifier, ip_address, is_success)
+        db.flush()
+        db.info.setdefault(_PENDING_ATTEMPTS, []).append(
+            (attempt.attempt_id, identifier, ip_address, attempt.timestamp, is_success)
+        )
+
+    def apply_committed(self, attempts: list) -> None:
+        "Count attempts whose transaction has just committed"
+        with self._lock:
+            self._apply(attempts)
+
+
+login_throttle = LoginThrottle(
+    window=config.login_throttle_window,
+    pair_limit=config.login_throttle_pair_limit,
+    identifier_limit=config.login_throttle_identifier_limit,
+    ip_limit=config.login_throttle_ip_limit,
+    sync_interval=config.login_throttle_sync_interval,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _count_committed_attempts(session: Session) -> None:
+    "Count recorded attempts in this process once they are stored"
+    attempts = session.info.pop(_PENDING_ATTEMPTS, None)
+    if attempts:
+        login_throttle.apply_committed(attempts)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_attempts(session: Session) -> None:
+    "Rolled-back attempts were never stored, so they do not count"
+    session.info.pop(_PENDING_ATTEMPTS, None)
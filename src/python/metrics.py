@@ -0,0 +1,158 @@
+"Background sampler that keeps recent server resource usage in memory"
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from . import config
+
+_psutil = None
+
+
+def _load_psutil():
+    "Import psutil on first use so it is not paid for at application import"
+    global _psutil
+    if _psutil is None:
+        try:
+            import psutil
+        except ImportError:
+            psutil = False
+        _psutil = psutil
+    return _psutil or None
+
+
+def _read_gpu_stats(nvidia_smi_path: Optional[str]) -> dict:
+    "Query the first GPU through nvidia-smi, returning ``None`` values if unavailable"
+    empty = {"gpu_percent": None, "vram_total_gb": None, "vram_used_gb": None}
+    if not nvidia_smi_path:
+        return empty
+    try:
+        output = subprocess.check_output(
+            [
+                nvidia_smi_path,
+                "--query-gpu=utilization.gpu,memory.total,memory.used",
+                "--format=csv,noheader,nounits",
+            ],
+            text=True,
+            stderr=subprocess.DEVNULL,
+            timeout=5,
+        )
+        first_line = output.strip().splitlines()[0]
+        util, mem_total, mem_used = [float(x.strip()) for x in first_line.split(",")]
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return empty
+    return {
+        "gpu_percent": round(util, 1),
+        "vram_total_gb": round(mem_total / 1024, 2),
+        "vram_used_gb": round(mem_used / 1024, 2),
+    }
+
+
+def collect_sample(nvidia_smi_path: Optional[str] = None) -> dict:
+    "Collect one snapshot of CPU, load, memory, swap, disk and GPU usage"
+    sample = {"timestamp": time.time()}
+
+    try:
+        total_disk, used_disk, free_disk = shutil.disk_usage("/")
+        sample["disk_percent"] = round((used_disk / total_disk) * 100, 1)
+        sample["disk_free_gb"] = round(free_disk / (1024**3), 1)
+        sample["disk_total_gb"] = round(total_disk / (1024**3), 1)
+    except OSError:
+        sample["disk_percent"] = 0
+        sample["disk_free_gb"] = 0
+        sample["disk_total_gb"] = 0
+
+    load_avg = os.getloadavg() if hasattr(os, "getloadavg") else (0, 0, 0)
+    sample["load_avg_1m"] = round(load_avg[0], 2)
+
+    psutil = _load_psutil()
+    if psutil is not None:
+        sample["cpu_percent"] = psutil.cpu_percent(interval=None)
+        vm = psutil.virtual_memory()
+        sample["ram_total_gb"] = round(vm.total / (1024**3), 1)
+        sample["ram_used_gb"] = round(vm.used / (1024**3), 1)
+        sample["ram_percent"] = round(vm.percent, 1)
+        sample["swap_percent"] = round(psutil.swap_memory().percent, 1)
+    else:
+        sample["cpu_percent"] = 0
+        sample["ram_total_gb"] = 0
+        sample["ram_used_gb"] = 0
+        sample["ram_percent"] = 0
+        sample["swap_percent"] = 0
+
+    sample.update(_read_gpu_stats(nvidia_smi_path))
+    return sample
+
+
+class SystemMetricsSampler:
+    """Samples server metrics on a fixed cadence into a bounded ring buffer.
+
+    The dashboard reads ``latest()`` without touching psutil or spawning
+    processes; ``series()`` returns the retained window for charting.
+    """
+
+    def __init__(self, interval: float = 15.0, retention: float = 3600.0):
+        self.interval = max(1.0, interval)
+        self._samples: deque = deque(maxlen=max(1, int(retention // self.interval)))
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._nvidia_smi_path = shutil.which("nvidia-smi")
+
+    def sample_now(self) -> dict:
+        "Take a sample immediately and append it to the buffer"
+        sample = collect_sample(self._nvidia_smi_path)
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def latest(self) -> dict:
+        "Return the newest sample, sampling once if the buffer is still empty"
+        with self._lock:
+            if self._samples:
+                return self._samples[-1]
+        return self.sample_now()
+
+    def series(self, since: Optional[float] = None) -> list[dict]:
+        "Return buffered samples, optionally only those newer than ``since``"
+        with self._lock:
+            samples = list(self._samples)
+        if since is not None:
+            samples = [s for s in samples if s["timestamp"] > since]
+        return samples
+
+    def _run(self) -> None:
+        psutil = _load_psutil()
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)
+            self._stop_event.wait(1.0)
+        while not self._stop_event.is_set():
+            self.sample_now()
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        "Start the sampling thread once per process"
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="system-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        "Stop the sampling thread"
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+
+metrics_sampler = SystemMetricsSampler(
+    interval=config.system_metrics_interval,
+    retention=config.system_metrics_retention,
+)
@@ -0,0 +1,253 @@
+"Versioned schema migrations applied once per database under a file lock"
+
+import contextlib
+import datetime
+import logging
+import os
+from typing import Callable, NamedTuple
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from . import config
+from . import constants
+from . import database
+from . import models
+from . import search_index
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = f"{constants.Path.database}.migrate.lock"
+
+
+class Migration(NamedTuple):
+    """One ordered schema step; ``apply`` must be safe to run on any older schema."""
+
+    version: int
+    name: str
+    apply: Callable[[], None]
+
+
+def _create_tables() -> None:
+    database.create_database()
+
+
+def _seed_reference_data() -> None:
+    with database.get_db_session() as db:
+        database.populate_geography_data(db)
+        database.populate_leagues(db)
+
+
+def _create_runtime_settings() -> None:
+    models.RuntimeSetting.__table__.create(bind=database.db_engine, checkfirst=True)
+
+
+def _create_notification_outbox() -> None:
+    models.Notification.__table__.create(bind=database.db_engine, checkfirst=True)
+
+
+def _create_broadcasts() -> None:
+    models.Broadcast.__table__.create(bind=database.db_engine, checkfirst=True)
+    with database.db_engine.begin() as connection:
+        columns = {
+            row[1]
+            for row in connection.execute(
+                text("PRAGMA table_info(notification_outbox);")
+            )
+        }
+        if "broadcast_id" not in columns:
+            connection.execute(
+                text(
+                    "ALTER TABLE notification_outbox ADD COLUMN broadcast_id "
+                    "INTEGER REFERENCES broadcasts (broadcast_id);"
+                )
+            )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_notification_outbox_broadcast_id "
+                "ON notification_outbox (broadcast_id);"
+            )
+        )
+
+
+def _create_chat_history_index() -> None:
+    with database.db_engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS chat_messages_client_message_idx "
+                "ON chat_messages (client_id, message_id);"
+            )
+        )
+
+
+def _create_chat_read_markers() -> None:
+    models.ChatReadMarker.__table__.create(bind=database.db_engine, checkfirst=True)
+    with database.db_engine.begin() as connection:
+        # Covers the inbox aggregate and history pages; the older indexes
+        # are prefixes of it.
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS chat_messages_client_message_sender_idx "
+                "ON chat_messages (client_id, message_id, sender);"
+            )
+        )
+        for index_name in (
+            "chat_messages_client_message_idx",
+            "ix_chat_messages_client_id",
+        ):
+            connection.execute(text(f"DROP INDEX IF EXISTS {index_name};"))
+
+
+def _add_chat_client_message_id() -> None:
+    with database.db_engine.begin() as connection:
+        columns = {
+            row[1]
+            for row in connection.execute(text("PRAGMA table_info(chat_messages);"))
+        }
+        if "client_message_id" not in columns:
+            connection.execute(
+                text(
+                    "ALTER TABLE chat_messages "
+                    "ADD COLUMN client_message_id VARCHAR(64);"
+                )
+            )
+        connection.execute(
+            text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS chat_messages_client_uid_idx "
+                "ON chat_messages (client_id, client_message_id);"
+            )
+        )
+
+
+def _add_notification_lease_owner() -> None:
+    with database.db_engine.begin() as connection:
+        columns = {
+            row[1]
+            for row in connection.execute(
+                text("PRAGMA table_info(notification_outbox);")
+            )
+        }
+        if "lease_owner" not in columns:
+            connection.execute(
+                text(
+                    "ALTER TABLE notification_outbox "
+                    "ADD COLUMN lease_owner VARCHAR(32);"
+                )
+            )
+
+
+def _create_search_index() -> None:
+    with database.db_engine.begin() as connection:
+        counts = search_index.rebuild(connection)
+    logger.info("Search index built: %s", counts)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "create_tables", _create_tables),
+    Migration(2, "legacy_schema_upgrades", database.ensure_schema_upgrades),
+    Migration(3, "seed_reference_data", _seed_reference_data),
+    Migration(4, "runtime_settings", _create_runtime_settings),
+    Migration(5, "notification_outbox", _create_notification_outbox),
+    Migration(6, "broadcasts", _create_broadcasts),
+    Migration(7, "chat_history_index", _create_chat_history_index),
+    Migration(8, "chat_read_markers", _create_chat_read_markers),
+    Migration(9, "chat_client_message_id", _add_chat_client_message_id),
+    Migration(10, "search_index", _create_search_index),
+    Migration(11, "notification_lease_owner", _add_notification_lease_owner),
+]
+LATEST_VERSION = max(migration.version for migration in MIGRATIONS)
+
+
+@contextlib.contextmanager
+def _migration_lock(path: str = LOCK_PATH):
+    "Hold an exclusive OS-level lock so only one process migrates at a time"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def current_version() -> int:
+    "Return the applied schema version, or 0 for a database never migrated"
+    try:
+        with database.db_engine.connect() as connection:
+            return (
+                connection.execute(
+                    text("SELECT MAX(version) FROM schema_migrations")
+                ).scalar()
+                or 0
+            )
+    except OperationalError:
+        return 0
+
+
+def _record(version: int, name: str) -> None:
+    with database.db_engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER NOT NULL PRIMARY KEY, "
+                "name VARCHAR(100) NOT NULL, "
+                "applied_at DATETIME NOT NULL)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO schema_migrations (version, name, applied_at) "
+                "VALUES (:version, :name, :applied_at)"
+            ),
+            {
+                "version": version,
+                "name": name,
+                "applied_at": datetime.datetime.now(datetime.timezone.utc),
+            },
+        )
+
+
+def pending_migrations(version: int) -> list[Migration]:
+    "Return the migrations newer than ``version`` in the order they apply"
+    return sorted(
+        (migration for migration in MIGRATIONS if migration.version > version),
+        key=lambda migration: migration.version,
+    )
+
+
+def migrate() -> list[Migration]:
+    """Apply every pending migration under the lock and return the ones applied."""
+    with _migration_lock():
+        pending = pending_migrations(current_version())
+        for migration in pending:
+            logger.info(
+                "Applying migration %s_%s", migration.version, migration.name
+            )
+            migration.apply()
+            _record(migration.version, migration.name)
+        return pending
+
+
+def ensure_current() -> None:
+    """Check the schema version once at startup and migrate only when behind."""
+    version = current_version()
+    if version >= LATEST_VERSION:
+        return
+    if not config.db_auto_migrate:
+        raise RuntimeError(
+            f"database schema is at version {version}, expected {LATEST_VERSION}; "
+            "run 'flask db-migrate'"
+        )
+    migrate()
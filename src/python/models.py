@@ -82,6 +82,31 @@ class DocumentStatus(LabeledEnum):
     REJECTED = ("rejected", "رد شده")
 
 
+class NotificationChannel(LabeledEnum):
+    """Enumeration for the delivery channel of a notification."""
+
+    SMS = ("sms", "پیامک")
+    EMAIL = ("email", "ایمیل")
+
+
+class NotificationStatus(LabeledEnum):
+    """Enumeration for the delivery status of a notification."""
+
+    PENDING = ("pending", "در صف ارسال")
+    SENDING = ("sending", "در حال ارسال")
+    SENT = ("sent", "ارسال شده")
+    FAILED = ("failed", "ناموفق")
+
+
+class BroadcastStatus(LabeledEnum):
+    """Enumeration for the progress of an admin broadcast."""
+
+    QUEUED = ("queued", "در صف")
+    RUNNING = ("running", "در حال ارسال")
+    COMPLETED = ("completed", "تکمیل شده")
+    CANCELLED = ("cancelled", "لغو شده")
+
+
 class Client(Base):
     """Represents a registered user account (client)."""
 
@@ -406,18 +431,45 @@ class ChatMessage(Base):
     """Represents a single message in the admin-client chat."""
 
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index(
+            "chat_messages_client_message_sender_idx",
+            "client_id",
+            "message_id",
+            "sender",
+        ),
+        Index(
+            "chat_messages_client_uid_idx",
+            "client_id",
+            "client_message_id",
+            unique=True,
+        ),
+    )
     message_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     client_id: Mapped[int] = mapped_column(
-        ForeignKey("clients.client_id"), nullable=False, index=True
+        ForeignKey("clients.client_id"), nullable=False
     )
     message_text: Mapped[str] = mapped_column(TEXT, nullable=False)
     timestamp: Mapped[datetime.datetime] = mapped_column(
         DateTime, nullable=False, index=True
     )
     sender: Mapped[str] = mapped_column(String(20), nullable=False)
+    client_message_id: Mapped[Optional[str]] = mapped_column(String(64))
     client = relationship("Client", back_populates="chat_messages")
 
 
+class ChatReadMarker(Base):
+    """The newest message of a client's chat that admins have read."""
+
+    __tablename__ = "chat_read_markers"
+
+    client_id: Mapped[int] = mapped_column(
+        ForeignKey("clients.client_id"), primary_key=True
+    )
+    last_read_message_id: Mapped[int] = mapped_column(nullable=False, default=0)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+
+
 class TeamDocument(Base):
     """Stores metadata about documents uploaded for a team."""
 
@@ -449,3 +501,87 @@ class DailyStat(Base):
     stat_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     date: Mapped[datetime.date] = mapped_column(Date, unique=True, nullable=False)
     visit_count: Mapped[int] = mapped_column(default=0, nullable=False)
+
+
+class RuntimeSetting(Base):
+    """Operational setting that overrides its configured default while running."""
+
+    __tablename__ = "runtime_settings"
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[str] = mapped_column(TEXT, nullable=False)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+
+
+class Notification(Base):
+    """Outgoing SMS or email kept in the outbox until it is delivered or gives up."""
+
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("notification_outbox_status_due_idx", "status", "next_attempt_at"),
+    )
+    notification_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    client_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("clients.client_id"), nullable=True, index=True
+    )
+    broadcast_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("broadcasts.broadcast_id"), nullable=True, index=True
+    )
+    channel: Mapped[NotificationChannel] = mapped_column(
+        sql_alchemy_enum(NotificationChannel), nullable=False
+    )
+    recipient: Mapped[str] = mapped_column(String(255), nullable=False)
+    template_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    subject: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    body: Mapped[str] = mapped_column(TEXT, nullable=False)
+    status: Mapped[NotificationStatus] = mapped_column(
+        sql_alchemy_enum(NotificationStatus),
+        default=NotificationStatus.PENDING,
+        nullable=False,
+    )
+    attempts: Mapped[int] = mapped_column(default=0, nullable=False)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False
+    )
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    sent_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
+    last_error: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
+    provider_reference: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True
+    )
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+
+
+class Broadcast(Base):
+    """Admin announcement fanned out to every client matching its filters."""
+
+    __tablename__ = "broadcasts"
+    broadcast_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    channel: Mapped[NotificationChannel] = mapped_column(
+        sql_alchemy_enum(NotificationChannel), nullable=False
+    )
+    subject: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    body: Mapped[str] = mapped_column(TEXT, nullable=False)
+    template_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    filters: Mapped[str] = mapped_column(TEXT, nullable=False, default="{}")
+    status: Mapped[BroadcastStatus] = mapped_column(
+        sql_alchemy_enum(BroadcastStatus),
+        default=BroadcastStatus.QUEUED,
+        nullable=False,
+        index=True,
+    )
+    total_recipients: Mapped[Optional[int]] = mapped_column(nullable=True)
+    queued_count: Mapped[int] = mapped_column(default=0, nullable=False)
+    last_client_id: Mapped[int] = mapped_column(default=0, nullable=False)
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    lease_until: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    started_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
+    finished_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
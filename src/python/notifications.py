@@ -0,0 +1,630 @@
+"Durable SMS/email outbox delivered by a pool of background workers"
+
+import atexit
+import collections
+import datetime
+import logging
+import random
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.text import MIMEText
+from typing import Any, Optional
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from . import config
+from . import database
+from . import models
+from . import transactions
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("live", "fake")
+_ENQUEUED_FLAG = "notifications_enqueued"
+_PURGE_INTERVAL = 3600.0
+# Longest one send can block: the SMTP connect and the send each time out at
+# 15 s (Melli Payamak at 10 s). A lease with less left than this is renewed
+# before the next row of the batch is sent.
+_SEND_TIMEOUT = 30.0
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class DeliveryError(Exception):
+    """Raised by a provider when a message was not delivered.
+
+    ``permanent`` errors (bad configuration, refused recipient) fail the
+    notification at once; the others are retried with backoff.
+    """
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class SmsProvider:
+    """Sends Melli Payamak template SMS over one reused HTTP session."""
+
+    def __init__(self, sms_config: dict):
+        self.sms_config = sms_config
+        self._session = None
+
+    def send(self, notification) -> Optional[str]:
+        "Deliver one SMS and return the provider's message id"
+        import requests
+
+        rest_url = self.sms_config.get("rest_url")
+        if not isinstance(rest_url, str) or not rest_url:
+            raise DeliveryError(
+                "SMS configuration is missing or invalid for 'rest_url'",
+                permanent=True,
+            )
+        if self._session is None:
+            self._session = requests.Session()
+        payload = {
+            "username": self.sms_config.get("username"),
+            "password": self.sms_config.get("password"),
+            "to": notification.recipient,
+            "bodyId": notification.template_id,
+            "text": notification.body,
+        }
+        try:
+            response = self._session.post(rest_url, data=payload, timeout=10)
+            response.raise_for_status()
+            api_response = response.json()
+        except (requests.exceptions.RequestException, ValueError) as error:
+            self.close()
+            raise DeliveryError(f"SMS request failed: {error}") from error
+        if api_response.get("RetStatus") != 1:
+            raise DeliveryError(f"SMS API status {api_response.get('Value')}")
+        return str(api_response.get("Value"))
+
+    def close(self) -> None:
+        "Drop the pooled HTTP connections"
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class EmailProvider:
+    """Sends email over one SMTP connection kept open between messages.
+
+    The connection is logged in once and reused; it is reopened when the
+    server has dropped it or after ``idle_timeout`` seconds without mail.
+    """
+
+    def __init__(self, mail_config: dict, idle_timeout: float = 60.0):
+        self.mail_config = mail_config
+        self.idle_timeout = idle_timeout
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        use_ssl = self.mail_config.get("UseSSL", False)
+        server_class = smtplib.SMTP_SSL if use_ssl else smtplib.SMTP
+        server = server_class(
+            self.mail_config["Server"], self.mail_config["Port"], timeout=15
+        )
+        try:
+            if not use_ssl and self.mail_config.get("UseTLS", True):
+                server.starttls()
+            server.login(self.mail_config["Username"], self.mail_config["Password"])
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    def send(self, notification) -> Optional[str]:
+        "Deliver one email through the shared SMTP connection"
+        sender = self.mail_config.get("Username")
+        if not self.mail_config.get("Server") or not sender:
+            raise DeliveryError("mail configuration is incomplete", permanent=True)
+        message = MIMEText(notification.body, "html", "utf-8")
+        message["Subject"] = notification.subject or ""
+        message["From"] = sender
+        message["To"] = notification.recipient
+        if time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        for attempt in range(2):
+            try:
+                if self._server is None:
+                    self._server = self._connect()
+                self._server.sendmail(
+                    sender, [notification.recipient], message.as_string()
+                )
+                self._last_used = time.monotonic()
+                return None
+            except smtplib.SMTPServerDisconnected as error:
+                self.close()
+                if attempt:
+                    raise DeliveryError(f"SMTP disconnected: {error}") from error
+            except smtplib.SMTPRecipientsRefused as error:
+                raise DeliveryError(
+                    f"SMTP refused recipient: {error}", permanent=True
+                ) from error
+            except (smtplib.SMTPException, OSError) as error:
+                self.close()
+                raise DeliveryError(f"SMTP error: {error}") from error
+        return None
+
+    def close(self) -> None:
+        "Log out and close the SMTP connection"
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                self._server.close()
+            self._server = None
+
+
+class FakeProvider:
+    """Keeps messages in memory instead of sending them, for offline runs."""
+
+    sent: collections.deque = collections.deque(maxlen=1000)
+
+    def __init__(self, channel: models.NotificationChannel):
+        self.channel = channel
+
+    def send(self, notification) -> Optional[str]:
+        "Record the message and log it"
+        reference = f"fake-{notification.notification_id}"
+        FakeProvider.sent.append(
+            {
+                "notification_id": notification.notification_id,
+                "channel": self.channel.value,
+                "recipient": notification.recipient,
+                "subject": notification.subject,
+                "body": notification.body,
+            }
+        )
+        logger.info(
+            "Fake %s to %s: %s",
+            self.channel.value,
+            notification.recipient,
+            notification.body,
+        )
+        return reference
+
+    def close(self) -> None:
+        "Nothing to release"
+
+
+class NotificationOutbox:
+    """Queues notifications in ``notification_outbox`` and delivers them.
+
+    ``queue_sms``/``queue_email`` only add a row to the caller's session, so a
+    message is stored in the same commit as the change that caused it. Each
+    of ``workers`` threads owns its own providers (one HTTP session, one SMTP
+    connection), claims due rows with a single ``UPDATE ... RETURNING`` and
+    records the outcome. A claim is a lease held under a random
+    ``lease_owner`` token: the worker renews it while working through the
+    batch, and rows stuck in ``sending`` after ``lease`` seconds, for example
+    because the process died, are claimed again. Outcomes are only stored
+    while the token still matches, so a worker that lost its lease neither
+    sends the rest of its batch nor overwrites the new owner's result.
+    Failures retry with exponential backoff until ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        batch_size: int = 10,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 5.0,
+        backoff_max: float = 600.0,
+        lease: float = 60.0,
+        retention_days: int = 30,
+        provider: str = "live",
+    ):
+        if provider not in PROVIDERS:
+            raise ValueError(
+                f"unknown notification_provider {provider!r}; expected one of {PROVIDERS}"
+            )
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.retention_days = retention_days
+        self.provider = provider
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_purge = 0.0
+        self._exit_hook_registered = False
+
+    def enqueue(
+        self,
+        db: Session,
+        channel: models.NotificationChannel,
+        recipient: str,
+        body: str,
+        client_id: Optional[int] = None,
+        subject: Optional[str] = None,
+        template_id: Optional[int] = None,
+    ) -> models.Notification:
+        "Add a notification to ``db``; it is sent once the caller commits"
+        now = _utcnow()
+        notification = models.Notification(
+            client_id=client_id,
+            channel=channel,
+            recipient=recipient,
+            body=body,
+            subject=subject,
+            template_id=template_id,
+            status=models.NotificationStatus.PENDING,
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now,
+        )
+        db.add(notification)
+        db.info[_ENQUEUED_FLAG] = True
+        return notification
+
+    def enqueue_many(self, db: Session, rows: list[dict[str, Any]]) -> int:
+        """Insert many notifications in one statement; each row needs ``channel``,
+        ``recipient`` and ``body`` and may set the other columns."""
+        if not rows:
+            return 0
+        now = _utcnow()
+        db.execute(
+            insert(models.Notification),
+            [
+                {
+                    "status": models.NotificationStatus.PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "created_at": now,
+                    **row,
+                }
+                for row in rows
+            ],
+        )
+        db.info[_ENQUEUED_FLAG] = True
+        return len(rows)
+
+    def queue_sms(
+        self, db: Session, client: models.Client, template_id: int, text: str
+    ) -> models.Notification:
+        "Queue a templated SMS to the client's phone number"
+        return self.enqueue(
+            db,
+            models.NotificationChannel.SMS,
+            client.phone_number,
+            text,
+            client_id=client.client_id,
+            template_id=template_id,
+        )
+
+    def queue_email(
+        self, db: Session, client: models.Client, subject: str, body: str
+    ) -> models.Notification:
+        "Queue an HTML email to the client's address"
+        return self.enqueue(
+            db,
+            models.NotificationChannel.EMAIL,
+            client.email,
+            body,
+            client_id=client.client_id,
+            subject=subject,
+        )
+
+    def wake(self) -> None:
+        "Let idle workers look for due notifications now"
+        self._wake.set()
+
+    def _make_providers(self) -> dict:
+        if self.provider == "fake":
+            return {
+                channel: FakeProvider(channel) for channel in models.NotificationChannel
+            }
+        return {
+            models.NotificationChannel.SMS: SmsProvider(config.melli_payamak),
+            models.NotificationChannel.EMAIL: EmailProvider(
+                config.mail_configuration, idle_timeout=config.notification_smtp_idle
+            ),
+        }
+
+    def _backoff(self, attempts: int) -> float:
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def claim(self, limit: Optional[int] = None) -> list:
+        """Lease up to ``limit`` due notifications to the calling worker.
+
+        Messages that do not belong to a broadcast are claimed first, so a
+        verification code is never stuck behind an announcement's backlog.
+        """
+        notification = models.Notification
+        owner = uuid.uuid4().hex
+        claimable = (
+            models.NotificationStatus.PENDING,
+            models.NotificationStatus.SENDING,
+        )
+
+        def _claim(db: Session) -> list:
+            now = _utcnow()
+            due = (
+                select(notification.notification_id)
+                .where(
+                    notification.status.in_(claimable),
+                    notification.next_attempt_at <= now,
+                )
+                .order_by(
+                    notification.broadcast_id.isnot(None),
+                    notification.next_attempt_at,
+                )
+                .limit(limit or self.batch_size)
+                .scalar_subquery()
+            )
+            return db.execute(
+                update(notification)
+                .where(
+                    notification.notification_id.in_(due),
+                    notification.status.in_(claimable),
+                    notification.next_attempt_at <= now,
+                )
+                .values(
+                    status=models.NotificationStatus.SENDING,
+                    attempts=notification.attempts + 1,
+                    next_attempt_at=now + datetime.timedelta(seconds=self.lease),
+                    lease_owner=owner,
+                )
+                .returning(
+                    notification.notification_id,
+                    notification.channel,
+                    notification.recipient,
+                    notification.template_id,
+                    notification.subject,
+                    notification.body,
+                    notification.attempts,
+                    notification.lease_owner,
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+
+        return transactions.run_write_transaction(_claim)
+
+    def renew(self, rows: list) -> set[int]:
+        "Extend the lease on claimed rows; return the ids still held"
+        if not rows:
+            return set()
+        notification = models.Notification
+
+        def _renew(db: Session) -> set[int]:
+            return set(
+                db.execute(
+                    update(notification)
+                    .where(
+                        notification.notification_id.in_(
+                            [row.notification_id for row in rows]
+                        ),
+                        notification.lease_owner == rows[0].lease_owner,
+                        notification.status == models.NotificationStatus.SENDING,
+                    )
+                    .values(
+                        next_attempt_at=_utcnow()
+                        + datetime.timedelta(seconds=self.lease)
+                    )
+                    .returning(notification.notification_id)
+                    .execution_options(synchronize_session=False)
+                ).scalars()
+            )
+
+        return transactions.run_write_transaction(_renew)
+
+    def _record(self, row, values: dict[str, Any]) -> bool:
+        notification = models.Notification
+
+        def _store(db: Session) -> int:
+            return db.execute(
+                update(notification)
+                .where(
+                    notification.notification_id == row.notification_id,
+                    notification.lease_owner == row.lease_owner,
+                    notification.status == models.NotificationStatus.SENDING,
+                )
+                .values(lease_owner=None, **values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        if transactions.run_write_transaction(_store):
+            return True
+        logger.warning(
+            "Lease on notification %s was lost; outcome not stored",
+            row.notification_id,
+        )
+        return False
+
+    def deliver(self, row, providers: dict) -> bool:
+        "Send one claimed notification and store the outcome"
+        now = _utcnow()
+        try:
+            reference = providers[row.channel].send(row)
+        except DeliveryError as error:
+            gave_up = error.permanent or row.attempts >= self.max_attempts
+            values = {"last_error": str(error)[:2000]}
+            if gave_up:
+                values["status"] = models.NotificationStatus.FAILED
+                logger.error(
+                    "Giving up on %s notification %s to %s after %s attempts: %s",
+                    row.channel.value,
+                    row.notification_id,
+                    row.recipient,
+                    row.attempts,
+                    error,
+                )
+            else:
+                values["status"] = models.NotificationStatus.PENDING
+                values["next_attempt_at"] = now + datetime.timedelta(
+                    seconds=self._backoff(row.attempts)
+                )
+                logger.warning(
+                    "Retrying %s notification %s to %s: %s",
+                    row.channel.value,
+                    row.notification_id,
+                    row.recipient,
+                    error,
+                )
+            self._record(row, values)
+            return False
+        self._record(
+            row,
+            {
+                "status": models.NotificationStatus.SENT,
+                "sent_at": now,
+                "last_error": None,
+                "provider_reference": reference,
+            },
+        )
+        logger.info(
+            "%s notification %s sent to %s",
+            row.channel.value,
+            row.notification_id,
+            row.recipient,
+        )
+        return True
+
+    def run_once(self, providers: Optional[dict] = None) -> int:
+        "Claim and deliver one batch; return how many were claimed"
+        own_providers = providers is None
+        providers = providers or self._make_providers()
+        try:
+            pending = list(self.claim())
+            claimed = len(pending)
+            leased_until = time.monotonic() + self.lease
+            while pending:
+                if leased_until - time.monotonic() < _SEND_TIMEOUT:
+                    held = self.renew(pending)
+                    leased_until = time.monotonic() + self.lease
+                    pending = [row for row in pending if row.notification_id in held]
+                    if not pending:
+                        break
+                self.deliver(pending.pop(0), providers)
+            return claimed
+        finally:
+            if own_providers:
+                for provider in providers.values():
+                    provider.close()
+
+    def purge(self) -> int:
+        "Delete sent notifications older than ``retention_days``"
+        cutoff = _utcnow() - datetime.timedelta(days=self.retention_days)
+
+        def _delete(db: Session) -> int:
+            return db.query(models.Notification).filter(
+                models.Notification.status == models.NotificationStatus.SENT,
+                models.Notification.created_at < cutoff,
+            ).delete(synchronize_session=False)
+
+        return transactions.run_write_transaction(_delete)
+
+    def requeue_failed(self) -> int:
+        "Give failed notifications a fresh set of attempts"
+
+        def _requeue(db: Session) -> int:
+            return db.query(models.Notification).filter(
+                models.Notification.status == models.NotificationStatus.FAILED
+            ).update(
+                {
+                    "status": models.NotificationStatus.PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": _utcnow(),
+                },
+                synchronize_session=False,
+            )
+
+        return transactions.run_write_transaction(_requeue)
+
+    def counts(self) -> dict[str, int]:
+        "Return the number of notifications per status"
+        with database.get_db_session() as db:
+            rows = db.execute(
+                select(models.Notification.status, func.count()).group_by(
+                    models.Notification.status
+                )
+            ).all()
+        totals = {status.value: 0 for status in models.NotificationStatus}
+        totals.update({status.value: count for status, count in rows})
+        return totals
+
+    def _run(self) -> None:
+        providers = self._make_providers()
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    claimed = self.run_once(providers)
+                    if (
+                        not claimed
+                        and self.retention_days > 0
+                        and time.monotonic() - self._last_purge > _PURGE_INTERVAL
+                    ):
+                        self._last_purge = time.monotonic()
+                        self.purge()
+                except SQLAlchemyError as error:
+                    logger.error("Error delivering notifications: %s", error)
+                    claimed = 0
+                if claimed < self.batch_size:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+        finally:
+            for provider in providers.values():
+                provider.close()
+
+    def start(self) -> None:
+        "Start the delivery workers once per process"
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(
+                target=self._run, name=f"notification-worker-{index}", daemon=True
+            )
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        if not self._exit_hook_registered:
+            atexit.register(self.stop)
+            self._exit_hook_registered = True
+
+    def stop(self) -> None:
+        "Stop the workers after their current batch; unsent rows stay queued"
+        self._stop_event.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.poll_interval + 15)
+        self._threads = []
+
+
+notification_outbox = NotificationOutbox(
+    workers=config.notification_workers,
+    batch_size=config.notification_batch_size,
+    poll_interval=config.notification_poll_interval,
+    max_attempts=config.notification_max_attempts,
+    backoff_base=config.notification_backoff_base,
+    backoff_max=config.notification_backoff_max,
+    lease=config.notification_lease,
+    retention_days=config.notification_retention_days,
+    provider=config.notification_provider,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_enqueue(session: Session) -> None:
+    "Wake the workers as soon as a commit stored new notifications"
+    if session.info.pop(_ENQUEUED_FLAG, False):
+        notification_outbox.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_enqueue(session: Session) -> None:
+    "Rolled-back notifications were never stored, so there is nothing to wake for"
+    session.info.pop(_ENQUEUED_FLAG, None)
@@ -0,0 +1,228 @@
+"Bounded bcrypt worker pool so password hashing cannot pin every request thread"
+
+import collections
+import concurrent.futures
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+import bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+from . import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+_SAMPLE_SIZE = 512
+
+
+class PasswordServiceBusy(ServiceUnavailable):
+    """Raised when the hashing queue is full; rendered as 503 with Retry-After."""
+
+    description = "Password hashing is saturated, retry shortly."
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    "Return the bcrypt cost factor encoded in ``hashed``, or None if malformed"
+    parts = (hashed or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class _OperationStats:
+    def __init__(self):
+        self.count = 0
+        self.run_total = 0.0
+        self.run_max = 0.0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.samples: collections.deque = collections.deque(maxlen=_SAMPLE_SIZE)
+
+    def add(self, wait: float, run: float) -> None:
+        self.count += 1
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.samples.append(wait + run)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def _percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            index = min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)
+            return round(ordered[max(index, 0)] * 1000, 3)
+
+        return {
+            "count": self.count,
+            "run_avg_ms": round(self.run_total / self.count * 1000, 3)
+            if self.count
+            else 0.0,
+            "run_max_ms": round(self.run_max * 1000, 3),
+            "wait_avg_ms": round(self.wait_total / self.count * 1000, 3)
+            if self.count
+            else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "p50_ms": _percentile(0.5),
+            "p95_ms": _percentile(0.95),
+        }
+
+
+class PasswordHasher:
+    """Runs bcrypt on ``workers`` threads with at most ``queue_limit`` jobs waiting.
+
+    Request threads submit a job and wait for its result; bcrypt releases the
+    GIL, so the pool bounds CPU spent on hashing instead of letting a burst of
+    logins occupy every server thread. When the pool and its queue are full
+    the caller gets ``PasswordServiceBusy`` at once rather than queuing behind
+    seconds of work. New hashes use ``rounds``; ``needs_rehash`` reports hashes
+    made with a different cost so logins can upgrade them.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_limit: int = 16,
+        rounds: int = 12,
+        timeout: float = 10.0,
+    ):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.rounds = rounds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        "Zero every counter"
+        with self._lock:
+            self._stats = {"hash": _OperationStats(), "verify": _OperationStats()}
+            self._pending = getattr(self, "_pending", 0)
+            self._pending_peak = self._pending
+            self._rejected = 0
+            self._timeouts = 0
+            self._rehashes = 0
+
+    def _pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        # Created on first use so each forked server worker gets its own threads.
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bcrypt"
+            )
+        return self._executor
+
+    def _retry_after(self) -> int:
+        stats = self._stats["hash"], self._stats["verify"]
+        count = sum(s.count for s in stats)
+        average = sum(s.run_total for s in stats) / count if count else 0.25
+        return max(1, math.ceil(self._pending / self.workers * average))
+
+    def _run(self, operation: str, function: Callable[..., T], *args) -> T:
+        submitted = time.perf_counter()
+
+        def _job():
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self._stats[operation].add(started - submitted, finished - started)
+
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise PasswordServiceBusy(retry_after=self._retry_after())
+            self._pending += 1
+            self._pending_peak = max(self._pending_peak, self._pending)
+            try:
+                future = self._pool().submit(_job)
+            except RuntimeError:
+                self._pending -= 1
+                raise
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError as error:
+            with self._lock:
+                self._timeouts += 1
+                retry_after = self._retry_after()
+            raise PasswordServiceBusy(retry_after=retry_after) from error
+
+    def hash(self, password: str) -> str:
+        "Hash ``password`` with the configured cost"
+        return self._run(
+            "hash",
+            lambda: bcrypt.hashpw(
+                password.encode("utf-8"), bcrypt.gensalt(rounds=self.rounds)
+            ).decode("utf-8"),
+        )
+
+    def verify(self, password: str, hashed: str) -> bool:
+        "Check ``password`` against ``hashed``; malformed hashes never match"
+        if not hashed:
+            return False
+
+        def _check() -> bool:
+            try:
+                return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+            except ValueError:
+                logger.warning("Rejecting a malformed password hash")
+                return False
+
+        return self._run("verify", _check)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        "Whether ``hashed`` was made with a cost other than the configured one"
+        return hash_cost(hashed) != self.rounds
+
+    def rehash_if_needed(self, password: str, hashed: str) -> Optional[str]:
+        """Return a new hash at the current cost after a successful login, or None.
+
+        Upgrading is best effort: when the pool is saturated the old hash stays
+        and the next login tries again.
+        """
+        if not self.needs_rehash(hashed):
+            return None
+        try:
+            new_hash = self.hash(password)
+        except PasswordServiceBusy:
+            return None
+        with self._lock:
+            self._rehashes += 1
+        return new_hash
+
+    def snapshot(self) -> dict:
+        "Return pool settings, queue depth, rejections and latency per operation"
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "rounds": self.rounds,
+                "pending": self._pending,
+                "pending_peak": self._pending_peak,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "rehashes": self._rehashes,
+                **{name: stats.snapshot() for name, stats in self._stats.items()},
+            }
+
+    def shutdown(self) -> None:
+        "Stop the worker threads after the queued jobs finish"
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    workers=config.password_hash_workers,
+    queue_limit=config.password_hash_queue_limit,
+    rounds=config.bcrypt_rounds,
+    timeout=config.password_hash_timeout,
+)
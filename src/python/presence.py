@@ -0,0 +1,301 @@
+"Who is online right now, from Socket.IO connections and HTTP heartbeats"
+
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import NamedTuple, Optional
+from . import config
+from .broker import BrokerClient
+
+logger = logging.getLogger(__name__)
+
+CLIENT = "client"
+ADMIN = "admin"
+
+
+class _Lease(NamedTuple):
+    kind: str
+    identity: str
+    rooms: frozenset
+    expires_at: float
+
+
+class PresenceRegistry:
+    """Keeps presence leases in memory and shares them between processes.
+
+    Every open socket and every recently active browser session holds a
+    lease that expires after ``ttl`` seconds unless renewed: sockets are
+    renewed by their own process, HTTP sessions by their requests and
+    heartbeats. Per-identity and per-room reference counts are updated with
+    each lease, so the online counts and room occupancy are dictionary
+    lookups. With a ``tcp://`` broker URL every change is published on the
+    ``presence`` channel and applied by the other processes; without one the
+    registry only sees its own process. Changes are handed to a publisher
+    thread, which sends the latest state of each lease, so requests never
+    wait on the broker.
+    """
+
+    def __init__(self, ttl: float = 90.0, broker_url: Optional[str] = None):
+        self.ttl = ttl
+        self.broker_url = broker_url
+        self.origin = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._leases: dict[str, _Lease] = {}
+        self._identities: dict[str, dict[str, int]] = {CLIENT: {}, ADMIN: {}}
+        self._rooms: dict[str, dict[str, int]] = {}
+        self._sockets: set[str] = set()
+        self._client: Optional[BrokerClient] = None
+        self._outgoing: dict[str, Optional[_Lease]] = {}
+        self._outgoing_ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._exit_hook_registered = False
+
+    @staticmethod
+    def _increment(counts: dict[str, int], key: str, step: int) -> None:
+        value = counts.get(key, 0) + step
+        if value > 0:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+
+    def _count(self, lease: _Lease, step: int) -> None:
+        self._increment(self._identities[lease.kind], lease.identity, step)
+        member = f"{lease.kind}:{lease.identity}"
+        for room in lease.rooms:
+            occupants = self._rooms.setdefault(room, {})
+            self._increment(occupants, member, step)
+            if not occupants:
+                del self._rooms[room]
+
+    def _put(self, key: str, lease: _Lease) -> None:
+        with self._lock:
+            previous = self._leases.get(key)
+            if previous is not None:
+                self._count(previous, -1)
+            self._leases[key] = lease
+            self._count(lease, 1)
+
+    def _drop(self, key: str) -> Optional[_Lease]:
+        with self._lock:
+            lease = self._leases.pop(key, None)
+            if lease is not None:
+                self._count(lease, -1)
+            return lease
+
+    def _publish(self, key: str, lease: Optional[_Lease]) -> None:
+        if self._client is None:
+            return
+        with self._lock:
+            self._outgoing[key] = lease
+        self._outgoing_ready.set()
+
+    def _send(self, key: str, lease: Optional[_Lease]) -> None:
+        data = {"origin": self.origin, "key": key}
+        if lease is not None:
+            data.update(
+                kind=lease.kind,
+                identity=lease.identity,
+                rooms=sorted(lease.rooms),
+                expires_at=lease.expires_at,
+            )
+        try:
+            self._client.publish(data)
+        except OSError as error:
+            logger.warning("Presence update not shared: %s", error)
+
+    def _apply(self, data) -> None:
+        if not isinstance(data, dict) or data.get("origin") == self.origin:
+            return
+        key = data.get("key")
+        if not key:
+            return
+        if data.get("kind") in (CLIENT, ADMIN):
+            self._put(
+                key,
+                _Lease(
+                    data["kind"],
+                    str(data.get("identity")),
+                    frozenset(data.get("rooms") or ()),
+                    float(data.get("expires_at") or 0),
+                ),
+            )
+        else:
+            self._drop(key)
+
+    def _set(self, key: str, lease: _Lease) -> None:
+        self._put(key, lease)
+        self._publish(key, lease)
+
+    def connect(self, sid: str, kind: str, identity) -> None:
+        "Register a newly connected socket of a client or an admin"
+        key = f"{self.origin}:{sid}"
+        with self._lock:
+            self._sockets.add(key)
+        self._set(
+            key, _Lease(kind, str(identity), frozenset(), time.time() + self.ttl)
+        )
+
+    def join(self, sid: str, room: str) -> None:
+        "Record that a connected socket joined a chat room"
+        key = f"{self.origin}:{sid}"
+        with self._lock:
+            lease = self._leases.get(key)
+        if lease is not None:
+            self._set(key, lease._replace(rooms=lease.rooms | {str(room)}))
+
+    def disconnect(self, sid: str) -> None:
+        "Forget a socket that closed"
+        key = f"{self.origin}:{sid}"
+        with self._lock:
+            self._sockets.discard(key)
+        if self._drop(key) is not None:
+            self._publish(key, None)
+
+    def heartbeat(self, session_key: str, kind: str, identity) -> None:
+        """Renew the lease of a browser session after a request or heartbeat.
+
+        A lease with more than two thirds of its time left is not renewed, so
+        a busy session costs at most three broker messages per ``ttl``.
+        """
+        key = f"http:{session_key}"
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(key)
+        if (
+            lease is not None
+            and lease.identity == str(identity)
+            and lease.expires_at - now > self.ttl * 2 / 3
+        ):
+            return
+        self._set(key, _Lease(kind, str(identity), frozenset(), now + self.ttl))
+
+    def online_client_count(self) -> int:
+        "Number of distinct clients with a live lease"
+        return len(self._identities[CLIENT])
+
+    def online_admin_count(self) -> int:
+        "Number of admin sessions with a live lease"
+        return len(self._identities[ADMIN])
+
+    def is_online(self, client_id) -> bool:
+        "Whether the client has a live lease"
+        return str(client_id) in self._identities[CLIENT]
+
+    def is_in_chat(self, client_id) -> bool:
+        "Whether the client has a socket in their own chat room"
+        return f"{CLIENT}:{client_id}" in self._rooms.get(str(client_id), ())
+
+    def room_occupancy(self, room) -> int:
+        "Number of distinct clients and admins with a socket in ``room``"
+        return len(self._rooms.get(str(room), ()))
+
+    def room_members(self, room) -> dict[str, list[str]]:
+        "Client ids and admin sessions with a socket in ``room``"
+        with self._lock:
+            members = list(self._rooms.get(str(room), ()))
+        grouped: dict[str, list[str]] = {CLIENT: [], ADMIN: []}
+        for member in members:
+            kind, _, identity = member.partition(":")
+            grouped[kind].append(identity)
+        return grouped
+
+    def snapshot(self) -> dict:
+        "Return the online counts and the occupancy of every room"
+        with self._lock:
+            return {
+                "online_clients": len(self._identities[CLIENT]),
+                "online_admins": len(self._identities[ADMIN]),
+                "client_ids": sorted(
+                    int(identity)
+                    for identity in self._identities[CLIENT]
+                    if identity.isdigit()
+                ),
+                "rooms": {room: len(members) for room, members in self._rooms.items()},
+                "leases": len(self._leases),
+            }
+
+    def _maintain(self) -> None:
+        interval = max(1.0, self.ttl / 3)
+        while not self._stop_event.wait(interval):
+            now = time.time()
+            with self._lock:
+                expired = [
+                    key
+                    for key, lease in self._leases.items()
+                    if lease.expires_at <= now
+                ]
+                local = [
+                    (key, self._leases[key])
+                    for key in self._sockets
+                    if key in self._leases
+                ]
+            for key in expired:
+                self._drop(key)
+            for key, lease in local:
+                self._set(key, lease._replace(expires_at=now + self.ttl))
+
+    def _flush_outgoing(self) -> None:
+        with self._lock:
+            outgoing, self._outgoing = self._outgoing, {}
+        for key, lease in outgoing.items():
+            self._send(key, lease)
+
+    def _publish_changes(self) -> None:
+        while not self._stop_event.is_set():
+            self._outgoing_ready.wait()
+            self._outgoing_ready.clear()
+            self._flush_outgoing()
+
+    def _listen(self) -> None:
+        for data in self._client.listen():
+            if self._stop_event.is_set():
+                return
+            self._apply(data)
+
+    def start(self) -> None:
+        "Start expiring leases and, with a tcp broker, sharing them"
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop_event.clear()
+        if self.broker_url and self.broker_url.startswith("tcp://"):
+            self._client = BrokerClient(self.broker_url, "presence")
+        targets = [("presence-expiry", self._maintain)]
+        if self._client is not None:
+            targets.append(("presence-listener", self._listen))
+            targets.append(("presence-publisher", self._publish_changes))
+        self._threads = [
+            threading.Thread(target=target, name=name, daemon=True)
+            for name, target in targets
+        ]
+        for thread in self._threads:
+            thread.start()
+        if not self._exit_hook_registered:
+            atexit.register(self.stop)
+            self._exit_hook_registered = True
+
+    def stop(self) -> None:
+        "Withdraw this process's sockets from the other processes and stop"
+        self._stop_event.set()
+        with self._lock:
+            local = list(self._sockets)
+            self._sockets.clear()
+        for key in local:
+            if self._drop(key) is not None:
+                self._publish(key, None)
+        self._outgoing_ready.set()
+        for thread in self._threads:
+            if thread.name in ("presence-expiry", "presence-publisher"):
+                thread.join(timeout=1)
+        if self._client is not None:
+            self._flush_outgoing()
+        self._threads = []
+
+
+presence_registry = PresenceRegistry(
+    ttl=config.presence_ttl_seconds, broker_url=config.socketio_message_queue
+)
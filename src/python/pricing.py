@@ -0,0 +1,145 @@
+"Team registration fee calculation shared by the client and admin panels"
+
+import dataclasses
+import functools
+from typing import Iterable, Optional
+from .settings import runtime_settings
+
+NO_ACTIVE_MEMBERS = "no_active_members"
+MISSING_LEAGUE = "missing_league"
+MISSING_EDUCATION_LEVEL = "missing_education_level"
+NO_UNPAID_MEMBERS = "no_unpaid_members"
+
+
+@dataclasses.dataclass(frozen=True)
+class FeeSchedule:
+    """Fee settings that drive every quote."""
+
+    fee_per_person: int = 0
+    fee_team: int = 0
+    league_two_discount: int = 0
+    new_member_fee_per_league: int = 0
+
+
+@dataclasses.dataclass(frozen=True)
+class TeamState:
+    """Everything about a team that affects what it has to pay."""
+
+    active_members: int
+    unpaid_members: int
+    has_league_one: bool
+    has_league_two: bool
+    has_education_level: bool
+    is_new_member_payment: bool
+    members_paid_for: Optional[int] = None
+
+    @classmethod
+    def from_team(
+        cls,
+        team,
+        active_members: int,
+        is_new_member_payment: bool,
+        members_paid_for: Optional[int] = None,
+    ) -> "TeamState":
+        "Build the pricing state of a ``models.Team`` row"
+        return cls(
+            active_members=active_members or 0,
+            unpaid_members=team.unpaid_members_count or 0,
+            has_league_one=bool(team.league_one_id),
+            has_league_two=team.league_two_id is not None,
+            has_education_level=bool(team.education_level),
+            is_new_member_payment=bool(is_new_member_payment),
+            members_paid_for=members_paid_for or None,
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class Quote:
+    """Priced result for one team; ``issue`` names the first blocking problem."""
+
+    total: int
+    members_count: int
+    per_member_fee: int
+    selected_leagues_count: int
+    league_one_cost: int
+    league_two_cost: int
+    discount_amount: int
+    is_new_member_payment: bool
+    issue: Optional[str] = None
+
+
+def current_fee_schedule() -> FeeSchedule:
+    "Return the fee schedule from the live payment settings"
+    payment_config = runtime_settings.payment_config()
+    return FeeSchedule(
+        fee_per_person=payment_config.get("fee_per_person") or 0,
+        fee_team=payment_config.get("fee_team") or 0,
+        league_two_discount=payment_config.get("league_two_discount") or 0,
+        new_member_fee_per_league=(
+            payment_config.get("new_member_fee_per_league") or 0
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _price(state: TeamState, fees: FeeSchedule) -> Quote:
+    selected_leagues_count = 1 + (1 if state.has_league_two else 0)
+
+    issue = None
+    if state.active_members <= 0:
+        issue = NO_ACTIVE_MEMBERS
+    elif not state.has_league_one:
+        issue = MISSING_LEAGUE
+    elif not state.has_education_level:
+        issue = MISSING_EDUCATION_LEVEL
+
+    if state.is_new_member_payment:
+        members_count = max(0, state.members_paid_for or state.unpaid_members)
+        if issue is None and members_count <= 0:
+            issue = NO_UNPAID_MEMBERS
+        per_member_fee = fees.new_member_fee_per_league * selected_leagues_count
+        return Quote(
+            total=int(members_count * per_member_fee),
+            members_count=members_count,
+            per_member_fee=int(per_member_fee),
+            selected_leagues_count=selected_leagues_count,
+            league_one_cost=0,
+            league_two_cost=0,
+            discount_amount=0,
+            is_new_member_payment=True,
+            issue=issue,
+        )
+
+    members_count = max(0, state.members_paid_for or state.active_members)
+    base_league_cost = fees.fee_team + members_count * fees.fee_per_person
+    league_two_cost = 0
+    discount_amount = 0
+    if state.has_league_two:
+        league_two_cost = int(
+            round(base_league_cost * (1 - fees.league_two_discount / 100))
+        )
+        discount_amount = max(0, base_league_cost - league_two_cost)
+    return Quote(
+        total=int(base_league_cost + max(league_two_cost, 0)),
+        members_count=members_count,
+        per_member_fee=int(fees.fee_per_person),
+        selected_leagues_count=selected_leagues_count,
+        league_one_cost=int(base_league_cost),
+        league_two_cost=int(league_two_cost),
+        discount_amount=int(discount_amount),
+        is_new_member_payment=False,
+        issue=issue,
+    )
+
+
+def quote(state: TeamState, fees: Optional[FeeSchedule] = None) -> Quote:
+    "Price a single team; identical states share a cached result"
+    return _price(state, fees or current_fee_schedule())
+
+
+def quote_many(
+    states: Iterable[TeamState], fees: Optional[FeeSchedule] = None
+) -> list[Quote]:
+    "Price many teams against one fee schedule, in input order"
+    fees = fees or current_fee_schedule()
+    return [_price(state, fees) for state in states]
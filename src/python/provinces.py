@@ -0,0 +1,781 @@
+"Province and city names used by the member forms and geography seeding"
+
+provinces_data = {
+    "آذربایجان شرقی": [
+        "آبش‌احمد",
+        "آذرشهر",
+        "آقکند",
+        "اسکو",
+        "اهر",
+        "ایلخچی",
+        "باسمنج",
+        "بخشایش",
+        "بستان‌آباد",
+        "بناب",
+        "ترک",
+        "ترکمانچای",
+        "تسوج",
+        "تیکمه‌داش",
+        "جلفا",
+        "خاروانا",
+        "خامنه",
+        "خمارلو",
+        "خواجه",
+        "دوزدوزان",
+        "زرنق",
+        "زنوز",
+        "سراب",
+        "سردرود",
+        "سیس",
+        "شبستر",
+        "شربیان",
+        "شرفخانه",
+        "شندآباد",
+        "صوفیان",
+        "عجب‌شیر",
+        "قره‌آغاج",
+        "کشکسرای",
+        "کلوانق",
+        "کلیبر",
+        "کندوان",
+        "گوگان",
+        "لیلان",
+        "مراغه",
+        "مرند",
+        "ملکان",
+        "ممقان",
+        "میانه",
+        "نظرکهریزی",
+        "هادی‌شهر",
+        "هریس",
+        "هوراند",
+        "ورزقان",
+        "یامچی",
+        "تبریز",
+    ],
+    "آذربایجان غربی": [
+        "ارومیه",
+        "اشنویه",
+        "ایواوغلی",
+        "باروق",
+        "بازرگان",
+        "بوکان",
+        "پلدشت",
+        "پیرانشهر",
+        "تکاب",
+        "چهاربرج",
+        "خوی",
+        "دیزج‌دیز",
+        "ربط",
+        "زرآباد",
+        "سرو",
+        "سلماس",
+        "سیه‌چشمه",
+        "سیمینه",
+        "شاهین‌دژ",
+        "شوط",
+        "فیرورق",
+        "قره‌ضیاءالدین",
+        "قوشچی",
+        "کشاورز",
+        "ماکو",
+        "محمدیار",
+        "محمودآباد",
+        "مرگنلر",
+        "مهاباد",
+        "میاندوآب",
+        "نالوس",
+        "نقده",
+    ],
+    "اردبیل": [
+        "اردبیل",
+        "اصلاندوز",
+        "بیله‌سوار",
+        "پارس‌آباد",
+        "تازه‌کندانگوت",
+        "جعفرآباد",
+        "خلخال",
+        "سرعین",
+        "فخرآباد",
+        "کلور",
+        "کوراییم",
+        "گرمی",
+        "گیوی",
+        "لاهرود",
+        "مرادلو",
+        "مشگین‌شهر",
+        "نمین",
+        "نیر",
+        "هشتجین",
+    ],
+    "اصفهان": [
+        "اصفهان",
+        "آران و بیدگل",
+        "ابریشم",
+        "ابوزیدآباد",
+        "اردستان",
+        "اژیه",
+        "بادرود",
+        "برزک",
+        "بهاران‌شهر",
+        "بوئین و میاندشت",
+        "تودشک",
+        "تیران",
+        "جندق",
+        "جوزدان",
+        "چادگان",
+        "چرمهین",
+        "حبیب‌آباد",
+        "حسن‌آباد",
+        "خالدآباد",
+        "خمینی‌شهر",
+        "خوانسار",
+        "خور",
+        "داران",
+        "دهق",
+        "دهاقان",
+        "درچه",
+        "رزوه",
+        "رضوان‌شهر",
+        "زازران",
+        "زرین‌شهر",
+        "زیار",
+        "سده لنجان",
+        "سمیرم",
+        "شاهین‌شهر",
+        "شهرضا",
+        "طالخونچه",
+        "عسگران",
+        "علویجه",
+        "فرخی",
+        "فریدون‌شهر",
+        "فلاورجان",
+        "فولادشهر",
+        "قهدریجان",
+        "کاشان",
+        "کامو و چوگان",
+        "کمشچه",
+        "کهریزسنگ",
+        "گلپایگان",
+        "گلدشت",
+        "گلشهر",
+        "گوگد",
+        "محمدآباد",
+        "مهاباد",
+        "میمه",
+        "نائین",
+        "نجف‌آباد",
+        "نصرآباد",
+        "نطنز",
+        "نیاسر",
+        "نیک‌آباد",
+        "هرند",
+    ],
+    "البرز": [
+        "کرج",
+        "اشتهارد",
+        "تنکمان",
+        "چهارباغ",
+        "هشتگرد",
+        "طالقان",
+        "فردیس",
+        "کمال‌شهر",
+        "گرمدره",
+        "گلسار",
+        "ماهدشت",
+        "محمدشهر",
+        "مشکین‌دشت",
+        "نظرآباد",
+    ],
+    "ایلام": [
+        "ایلام",
+        "آبدانان",
+        "آسمان‌آباد",
+        "ارکواز",
+        "ایوان",
+        "بدره",
+        "پهله",
+        "توحید",
+        "چوار",
+        "دره‌شهر",
+        "دهلران",
+        "زرنه",
+        "سرابله",
+        "لومار",
+        "ماژین",
+        "مورموری",
+        "مهران",
+    ],
+    "بوشهر": [
+        "بوشهر",
+        "آب‌پخش",
+        "اهرم",
+        "انارستان",
+        "بادوله",
+        "بردخون",
+        "بردستان",
+        "برازجان",
+        "بندردیر",
+        "بندردیلم",
+        "بندرریگ",
+        "بندرکنگان",
+        "بندرگناوه",
+        "تنگ ارم",
+        "جم",
+        "چغادک",
+        "خارک",
+        "خورموج",
+        "دالکی",
+        "دلوار",
+        "ریز",
+        "سعدآباد",
+        "شنبه",
+        "عسلویه",
+        "کاکی",
+        "کلمه",
+        "نخل‌تقی",
+        "وحدتیه",
+    ],
+    "تهران": [
+        "آبسرد",
+        "آبعلی",
+        "احمدآباد مستوفی",
+        "اسلام‌شهر",
+        "اندیشه",
+        "باغستان",
+        "باقرشهر",
+        "بومهن",
+        "پاکدشت",
+        "پردیس",
+        "پیشوا",
+        "تجریش",
+        "تهران",
+        "جوادآباد",
+        "چهاردانگه",
+        "حسن‌آباد",
+        "دماوند",
+        "رباط‌کریم",
+        "رودهن",
+        "ری",
+        "شاهدشهر",
+        "شریف‌آباد",
+        "شمشک",
+        "شهرقدس",
+        "شهرری",
+        "شهریار",
+        "صالح‌آباد",
+        "صباشهر",
+        "صفادشت",
+        "فردوسیه",
+        "فشم",
+        "فیروزکوه",
+        "قدس",
+        "قرچک",
+        "کهریزک",
+        "گلستان",
+        "لواسان",
+        "ملارد",
+        "نسیم‌شهر",
+        "نصیرآباد",
+        "ورامین",
+    ],
+    "چهارمحال و بختیاری": [
+        "اردل",
+        "آلونی",
+        "باباحیدر",
+        "بروجن",
+        "بلداجی",
+        "بن",
+        "جونقان",
+        "دستنا",
+        "سرخون",
+        "سردشت",
+        "سودجان",
+        "شلمزار",
+        "شهرکرد",
+        "فارسان",
+        "فرادبنه",
+        "فرخ‌شهر",
+        "کاج",
+        "کیان",
+        "گندمان",
+        "گهرو",
+        "مال‌خلیفه",
+        "ناغان",
+        "نافچ",
+        "نقنه",
+        "وردنجان",
+        "هفشجان",
+    ],
+    "خراسان جنوبی": [
+        "آیسک",
+        "ارسک",
+        "اسدیه",
+        "اسفدن",
+        "بشرویه",
+        "بیرجند",
+        "خضری‌دشت‌بیاض",
+        "خوسف",
+        "زهان",
+        "سرایان",
+        "سربیشه",
+        "سه‌قلعه",
+        "طبس",
+        "فردوس",
+        "قاین",
+        "محمدشهر",
+        "مود",
+        "نهبندان",
+    ],
+    "خراسان رضوی": [
+        "مشهد",
+        "نیشابور",
+        "سبزوار",
+        "تربت حیدریه",
+        "کاشمر",
+        "قوچان",
+        "تربت جام",
+        "تایباد",
+        "چناران",
+        "سرخس",
+        "فریمان",
+        "بردسکن",
+        "گناباد",
+        "درگز",
+        "خواف",
+        "رشتخوار",
+        "فیض‌آباد",
+        "سلامی",
+        "شاندیز",
+        "طرقبه",
+        "کلات",
+        "سنگان",
+    ],
+    "خراسان شمالی": [
+        "بجنورد",
+        "شیروان",
+        "اسفراین",
+        "جاجرم",
+        "فاروج",
+        "گرمه",
+        "آشخانه",
+        "راز",
+        "سنخواست",
+        "شوقان",
+        "لوجلی",
+        "پیش قلعه",
+        "حصارگرمخان",
+        "درق",
+        "ساروج",
+        "قاضی",
+    ],
+    "خوزستان": [
+        "اهواز",
+        "آبادان",
+        "آغاجاری",
+        "اندیکا",
+        "اندیمشک",
+        "ایذه",
+        "باغ‌ملک",
+        "بهبهان",
+        "ماهشهر",
+        "رامشیر",
+        "رامهرمز",
+        "خرمشهر",
+        "دزفول",
+        "شادگان",
+        "شادمان",
+        "شوش",
+        "شوشتر",
+        "کارون",
+        "مسجدسلیمان",
+        "هویزه",
+        "هفتگل",
+        "لالی",
+    ],
+    "زنجان": [
+        "زنجان",
+        "ابهر",
+        "خرمدره",
+        "قیدار",
+        "هیدج",
+        "صائین‌قلعه",
+        "آب‌بر",
+        "سلطانیه",
+        "ماهنشان",
+        "زرین‌رود",
+        "چورزق",
+        "دندی",
+        "سجاس",
+        "کرسف",
+        "نیک‌پی",
+        "حلب",
+        "ارمغانخانه",
+    ],
+    "سمنان": [
+        "سمنان",
+        "شاهرود",
+        "دامغان",
+        "گرمسار",
+        "مهدی‌شهر",
+        "ایوانکی",
+        "شهمیرزاد",
+        "آرادان",
+        "بیارجمند",
+        "دیباج",
+        "رودیان",
+        "سرخه",
+        "کلاته",
+        "کهن‌آباد",
+        "مجن",
+        "مهمانسرا",
+    ],
+    "سیستان و بلوچستان": [
+        "زاهدان",
+        "زابل",
+        "ایرانشهر",
+        "چابهار",
+        "سراوان",
+        "خاش",
+        "کنارک",
+        "جالق",
+        "سرباز",
+        "نیک‌شهر",
+        "میرجاوه",
+        "بمپور",
+        "پیشین",
+        "راسک",
+        "سوران",
+        "فنوج",
+        "قصرقند",
+        "محمدان",
+        "هیدوج",
+    ],
+    "فارس": [
+        "شیراز",
+        "کازرون",
+        "جهرم",
+        "مرودشت",
+        "فسا",
+        "داراب",
+        "لار",
+        "آباده",
+        "نورآباد",
+        "اقلید",
+        "استهبان",
+        "بوانات",
+        "خرامه",
+        "خنج",
+        "سپیدان",
+        "فراشبند",
+        "قیر و کارزین",
+        "کوار",
+        "گراش",
+        "ممسنی",
+        "نی‌ریز",
+        "ارژن",
+        "ایج",
+        "بابانار",
+        "حاجی‌آباد",
+        "زرقان",
+        "سروستان",
+        "شهرصدرا",
+        "صفاشهر",
+        "کره‌ای",
+        "مهر",
+    ],
+    "قزوین": [
+        "قزوین",
+        "تاکستان",
+        "الوند",
+        "آبیک",
+        "اقبالیه",
+        "محمودآباد نمونه",
+        "محمدیه",
+        "بویین‌زهرا",
+        "اسفرورین",
+        "ارداق",
+        "شال",
+        "ضیاءآباد",
+        "خرمدشت",
+        "سگزآباد",
+        "نرجه",
+        "کوهین",
+    ],
+    "قم": [
+        "قم",
+        "جعفریه",
+        "کهک",
+        "قنوات",
+        "سلفچگان",
+        "دستجرد",
+        "سعدآباد",
+        "نوفل‌لوشاتو",
+        "قاهان",
+        "کرجندان",
+    ],
+    "کردستان": [
+        "سنندج",
+        "سقز",
+        "مریوان",
+        "بانه",
+        "کامیاران",
+        "قروه",
+        "دیواندره",
+        "بیجار",
+        "دهگلان",
+        "سروآباد",
+        "یاسوکند",
+        "بلبان‌آباد",
+        "موچش",
+        "آرمرده",
+        "دلبران",
+        "سریش‌آباد",
+        "زرینه",
+    ],
+    "کرمان": [
+        "کرمان",
+        "سیرجان",
+        "رفسنجان",
+        "جیرفت",
+        "بم",
+        "زرند",
+        "کهنوج",
+        "شهر بابک",
+        "انار",
+        "بافت",
+        "بردسیر",
+        "رابر",
+        "راور",
+        "ریگان",
+        "منوجان",
+        "نرماشیر",
+        "فهرج",
+        "قلعه‌گنج",
+        "کوهبنان",
+        "گلباف",
+        "ماهان",
+        "پاریز",
+        "چترود",
+        "خانوک",
+        "درب بهشت",
+        "زیدآباد",
+        "نگار",
+    ],
+    "کرمانشاه": [
+        "کرمانشاه",
+        "اسلام‌آباد غرب",
+        "هرسین",
+        "کنگاور",
+        "جوانرود",
+        "سنقر",
+        "پاوه",
+        "صحنه",
+        "روانسر",
+        "ثلاث باباجانی",
+        "دالاهو",
+        "سرپل ذهاب",
+        "قصر شیرین",
+        "گیلانغرب",
+        "نودشه",
+        "نوسود",
+        "ازگله",
+        "باینگان",
+        "تازه‌آباد",
+    ],
+    "کهگیلویه و بویراحمد": [
+        "یاسوج",
+        "دوگنبدان",
+        "دهدشت",
+        "لیکک",
+        "چرام",
+        "لنده",
+        "باشت",
+        "پاتاوه",
+        "چیتاب",
+        "سوق",
+        "گراب سفلی",
+        "مادوان",
+        "مارگون",
+    ],
+    "گلستان": [
+        "گرگان",
+        "گنبد کاووس",
+        "علی‌آباد کتول",
+        "ترکمن",
+        "آق‌قلا",
+        "کردکوی",
+        "بندر گز",
+        "مینودشت",
+        "آزادشهر",
+        "رامیان",
+        "کلاله",
+        "گالیکش",
+        "مراوه‌تپه",
+        "نوکنده",
+    ],
+    "گیلان": [
+        "رشت",
+        "انزلی",
+        "لاهیجان",
+        "لنگرود",
+        "آستارا",
+        "صومعه‌سرا",
+        "رودسر",
+        "فومن",
+        "ماسال",
+        "آستانه اشرفیه",
+        "رودبار",
+        "شفت",
+        "سیاهکل",
+        "اطاقور",
+        "اسالم",
+        "کیاشهر",
+        "پره سر",
+        "چابکسر",
+        "حویق",
+        "خشکبیجار",
+        "رضوانشهر",
+        "سنگر",
+        "شلمان",
+        "کومله",
+        "لشت نشا",
+        "لولمان",
+        "مرجقل",
+    ],
+    "لرستان": [
+        "خرم‌آباد",
+        "بروجرد",
+        "دورود",
+        "کوهدشت",
+        "الیگودرز",
+        "نورآباد",
+        "ازنا",
+        "الشتر",
+        "پلدختر",
+        "سپیددشت",
+        "معمولان",
+        "مومن‌آباد",
+        "ویسیان",
+        "چغلوندی",
+        "چقابل",
+        "زاغه",
+        "سراب دوره",
+        "فیروزآباد",
+        "کوهنانی",
+        "هفت‌چشمه",
+    ],
+    "مازندران": [
+        "ساری",
+        "بابل",
+        "آمل",
+        "قائم‌شهر",
+        "بهشهر",
+        "چالوس",
+        "نکا",
+        "بابلسر",
+        "نوشهر",
+        "رامسر",
+        "تنکابن",
+        "عباس‌آباد",
+        "فریدون‌کنار",
+        "کلاردشت",
+        "سوادکوه",
+        "محمودآباد",
+        "میاندورود",
+        "پل سفید",
+        "جویبار",
+        "نور",
+        "گلوگاه",
+    ],
+    "مرکزی": [
+        "اراک",
+        "ساوه",
+        "خمین",
+        "محلات",
+        "دلیجان",
+        "تفرش",
+        "آشتیان",
+        "شازند",
+        "زرندیه",
+        "فراهان",
+        "کمیجان",
+        "خنداب",
+        "مامونیه",
+        "نوبران",
+        "نیمور",
+        "هندودر",
+        "آوه",
+        "پرندک",
+        "جاورسیان",
+        "خسروبیک",
+        "داودآباد",
+        "سنجان",
+        "غرق‌آباد",
+        "کارچان",
+    ],
+    "هرمزگان": [
+        "بندرعباس",
+        "میناب",
+        "دهبارز",
+        "لنگه",
+        "قشم",
+        "کیش",
+        "حاجی‌آباد",
+        "بستک",
+        "جاسک",
+        "خمیر",
+        "رودان",
+        "سیریک",
+        "فین",
+        "گاوبندی",
+        "پارسیان",
+        "تخت",
+        "جناح",
+        "درگهان",
+        "سوزا",
+        "کوهستک",
+        "لمزان",
+        "هشتبندی",
+    ],
+    "همدان": [
+        "همدان",
+        "ملایر",
+        "نهاوند",
+        "تویسرکان",
+        "اسدآباد",
+        "کبودرآهنگ",
+        "بهار",
+        "رزن",
+        "فامنین",
+        "قروه درجزین",
+        "آجین",
+        "برزول",
+        "جورقان",
+        "دمق",
+        "شراء",
+        "صالح‌آباد",
+        "فرسفج",
+        "قلقلرود",
+        "گیان",
+    ],
+    "یزد": [
+        "یزد",
+        "میبد",
+        "اردکان",
+        "بافق",
+        "مهریز",
+        "ابرکوه",
+        "تفت",
+        "هرات",
+        "اشکذر",
+        "بهاباد",
+        "حمیدیا",
+        "زارچ",
+        "شاهدیه",
+        "عقدا",
+        "مروست",
+        "ندوشن",
+        "نیر",
+    ],
+}
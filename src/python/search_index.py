@@ -0,0 +1,295 @@
+"SQLite FTS5 index behind the admin search, kept in sync from ORM flushes"
+
+import logging
+import re
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+from persiantools.digits import ar_to_fa, fa_to_en
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, aliased
+from . import models
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+CLIENT = "client"
+TEAM = "team"
+MEMBER = "member"
+PAYMENT = "payment"
+
+# Each document's rowid is ``entity_id * _STRIDE + kind code`` so updates and
+# deletes address one row through the rowid instead of scanning the index.
+_KIND_CODES = {CLIENT: 1, TEAM: 2, MEMBER: 3, PAYMENT: 4}
+_CODE_KINDS = {code: kind for kind, code in _KIND_CODES.items()}
+_STRIDE = 8
+_REBUILD_CHUNK = 2000
+# bm25 costs one call per match, so very common words are ranked among their
+# newest matches only; selective queries rank every match.
+_RANK_CANDIDATES = 2000
+_SUGGEST_CANDIDATES = 200
+_MIN_SUGGEST_LENGTH = 2
+
+_MODEL_KINDS = {
+    models.Client: (CLIENT, "client_id", ("email", "phone_number")),
+    models.Team: (
+        TEAM,
+        "team_id",
+        ("team_name", "league_one_id", "league_two_id"),
+    ),
+    models.Member: (MEMBER, "member_id", ("name", "national_id", "phone_number")),
+    models.Payment: (
+        PAYMENT,
+        "payment_id",
+        ("team_id", "payer_name", "payer_phone", "tracking_number", "receipt_filename"),
+    ),
+}
+
+# Arabic Alef Maksura, tatweel and harakat do not change a Persian word.
+_SEARCH_TABLE = str.maketrans(
+    {"ى": "ی", "ـ": None, **{chr(c): None for c in range(0x064B, 0x0653)}}
+)
+
+CREATE_TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "name, keywords, tokenize = 'unicode61 remove_diacritics 2', "
+    "prefix = '2 3 4')"
+)
+
+_index_ready = False
+
+
+def normalize_search_text(value) -> str:
+    "Fold Persian/Arabic letters and digits, ZWNJ and case the same way everywhere"
+    if value is None:
+        return ""
+    folded = fa_to_en(ar_to_fa(str(value))).translate(_SEARCH_TABLE)
+    return utils.normalize_persian_text(folded).lower()
+
+
+def match_expression(query: str) -> Optional[str]:
+    "Turn free text into an FTS5 query where every word must match as a prefix"
+    tokens = re.findall(r"\w+", normalize_search_text(query))[:8]
+    return " ".join(f'"{token}"*' for token in tokens) or None
+
+
+def _document_rows(connection: Connection, kind: str, ids: Optional[list[int]]):
+    if kind == CLIENT:
+        table = models.Client
+        statement = select(table.client_id, table.email, table.phone_number)
+        key = table.client_id
+    elif kind == TEAM:
+        table = models.Team
+        league_one = aliased(models.League)
+        league_two = aliased(models.League)
+        statement = (
+            select(table.team_id, table.team_name, league_one.name, league_two.name)
+            .outerjoin(league_one, table.league_one_id == league_one.league_id)
+            .outerjoin(league_two, table.league_two_id == league_two.league_id)
+        )
+        key = table.team_id
+    elif kind == MEMBER:
+        table = models.Member
+        statement = select(
+            table.member_id, table.name, table.national_id, table.phone_number
+        )
+        key = table.member_id
+    else:
+        table = models.Payment
+        statement = select(
+            table.payment_id,
+            table.payer_name,
+            table.team_id,
+            table.payer_phone,
+            table.tracking_number,
+            table.receipt_filename,
+        )
+        key = table.payment_id
+    if ids is not None:
+        statement = statement.where(key.in_(ids))
+    for entity_id, name, *keywords in connection.execute(statement.order_by(key)):
+        keyword_values = [entity_id] if kind in (TEAM, PAYMENT) else []
+        yield (
+            entity_id * _STRIDE + _KIND_CODES[kind],
+            normalize_search_text(name),
+            normalize_search_text(
+                " ".join(str(value) for value in (*keyword_values, *keywords) if value)
+            ),
+        )
+
+
+def _insert(connection: Connection, rows: list[tuple[int, str, str]]) -> None:
+    if rows:
+        connection.execute(
+            text(
+                "INSERT INTO search_index (rowid, name, keywords) "
+                "VALUES (:rowid, :name, :keywords)"
+            ),
+            [{"rowid": r, "name": n, "keywords": k} for r, n, k in rows],
+        )
+
+
+def reindex(connection: Connection, kind: str, ids: Iterable[int]) -> None:
+    "Replace the documents of the given entities; missing entities are removed"
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    code = _KIND_CODES[kind]
+    connection.execute(
+        text("DELETE FROM search_index WHERE rowid = :rowid"),
+        [{"rowid": entity_id * _STRIDE + code} for entity_id in ids],
+    )
+    _insert(connection, list(_document_rows(connection, kind, ids)))
+
+
+def rebuild(connection: Connection) -> dict[str, int]:
+    "Drop every document and index all clients, teams, members and payments"
+    connection.execute(text(CREATE_TABLE_SQL))
+    connection.execute(text("DELETE FROM search_index"))
+    counts = {}
+    for kind in _KIND_CODES:
+        counts[kind] = 0
+        chunk = []
+        for row in _document_rows(connection, kind, None):
+            chunk.append(row)
+            if len(chunk) >= _REBUILD_CHUNK:
+                _insert(connection, chunk)
+                counts[kind] += len(chunk)
+                chunk = []
+        _insert(connection, chunk)
+        counts[kind] += len(chunk)
+    connection.execute(
+        text("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    )
+    return counts
+
+
+def search(db: Session, query: str, kind: str, limit: int = 500) -> list[int]:
+    "Return entity ids of one kind matching ``query``, best match first"
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    rows = db.execute(
+        text(
+            "SELECT rowid FROM ("
+            "SELECT rowid, bm25(search_index, 4.0, 1.0) AS score FROM search_index "
+            "WHERE search_index MATCH :expression AND rowid % :stride = :code "
+            "ORDER BY rowid DESC LIMIT :candidates"
+            ") ORDER BY score LIMIT :limit"
+        ),
+        {
+            "expression": expression,
+            "stride": _STRIDE,
+            "code": _KIND_CODES[kind],
+            "candidates": max(limit, _RANK_CANDIDATES),
+            "limit": limit,
+        },
+    )
+    return [rowid // _STRIDE for (rowid,) in rows]
+
+
+@contextmanager
+def _time_budget(db: Session, budget_ms: int):
+    # SQLite checks the handler every 1000 VM steps and aborts the statement
+    # with "interrupted" once it returns true.
+    raw = db.connection().connection.driver_connection
+    deadline = time.perf_counter() + budget_ms / 1000
+    raw.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+    try:
+        yield
+    finally:
+        raw.set_progress_handler(None, 0)
+
+
+def suggest(
+    db: Session, query: str, limit: int = 8, budget_ms: int = 50
+) -> Optional[list[tuple[str, int]]]:
+    """Return ``(kind, id)`` pairs of any kind for type-ahead, best first.
+
+    Only the newest matches are ranked, and the query is aborted after
+    ``budget_ms``; ``None`` means the budget ran out.
+    """
+    expression = match_expression(query)
+    if expression is None or len(normalize_search_text(query)) < _MIN_SUGGEST_LENGTH:
+        return []
+    try:
+        with _time_budget(db, budget_ms):
+            rows = db.execute(
+                text(
+                    "SELECT rowid FROM ("
+                    "SELECT rowid, bm25(search_index, 4.0, 1.0) AS score "
+                    "FROM search_index WHERE search_index MATCH :expression "
+                    "ORDER BY rowid DESC LIMIT :candidates"
+                    ") ORDER BY score LIMIT :limit"
+                ),
+                {
+                    "expression": expression,
+                    "candidates": max(limit, _SUGGEST_CANDIDATES),
+                    "limit": limit,
+                },
+            ).all()
+    except OperationalError as error:
+        if "interrupted" not in str(error.orig):
+            raise
+        logger.warning("Search suggestions for %r exceeded %s ms", query, budget_ms)
+        return None
+    return [(_CODE_KINDS[rowid % _STRIDE], rowid // _STRIDE) for (rowid,) in rows]
+
+
+def _ready(connection: Connection) -> bool:
+    # The table appears with a migration; flushes before it must not fail.
+    global _index_ready
+    if not _index_ready:
+        _index_ready = (
+            connection.execute(
+                text(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'search_index'"
+                )
+            ).first()
+            is not None
+        )
+    return _index_ready
+
+
+def _changed(instance, attributes: tuple[str, ...]) -> bool:
+    state = inspect(instance)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, _flush_context):
+    "Reindex searchable rows in the same transaction that changed them"
+    changes: dict[str, set[int]] = {}
+    leagues: set[int] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, models.League):
+            if instance not in session.new and _changed(instance, ("name",)):
+                leagues.add(instance.league_id)
+            continue
+        entry = _MODEL_KINDS.get(type(instance))
+        if entry is None:
+            continue
+        kind, key, attributes = entry
+        if instance in session.dirty and not _changed(instance, attributes):
+            continue
+        entity_id = getattr(instance, key, None)
+        if entity_id is not None:
+            changes.setdefault(kind, set()).add(entity_id)
+    if not changes and not leagues:
+        return
+    connection = session.connection()
+    if not _ready(connection):
+        return
+    if leagues:
+        team_ids = connection.execute(
+            select(models.Team.team_id).where(
+                models.Team.league_one_id.in_(leagues)
+                | models.Team.league_two_id.in_(leagues)
+            )
+        ).scalars()
+        changes.setdefault(TEAM, set()).update(team_ids)
+    for kind, ids in changes.items():
+        reindex(connection, kind, ids)
@@ -0,0 +1,129 @@
+"Production launchers that serve HTTP and Socket.IO traffic"
+
+import logging
+import signal
+from typing import Callable, Optional
+from flask import Flask
+from . import config
+from . import database
+
+logger = logging.getLogger(__name__)
+
+SERVER_MODES = ("gunicorn", "waitress")
+
+
+def gunicorn_options(
+    host: str,
+    port: int,
+    on_worker_boot: Callable[[], None],
+    on_worker_exit: Callable[[], None],
+) -> dict:
+    """Gunicorn settings for threaded workers that accept WebSocket upgrades.
+
+    Each ``gthread`` worker hands every connection to one of ``threads``
+    threads; ``simple-websocket`` takes over upgraded sockets, so an open chat
+    holds one thread rather than a stream of long-polling requests.
+    """
+    return {
+        "bind": f"{host}:{port}",
+        "worker_class": "gthread",
+        "workers": config.server_workers,
+        "threads": config.server_threads,
+        "worker_connections": config.server_connections,
+        "backlog": config.server_backlog,
+        "keepalive": config.server_keepalive,
+        "timeout": config.server_worker_timeout,
+        "graceful_timeout": config.server_graceful_timeout,
+        "post_fork": lambda _server, _worker: database.db_engine.dispose(close=False),
+        "post_worker_init": lambda _worker: on_worker_boot(),
+        "worker_exit": lambda _server, _worker: on_worker_exit(),
+    }
+
+
+def run_gunicorn(
+    app: Flask,
+    host: str,
+    port: int,
+    on_worker_boot: Callable[[], None],
+    on_worker_exit: Callable[[], None],
+) -> None:
+    "Serve ``app`` from gunicorn threaded workers until the master is stopped"
+    from gunicorn.app.base import BaseApplication
+
+    options = gunicorn_options(host, port, on_worker_boot, on_worker_exit)
+
+    class _Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    if config.server_workers > 1:
+        logger.warning(
+            "Running %s workers: Socket.IO long-polling needs sticky sessions.",
+            config.server_workers,
+        )
+        if not config.socketio_message_queue:
+            logger.warning(
+                "socketio_message_queue is not set; chat events will not reach "
+                "sockets held by other workers."
+            )
+    _Application().run()
+
+
+def run_waitress(
+    app: Flask,
+    host: str,
+    port: int,
+    on_worker_boot: Callable[[], None],
+    on_worker_exit: Callable[[], None],
+) -> None:
+    """Serve ``app`` with waitress; WebSocket upgrades are refused, so chat falls
+    back to long-polling."""
+    from waitress import serve
+
+    def _stop(_signum, _frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    on_worker_boot()
+    try:
+        serve(
+            app,
+            host=host,
+            port=port,
+            threads=config.server_threads,
+            backlog=config.server_backlog,
+            connection_limit=config.server_connections,
+            channel_timeout=config.server_keepalive,
+        )
+    finally:
+        on_worker_exit()
+
+
+def run(
+    app: Flask,
+    host: str,
+    port: int,
+    on_worker_boot: Callable[[], None],
+    on_worker_exit: Callable[[], None],
+    mode: Optional[str] = None,
+) -> None:
+    """Serve ``app`` with the configured production server.
+
+    ``on_worker_boot`` runs once in every serving process before it accepts
+    requests and ``on_worker_exit`` after it stops, including on SIGTERM.
+    """
+    mode = mode or config.server_mode
+    if mode not in SERVER_MODES:
+        raise ValueError(f"unknown server_mode {mode!r}; expected one of {SERVER_MODES}")
+    if mode == "gunicorn":
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            logger.warning("gunicorn is not installed; falling back to waitress.")
+            mode = "waitress"
+    runner = run_gunicorn if mode == "gunicorn" else run_waitress
+    runner(app, host, port, on_worker_boot, on_worker_exit)
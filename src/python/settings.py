@@ -0,0 +1,138 @@
+"Operational settings stored in the database and cached in every process"
+
+import datetime
+import json
+import logging
+import threading
+import time
+from typing import Any, Mapping, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from . import config
+from . import database
+from . import models
+from . import transactions
+
+logger = logging.getLogger(__name__)
+
+SETTINGS: dict[str, tuple[type, Any]] = {
+    "signup_disabled": (bool, False),
+    "payment_fee_per_person": (int, config.payment_config["fee_per_person"]),
+    "payment_fee_team": (int, config.payment_config["fee_team"]),
+    "payment_league_two_discount": (
+        int,
+        config.payment_config["league_two_discount"],
+    ),
+    "payment_new_member_fee_per_league": (
+        int,
+        config.payment_config["new_member_fee_per_league"],
+    ),
+    "payment_bank_name": (str, config.payment_config["bank_name"]),
+    "payment_owner_name": (str, config.payment_config["owner_name"]),
+    "payment_card_number": (str, config.payment_config["card_number"]),
+    "payment_iban": (str, config.payment_config["iban"]),
+}
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def coerce(key: str, raw_value: Any) -> Any:
+    "Convert a submitted value to the type of setting ``key``"
+    if key not in SETTINGS:
+        raise KeyError(key)
+    value_type, _default = SETTINGS[key]
+    if value_type is bool:
+        if isinstance(raw_value, bool):
+            return raw_value
+        return str(raw_value).strip().lower() in _TRUE_VALUES
+    if value_type is int:
+        value = int(str(raw_value).strip())
+        if value < 0:
+            raise ValueError(f"{key} must not be negative")
+        return value
+    text_value = str(raw_value or "").strip()
+    return text_value or None
+
+
+class RuntimeSettings:
+    """Reads every setting row at most once per ``ttl`` seconds per process.
+
+    Rows override the defaults from ``config``; missing rows fall back to
+    them. Writes from this process take effect immediately, writes from other
+    processes within ``ttl``.
+    """
+
+    def __init__(self, ttl: float = 5.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._values: Optional[dict[str, Any]] = None
+        self._loaded_at = 0.0
+
+    def _load(self) -> dict[str, Any]:
+        values = {key: default for key, (_type, default) in SETTINGS.items()}
+        with database.get_db_session() as db:
+            rows = db.execute(
+                select(models.RuntimeSetting.key, models.RuntimeSetting.value)
+            ).all()
+        for key, stored in rows:
+            if key not in SETTINGS:
+                continue
+            try:
+                values[key] = coerce(key, json.loads(stored))
+            except (TypeError, ValueError):
+                logger.warning("Ignoring invalid runtime setting %s=%r", key, stored)
+        return values
+
+    def values(self) -> dict[str, Any]:
+        "Return every setting, reloading from the database when the cache expired"
+        if self._values is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._values
+        with self._lock:
+            if self._values is None or time.monotonic() - self._loaded_at >= self.ttl:
+                try:
+                    self._values = self._load()
+                except SQLAlchemyError as error:
+                    logger.error("Error loading runtime settings: %s", error)
+                    if self._values is None:
+                        return {
+                            key: default for key, (_type, default) in SETTINGS.items()
+                        }
+                self._loaded_at = time.monotonic()
+            return self._values
+
+    def get(self, key: str) -> Any:
+        "Return the current value of setting ``key``"
+        return self.values()[key]
+
+    def invalidate(self) -> None:
+        "Force the next read to reload from the database"
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def update(self, changes: Mapping[str, Any]) -> dict[str, Any]:
+        """Validate and store ``changes``; raises ``KeyError``/``ValueError`` on bad input."""
+        coerced = {key: coerce(key, raw) for key, raw in changes.items()}
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        def _store(db):
+            for key, value in coerced.items():
+                db.merge(
+                    models.RuntimeSetting(
+                        key=key, value=json.dumps(value), updated_at=now
+                    )
+                )
+
+        transactions.run_write_transaction(_store)
+        self.invalidate()
+        return coerced
+
+    def payment_config(self) -> dict[str, Any]:
+        "Return the live payment settings keyed like ``config.payment_config``"
+        values = self.values()
+        return {
+            key[len("payment_") :]: value
+            for key, value in values.items()
+            if key.startswith("payment_")
+        }
+
+
+runtime_settings = RuntimeSettings(ttl=config.runtime_settings_ttl)
@@ -0,0 +1,322 @@
+"Retries for write transactions that hit SQLite lock contention"
+
+import contextlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Callable, Optional, TypeVar
+from flask import g, has_request_context, request, session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from . import config
+from . import database
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+_LOCK_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+_WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+_WRITER_SLOT = "holds_writer_queue"
+
+
+def is_lock_error(error: BaseException) -> bool:
+    "Whether ``error`` is SQLite refusing a write because another one holds the lock"
+    original = getattr(error, "orig", None) or error
+    if not isinstance(original, (OperationalError, sqlite3.OperationalError)):
+        return False
+    message = str(original).lower()
+    return any(text in message for text in _LOCK_MESSAGES)
+
+
+class WriteMetrics:
+    """Counts write attempts, lock retries and the time spent waiting on locks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        "Zero every counter"
+        with self._lock:
+            self.transactions = 0
+            self.lock_errors = 0
+            self.retries = 0
+            self.recovered = 0
+            self.exhausted = 0
+            self.not_replayed = 0
+            self.backoff_total = 0.0
+            self.queue_waiters = 0
+            self.queue_wait_total = 0.0
+            self.queue_wait_max = 0.0
+
+    def record(self, **increments) -> None:
+        "Add the given amounts to the named counters"
+        with self._lock:
+            for name, amount in increments.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def record_queue_wait(self, seconds: float) -> None:
+        "Record how long a writer waited for the in-process writer queue"
+        with self._lock:
+            self.queue_wait_total += seconds
+            self.queue_wait_max = max(self.queue_wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        "Return the counters with wait times in milliseconds"
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "lock_errors": self.lock_errors,
+                "retries": self.retries,
+                "recovered": self.recovered,
+                "exhausted": self.exhausted,
+                "not_replayed": self.not_replayed,
+                "backoff_ms": round(self.backoff_total * 1000, 3),
+                "queue_waiters": self.queue_waiters,
+                "queue_wait_ms": round(self.queue_wait_total * 1000, 3),
+                "queue_wait_max_ms": round(self.queue_wait_max * 1000, 3),
+            }
+
+
+write_metrics = WriteMetrics()
+_writer_queue = threading.RLock()
+
+
+@event.listens_for(database.db_engine, "handle_error")
+def _remember_lock_error(context):
+    "Flag the request when SQLite reports a lock, even if the view swallows it"
+    if is_lock_error(context.sqlalchemy_exception or context.original_exception):
+        write_metrics.record(lock_errors=1)
+        if has_request_context():
+            g.db_lock_errors = g.get("db_lock_errors", 0) + 1
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_commit(_session):
+    "Note that the current request has stored something"
+    if has_request_context():
+        g.db_commits = g.get("db_commits", 0) + 1
+
+
+def _enter_writer_queue(db: Session) -> None:
+    "Take the writer queue for ``db`` once it starts writing in a serialized view"
+    if db.info.get(_WRITER_SLOT) or not has_request_context():
+        return
+    if not g.get("db_serialize_writes"):
+        return
+    write_metrics.record(queue_waiters=1)
+    started = time.perf_counter()
+    _writer_queue.acquire()
+    write_metrics.record(queue_waiters=-1)
+    write_metrics.record_queue_wait(time.perf_counter() - started)
+    db.info[_WRITER_SLOT] = True
+    g.setdefault("db_writer_sessions", []).append(db)
+
+
+def _leave_writer_queue(db: Session) -> None:
+    if db.info.pop(_WRITER_SLOT, False):
+        _writer_queue.release()
+
+
+@event.listens_for(Session, "before_flush")
+def _queue_before_flush(db, _flush_context, _instances):
+    _enter_writer_queue(db)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _queue_before_statement(execute_state):
+    if execute_state.is_insert or execute_state.is_update or execute_state.is_delete:
+        _enter_writer_queue(execute_state.session)
+
+
+@event.listens_for(Session, "after_commit")
+def _release_after_commit(db):
+    _leave_writer_queue(db)
+
+
+@event.listens_for(Session, "after_rollback")
+def _release_after_rollback(db):
+    _leave_writer_queue(db)
+
+
+def _backoff_delay(attempt: int) -> float:
+    "Full-jitter exponential backoff in seconds for the given retry number"
+    ceiling = min(
+        config.db_write_backoff_max_ms,
+        config.db_write_backoff_base_ms * (2**attempt),
+    )
+    return random.uniform(0, ceiling) / 1000
+
+
+def _sleep_before_retry(attempt: int) -> None:
+    delay = _backoff_delay(attempt)
+    write_metrics.record(retries=1, backoff_total=delay)
+    time.sleep(delay)
+
+
+@contextlib.contextmanager
+def _writer_slot(serialize: bool):
+    "Hold the in-process writer queue when writes are serialized"
+    if not serialize:
+        yield
+        return
+    write_metrics.record(queue_waiters=1)
+    started = time.perf_counter()
+    with _writer_queue:
+        write_metrics.record(queue_waiters=-1)
+        write_metrics.record_queue_wait(time.perf_counter() - started)
+        yield
+
+
+def run_write_transaction(
+    work: Callable[[Session], T],
+    retries: Optional[int] = None,
+    serialize: Optional[bool] = None,
+) -> T:
+    """Run ``work(db)`` and commit, replaying it with backoff on lock errors.
+
+    ``work`` may be called more than once, so it must only touch the
+    database through ``db``. Errors other than lock contention propagate on
+    the first attempt; the last lock error propagates once retries run out.
+    """
+    retries = config.db_write_retries if retries is None else retries
+    serialize = config.db_serialize_writes if serialize is None else serialize
+    write_metrics.record(transactions=1)
+    # Lock errors retried here must not make retry_on_db_lock replay the view.
+    escaped_lock_errors = g.get("db_lock_errors", 0) if has_request_context() else 0
+    attempt = 0
+    while True:
+        try:
+            with _writer_slot(serialize), database.get_db_session() as db:
+                try:
+                    result = work(db)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            if attempt:
+                write_metrics.record(recovered=1)
+            if has_request_context():
+                g.db_lock_errors = escaped_lock_errors
+            return result
+        except OperationalError as error:
+            if not is_lock_error(error):
+                raise
+            if attempt >= retries:
+                write_metrics.record(exhausted=1)
+                raise
+            _sleep_before_retry(attempt)
+            attempt += 1
+
+
+def save_upload(file_storage, path: str) -> None:
+    """Save an uploaded file, removing it again if ``retry_on_db_lock`` replays.
+
+    Each attempt of a view stores its uploads under new names, so files saved
+    by an attempt whose transaction was rolled back would be left orphaned.
+    """
+    file_storage.save(path)
+    if has_request_context():
+        g.setdefault("db_attempt_files", []).append(path)
+
+
+def _remove_attempt_files() -> None:
+    for path in g.pop("db_attempt_files", []):
+        try:
+            os.remove(path)
+        except OSError as error:
+            logger.warning("Could not remove upload of a replayed request: %s", error)
+
+
+def _rewind_uploads() -> None:
+    for _name, upload in request.files.items(multi=True):
+        try:
+            upload.stream.seek(0)
+        except (AttributeError, OSError, ValueError):
+            continue
+
+
+def retry_on_db_lock(view: Callable) -> Callable:
+    """Re-run a mutating view with backoff when it ran into a locked database.
+
+    Views handle ``SQLAlchemyError`` themselves and flash a generic error, so
+    lock errors are detected through the engine's ``handle_error`` hook;
+    those already retried by ``run_write_transaction`` do not count. The
+    attempt's flashed messages are discarded, files it stored with
+    ``save_upload`` removed and uploads rewound before the view is replayed;
+    after the last retry its own response is returned. An attempt that has
+    already committed is never replayed, since that would store its writes
+    twice; decorated views should therefore commit once, at the end.
+
+    With ``db_serialize_writes`` the writer queue is taken when a session
+    first flushes or issues a write statement and released at its commit or
+    rollback, so reads and rendering run outside it.
+    """
+
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        retries = config.db_write_retries
+        serialize = config.db_serialize_writes and request.method in _WRITE_METHODS
+        flashes = list(session.get("_flashes", []))
+        write_metrics.record(transactions=1)
+        g.db_serialize_writes = serialize
+        try:
+            return _run_with_retries(view, args, kwargs, retries, flashes)
+        finally:
+            g.db_serialize_writes = False
+            for db in g.pop("db_writer_sessions", []):
+                _leave_writer_queue(db)
+
+    return decorated_function
+
+
+def _run_with_retries(view, args, kwargs, retries, flashes):
+    "Run ``view`` until it succeeds, commits or runs out of lock retries"
+    attempt = 0
+    while True:
+        g.db_lock_errors = 0
+        g.db_commits = 0
+        g.db_attempt_files = []
+        failure = None
+        response = None
+        try:
+            response = view(*args, **kwargs)
+        except OperationalError as error:
+            if not is_lock_error(error):
+                raise
+            failure = error
+        if not g.db_lock_errors and failure is None:
+            if attempt:
+                write_metrics.record(recovered=1)
+            return response
+        if g.db_commits:
+            write_metrics.record(not_replayed=1)
+            logger.warning(
+                "%s hit a database lock after committing; not replaying it",
+                request.endpoint,
+            )
+            if failure is not None:
+                raise failure
+            return response
+        if attempt >= retries:
+            write_metrics.record(exhausted=1)
+            if failure is not None:
+                _remove_attempt_files()
+                raise failure
+            return response
+        request_session = g.get("db_session")
+        if request_session is not None:
+            request_session.rollback()
+        _remove_attempt_files()
+        if flashes:
+            session["_flashes"] = list(flashes)
+        else:
+            session.pop("_flashes", None)
+        _rewind_uploads()
+        _sleep_before_retry(attempt)
+        attempt += 1
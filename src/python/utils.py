@@ -1,19 +1,17 @@
-"Utility functions for validation, file handling, SMS/email sending etc..."
+"Utility functions for validation, file handling etc..."
 
 import re
-import smtplib
-from email.mime.text import MIMEText
 import datetime
-from typing import Any, IO, Tuple, Optional
+from typing import Any, IO, Mapping, Tuple, Optional
 from sqlalchemy.orm import Session, subqueryload
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func, or_
 import jdatetime
 import filetype
-from flask import Flask, session, current_app
+from flask import session, current_app
 from persiantools.digits import fa_to_en
-import requests
 import bleach
+from . import config
 from . import models
 from . import constants
 from . import database
@@ -182,70 +180,6 @@ def get_form_context() -> dict:
     }
 
 
-def send_templated_sms_async(
-    app: Flask,
-    client_id: int,
-    template_id: int,
-    verification_code: str,
-    sms_config: dict,
-):
-    "Send a templated SMS asynchronously"
-    with app.app_context():
-        try:
-            rest_url = sms_config.get("rest_url")
-            if not isinstance(rest_url, str):
-                current_app.logger.error(
-                    "SMS configuration is missing or invalid for 'rest_url'."
-                )
-                return
-
-            with database.get_db_session() as db:
-                client = (
-                    db.query(models.Client)
-                    .filter(models.Client.client_id == client_id)
-                    .first()
-                )
-                if not client:
-                    current_app.logger.error(
-                        f"SMS error: Client with ID {client_id} not found."
-                    )
-                    return
-                recipient = client.phone_number
-
-            payload = {
-                "username": sms_config.get("username"),
-                "password": sms_config.get("password"),
-                "to": recipient,
-                "bodyId": template_id,
-                "text": verification_code,
-            }
-            response = requests.post(rest_url, data=payload, timeout=10)
-            response.raise_for_status()
-            api_response = response.json()
-
-            if api_response.get("RetStatus") == 1:
-                current_app.logger.info(
-                    f"SMS sent to {recipient}. "
-                    f"Response: {api_response.get('Value')}"
-                )
-            else:
-                current_app.logger.error(
-                    f"SMS API failure for {recipient}. "
-                    f"Status: {api_response.get('Value')}"
-                )
-
-        except requests.exceptions.RequestException as error:
-            current_app.logger.error(
-                f"SMS to client_id {client_id} failed due to a "
-                f"network error: {error}"
-            )
-        except (SQLAlchemyError, KeyError) as error:
-            current_app.logger.error(
-                "Unexpected error in send_templated_sms_async for "
-                f"client_id {client_id}: {error}"
-            )
-
-
 def update_team_stats(db: Session, team_id: int):
     "Update average age and provinces of members in a team"
     members = (
@@ -322,57 +256,6 @@ def is_valid_national_id(national_id: str) -> bool:
     return int(national_id[9]) == (r if r < 2 else 11 - r)
 
 
-def send_async_email(
-    app: Flask, client_id: int, subject: str, body: str, mail_config: dict
-):
-    "Send an email asynchronously to a client"
-    with app.app_context():
-        try:
-            with database.get_db_session() as db:
-                client = (
-                    db.query(models.Client)
-                    .filter(models.Client.client_id == client_id)
-                    .first()
-                )
-                if not client:
-                    current_app.logger.error(
-                        f"email error: client with id {client_id} not found."
-                    )
-                    return
-                recipient_email = client.email
-
-            message = MIMEText(body, "html", "utf-8")
-            message["Subject"] = subject
-            message["From"] = mail_config["Username"]
-            message["To"] = str(recipient_email)
-            use_ssl = mail_config.get("UseSSL", False)
-            server_class = smtplib.SMTP_SSL if use_ssl else smtplib.SMTP
-
-            with server_class(
-                mail_config["Server"], mail_config["Port"], timeout=15
-            ) as server:
-                if not use_ssl:
-                    server.starttls()
-
-                server.login(mail_config["Username"], mail_config["Password"])
-                server.sendmail(
-                    mail_config["Username"],
-                    [message["To"]],
-                    message.as_string(),
-                )
-            current_app.logger.info(f"email successfully sent " f"to {recipient_email}")
-
-        except smtplib.SMTPException as error:
-            current_app.logger.error(
-                f"SMTP error for client_id {client_id}: " f"{error}"
-            )
-        except (KeyError, TypeError) as error:
-            current_app.logger.error(
-                f"Unexpected error in send_async_email for client_id "
-                f"{client_id}: {error}"
-            )
-
-
 def is_valid_password(password: str) -> Tuple[bool, Optional[str]]:
     "Validate password complexity requirements"
     if len(password) < 8:
@@ -604,10 +487,79 @@ def get_current_client(allow_inactive: bool = False) -> Optional[models.Client]:
         return None
     try:
         with database.get_db_session() as db:
-            query = db.query(models.Client).filter(models.Client.client_id == client_id)
-            if not allow_inactive:
-                query = query.filter(models.Client.status == models.EntityStatus.ACTIVE)
-            return query.first()
+            client = db.get(models.Client, client_id)
     except SQLAlchemyError as error:
         current_app.logger.error(f"error fetching current client: {error}")
         return None
+    if client is None:
+        return None
+    if not allow_inactive and client.status != models.EntityStatus.ACTIVE:
+        return None
+    return client
+
+
+def _cursor_param(value: Any) -> Optional[int]:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+def chat_message_payload(message: models.ChatMessage) -> dict:
+    "Serialize a chat message the way the chat UI and Socket.IO events expect"
+    return {
+        "message_text": message.message_text,
+        "timestamp": message.timestamp.isoformat(),
+        "message_id": message.message_id,
+        "client_message_id": message.client_message_id,
+        "sender": message.sender,
+    }
+
+
+def chat_history_page(db: Session, client_id: int, args: Mapping[str, Any]) -> dict:
+    "Build one chat history page from ``before``/``after``/``limit`` parameters"
+    limit = _cursor_param(args.get("limit")) or config.chat_history_page_size
+    messages, has_more = database.get_chat_history_by_client_id(
+        db,
+        client_id,
+        before=_cursor_param(args.get("before")),
+        after=_cursor_param(args.get("after")),
+        limit=min(limit, config.chat_history_max_page_size),
+    )
+    return {
+        "messages": [chat_message_payload(message) for message in messages],
+        "has_more": has_more,
+    }
+
+
+def chat_inbox_payload(row: Any) -> dict:
+    "Serialize one chat inbox row with a short preview of the last message"
+    preview = row.message_text or ""
+    if len(preview) > 80:
+        preview = preview[:80] + "…"
+    return {
+        "client_id": row.client_id,
+        "email": row.email,
+        "unread_count": row.unread_count,
+        "last_message_id": row.last_message_id,
+        "last_message_preview": preview,
+        "last_message_sender": row.sender,
+        "last_message_at": row.timestamp.isoformat(),
+    }
+
+
+def chat_inbox_page(db: Session, args: Mapping[str, Any]) -> dict:
+    "Build one admin chat inbox page from ``before``/``limit`` parameters"
+    limit = _cursor_param(args.get("limit")) or config.chat_inbox_page_size
+    rows, has_more = database.get_chat_inbox(
+        db,
+        before=_cursor_param(args.get("before")),
+        limit=min(limit, config.chat_history_max_page_size),
+    )
+    clients = [chat_inbox_payload(row) for row in rows]
+    return {
+        "clients": clients,
+        "has_more": has_more,
+        "next_before": clients[-1]["last_message_id"] if has_more else None,
+    }
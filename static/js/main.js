@@ -55,9 +55,12 @@ const airocupApp = {
       ADMIN_HEADER_NAV: ".admin-header-nav",
       PROVINCE_CHART: "#provinceChart",
       CITY_CHART: "#cityChart",
+      SERVER_METRICS_CHART: "#serverMetricsChart",
       CLIENT_SEARCH_INPUT: "#clientSearchInput",
       CLIENTS_TABLE_BODY: "#clients-table tbody",
       ADMIN_CHAT_CONTAINER: ".admin-chat-container",
+      ADMIN_CHAT_INBOX: ".admin-chat-inbox",
+      SEARCH_SUGGEST_INPUT: "[data-suggest-url]",
       RELATIVE_TIME: "[data-timestamp]",
       POSTER_TRIGGER: ".poster-zoom-trigger",
       POSTER_MODAL: "#posterZoomModal",
@@ -155,6 +158,7 @@ const airocupApp = {
       this.initializeRelativeTime();
       this.initializeSmoothScroll();
       this.initializePosterZoom();
+      this.initializePresenceHeartbeat();
     },
 
     initializeHeaderLayout() {
@@ -461,6 +465,18 @@ const airocupApp = {
         }
       );
     },
+    initializePresenceHeartbeat() {
+      const heartbeatUrl = document.body.dataset.presenceUrl;
+      if (!heartbeatUrl) return;
+      // Keeps a page left open counted as online between navigations.
+      window.setInterval(() => {
+        if (document.hidden) return;
+        fetch(heartbeatUrl, { method: "POST", credentials: "same-origin" }).catch(
+          () => {}
+        );
+      }, 30000);
+    },
+
     initializeRelativeTime() {
       const timeElements = document.querySelectorAll(
         airocupApp.constants.SELECTORS.RELATIVE_TIME
@@ -921,6 +937,11 @@ const airocupApp = {
       isClientView: container.matches(SELECTORS.CLIENT_CHAT_CONTAINER),
       socket: app.helpers.safeSocket(),
       renderedMessages: new Set(),
+      pendingMessages: new Map(),
+      oldestMessageId: null,
+      lastMessageId: null,
+      historyLoaded: false,
+      loadingOlder: false,
     };
 
     if (!state.roomId) {
@@ -976,7 +997,26 @@ const airocupApp = {
       };
     };
 
-    const appendMessage = (message, { isLocal = false } = {}) => {
+    const trackMessageId = (messageId) => {
+      const id = Number(messageId);
+      if (!Number.isInteger(id) || id <= 0) return;
+      if (state.oldestMessageId === null || id < state.oldestMessageId) {
+        state.oldestMessageId = id;
+      }
+      if (state.lastMessageId === null || id > state.lastMessageId) {
+        state.lastMessageId = id;
+      }
+    };
+
+    const historyPageUrl = (params) => {
+      const url = new URL(state.historyUrl, window.location.origin);
+      Object.entries(params).forEach(([key, value]) =>
+        url.searchParams.set(key, value)
+      );
+      return url.toString();
+    };
+
+    const appendMessage = (message, { isLocal = false, prepend = false } = {}) => {
       const rawText = (message?.message_text ?? message?.message ?? "").trim();
       if (!rawText) return;
 
@@ -1002,12 +1042,19 @@ const airocupApp = {
 
       const { iso, display } = resolveTimestamp(message?.timestamp);
       const senderKey = (message?.sender || (isClientMessage ? "client" : "admin")).toLowerCase();
-      const signature = message?.message_id
-        ? `msg-${message.message_id}`
-        : `${rawText}|${senderKey}|${iso}`;
+      const signatures = [];
+      if (message?.message_id) signatures.push(`msg-${message.message_id}`);
+      if (message?.client_message_id) {
+        signatures.push(`cmsg-${message.client_message_id}`);
+      }
+      if (!signatures.length) signatures.push(`${rawText}|${senderKey}|${iso}`);
 
-      if (state.renderedMessages.has(signature)) return;
-      state.renderedMessages.add(signature);
+      if (signatures.some((signature) => state.renderedMessages.has(signature))) {
+        return;
+      }
+      signatures.forEach((signature) => state.renderedMessages.add(signature));
+      trackMessageId(message?.message_id);
+      elements.chatBox.querySelector(".chat-empty-state")?.remove();
 
       const senderElement = document.createElement("span");
       senderElement.className = "chat-message--sender";
@@ -1024,7 +1071,68 @@ const airocupApp = {
       metaElement.textContent = display;
 
       bubble.append(senderElement, textElement, metaElement);
-      elements.chatBox.appendChild(bubble);
+      if (message?.client_message_id) {
+        bubble.dataset.clientMessageId = message.client_message_id;
+      }
+      if (prepend) {
+        elements.chatBox.prepend(bubble);
+      } else {
+        elements.chatBox.appendChild(bubble);
+      }
+    };
+
+    const loadOlderButton = document.createElement("button");
+    loadOlderButton.type = "button";
+    loadOlderButton.className = "btn btn-secondary btn-small chat-load-older";
+    loadOlderButton.textContent = "نمایش پیام‌های قبلی";
+    loadOlderButton.hidden = true;
+    elements.chatBox.before(loadOlderButton);
+
+    const loadOlderMessages = () => {
+      if (state.loadingOlder || state.oldestMessageId === null) return;
+      state.loadingOlder = true;
+      loadOlderButton.disabled = true;
+      const previousHeight = elements.chatBox.scrollHeight;
+
+      app.helpers
+        .fetchJSON(historyPageUrl({ before: state.oldestMessageId }))
+        .then((data) => {
+          const messages = Array.isArray(data?.messages) ? data.messages : [];
+          messages
+            .slice()
+            .reverse()
+            .forEach((message) => appendMessage(message, { prepend: true }));
+          elements.chatBox.scrollTop +=
+            elements.chatBox.scrollHeight - previousHeight;
+          loadOlderButton.hidden = !data?.has_more;
+          app.ui.initializeRelativeTime();
+        })
+        .catch((error) => {
+          console.error("Failed to load older chat messages:", error);
+        })
+        .finally(() => {
+          state.loadingOlder = false;
+          loadOlderButton.disabled = false;
+        });
+    };
+
+    loadOlderButton.addEventListener("click", loadOlderMessages);
+
+    const markRead = () => {
+      if (state.isClientView || !state.socket?.connected) return;
+      if (state.lastMessageId === null) return;
+      state.socket.emit("mark_read", {
+        room: state.roomId,
+        message_id: state.lastMessageId,
+      });
+    };
+
+    const syncMissedMessages = () => {
+      if (!state.socket || !state.historyLoaded) return;
+      state.socket.emit("sync_history", {
+        room: state.roomId,
+        after: state.lastMessageId || 0,
+      });
     };
 
     const sendMessage = () => {
@@ -1042,17 +1150,25 @@ const airocupApp = {
         ? "client"
         : container.querySelector("#personaSelect")?.value || "Admin";
 
-      state.socket.emit("send_message", {
+      // The id lets the server drop a resend of a message it already stored.
+      const clientMessageId = window.crypto?.randomUUID
+        ? window.crypto.randomUUID().replace(/-/g, "")
+        : `${Date.now().toString(36)}${Math.random().toString(36).slice(2)}`;
+      const outgoing = {
         room: state.roomId,
         message: messageText,
         sender,
-      });
+        client_message_id: clientMessageId,
+      };
+      state.pendingMessages.set(clientMessageId, outgoing);
+      state.socket.emit("send_message", outgoing);
 
       appendMessage(
         {
           message_text: messageText,
           timestamp: new Date().toISOString(),
           sender,
+          client_message_id: clientMessageId,
         },
         { isLocal: true }
       );
@@ -1075,6 +1191,11 @@ const airocupApp = {
       state.socket.on("connect", () => {
         setComposerEnabled(true);
         state.socket.emit("join", { room: state.roomId });
+        syncMissedMessages();
+        // Messages the server never confirmed may have been lost with it.
+        state.pendingMessages.forEach((outgoing) =>
+          state.socket.emit("send_message", outgoing)
+        );
       });
 
       state.socket.on("disconnect", () => {
@@ -1086,6 +1207,47 @@ const airocupApp = {
         scrollToBottom();
         app.ui.initializeRelativeTime();
       });
+
+      state.socket.on("message_saved", (payload) => {
+        if (String(payload?.room) !== state.roomId) return;
+        (payload?.messages || []).forEach((saved) => {
+          state.pendingMessages.delete(saved.client_message_id);
+          state.renderedMessages.add(`msg-${saved.message_id}`);
+          trackMessageId(saved.message_id);
+          elements.chatBox
+            .querySelector(`[data-client-message-id="${saved.client_message_id}"]`)
+            ?.classList.remove("is-failed");
+        });
+        if (!document.hidden) markRead();
+      });
+
+      state.socket.on("message_failed", (payload) => {
+        if (String(payload?.room) !== state.roomId) return;
+        elements.chatBox
+          .querySelector(`[data-client-message-id="${payload.client_message_id}"]`)
+          ?.classList.add("is-failed");
+      });
+
+      state.socket.on("chat_history", (payload) => {
+        if (String(payload?.room) !== state.roomId) return;
+        const messages = Array.isArray(payload?.messages) ? payload.messages : [];
+        messages.forEach((message) => appendMessage(message));
+        if (messages.length) {
+          scrollToBottom();
+          app.ui.initializeRelativeTime();
+        }
+        if (payload?.has_more) {
+          syncMissedMessages();
+        } else if (messages.length && !document.hidden) {
+          markRead();
+        }
+      });
+
+      if (!state.isClientView) {
+        document.addEventListener("visibilitychange", () => {
+          if (!document.hidden) markRead();
+        });
+      }
     }
 
     app.helpers
@@ -1093,6 +1255,10 @@ const airocupApp = {
       .then((data) => {
         elements.chatBox.innerHTML = "";
         const messages = Array.isArray(data?.messages) ? data.messages : [];
+        state.historyLoaded = true;
+        loadOlderButton.hidden = !data?.has_more;
+        // Catch anything sent between this fetch and the room join.
+        if (state.socket?.connected) syncMissedMessages();
 
         if (!messages.length) {
           renderStateMessage(
@@ -1531,9 +1697,235 @@ const airocupApp = {
         airocupApp.initializeChat(chatContainer);
       }
 
+      const chatInbox = document.querySelector(
+        airocupApp.constants.SELECTORS.ADMIN_CHAT_INBOX
+      );
+      if (chatInbox) {
+        this.initializeChatInbox(chatInbox);
+      }
+
+      const suggestInput = document.querySelector(
+        airocupApp.constants.SELECTORS.SEARCH_SUGGEST_INPUT
+      );
+      if (suggestInput) {
+        this.initializeSearchSuggest(suggestInput);
+      }
+
       this.initializeAdminMembersPage();
     },
 
+    initializeSearchSuggest(input) {
+      const list = document.getElementById(input.getAttribute("aria-controls"));
+      if (!list) return;
+      const typeLabels = {
+        client: "کاربر",
+        team: "تیم",
+        member: "عضو",
+        payment: "پرداخت",
+      };
+      let controller = null;
+      let activeIndex = -1;
+
+      const items = () => Array.from(list.querySelectorAll("li[data-url]"));
+      const close = () => {
+        list.hidden = true;
+        input.setAttribute("aria-expanded", "false");
+        activeIndex = -1;
+      };
+      const highlight = (index) => {
+        const entries = items();
+        entries.forEach((entry, position) =>
+          entry.classList.toggle("is-active", position === index)
+        );
+        activeIndex = index;
+      };
+
+      const render = (results) => {
+        list.replaceChildren();
+        results.forEach((result) => {
+          const item = document.createElement("li");
+          item.setAttribute("role", "option");
+          item.dataset.url = result.url;
+          if (result.archived) item.classList.add("is-archived");
+
+          const type = document.createElement("span");
+          type.className = "search-suggest__type";
+          type.textContent = typeLabels[result.type] || result.type;
+          const label = document.createElement("span");
+          label.className = "search-suggest__label";
+          label.dir = "auto";
+          label.textContent = result.label;
+          const detail = document.createElement("span");
+          detail.className = "search-suggest__detail";
+          detail.dir = "auto";
+          detail.textContent = result.detail || "";
+
+          item.append(type, label, detail);
+          list.appendChild(item);
+        });
+        list.hidden = results.length === 0;
+        input.setAttribute("aria-expanded", String(!list.hidden));
+        activeIndex = -1;
+      };
+
+      const fetchSuggestions = () => {
+        const query = input.value.trim();
+        controller?.abort();
+        if (query.length < 2) {
+          close();
+          return;
+        }
+        controller = new AbortController();
+        const url = `${input.dataset.suggestUrl}?q=${encodeURIComponent(query)}`;
+        fetch(url, { credentials: "same-origin", signal: controller.signal })
+          .then((response) => (response.ok ? response.json() : null))
+          .then((data) => {
+            if (data && data.query === input.value.trim()) render(data.results);
+          })
+          .catch(() => {});
+      };
+
+      input.addEventListener(
+        "input",
+        airocupApp.helpers.debounce(fetchSuggestions, 150)
+      );
+      input.addEventListener("keydown", (e) => {
+        const entries = items();
+        if (list.hidden || !entries.length) return;
+        if (e.key === "ArrowDown" || e.key === "ArrowUp") {
+          e.preventDefault();
+          const step = e.key === "ArrowDown" ? 1 : -1;
+          highlight((activeIndex + step + entries.length) % entries.length);
+        } else if (e.key === "Enter" && activeIndex >= 0) {
+          e.preventDefault();
+          window.location.href = entries[activeIndex].dataset.url;
+        } else if (e.key === "Escape") {
+          close();
+        }
+      });
+      list.addEventListener("mousedown", (e) => {
+        const item = e.target.closest("li[data-url]");
+        if (item) window.location.href = item.dataset.url;
+      });
+      input.addEventListener("blur", close);
+    },
+
+    initializeChatInbox(table) {
+      const app = airocupApp;
+      const tableBody = table.querySelector("tbody");
+      const moreButton = document.querySelector("[data-inbox-more]");
+      const totalBadge = document.querySelector("[data-inbox-unread-total]");
+      const chatUrl = (clientId) =>
+        (table.dataset.chatUrl || "").replace(/\/0$/, `/${clientId}`);
+
+      const refreshTotal = () => {
+        if (!totalBadge) return;
+        const total = Array.from(
+          tableBody.querySelectorAll("tr[data-client-id]")
+        ).reduce((sum, row) => sum + Number(row.dataset.unreadCount || 0), 0);
+        totalBadge.textContent = app.helpers.toPersianDigits(total);
+      };
+
+      const buildRow = (entry) => {
+        const row = document.createElement("tr");
+        row.dataset.clientId = entry.client_id;
+
+        const emailCell = document.createElement("td");
+        emailCell.textContent = entry.email;
+
+        const previewCell = document.createElement("td");
+        previewCell.dataset.inboxPreview = "";
+        previewCell.dir = "auto";
+
+        const timeCell = document.createElement("td");
+        timeCell.className = "RelativeTime";
+
+        const unreadCell = document.createElement("td");
+        const unreadBadge = document.createElement("span");
+        unreadBadge.dataset.inboxUnread = "";
+        unreadCell.appendChild(unreadBadge);
+
+        const actionCell = document.createElement("td");
+        actionCell.className = "admin-table__actions";
+        const link = document.createElement("a");
+        link.href = chatUrl(entry.client_id);
+        link.className = "btn btn-primary btn-small";
+        link.innerHTML = '<i class="fas fa-eye"></i> مشاهده و پاسخ';
+        actionCell.appendChild(link);
+
+        row.append(emailCell, previewCell, timeCell, unreadCell, actionCell);
+        return row;
+      };
+
+      const fillRow = (row, entry) => {
+        row.dataset.lastMessageId = entry.last_message_id;
+        row.dataset.unreadCount = entry.unread_count;
+        row.querySelector("[data-inbox-preview]").textContent =
+          entry.last_message_preview;
+        const timeCell = row.querySelector(".RelativeTime");
+        timeCell.dataset.timestamp = entry.last_message_at;
+        const unreadBadge = row.querySelector("[data-inbox-unread]");
+        unreadBadge.className = `admin-status ${
+          entry.unread_count ? "admin-status--pending" : "admin-status--idle"
+        }`;
+        unreadBadge.innerHTML = '<i class="fas fa-comment-dots"></i> ';
+        unreadBadge.append(
+          `${app.helpers.toPersianDigits(entry.unread_count)} پیام`
+        );
+      };
+
+      const upsertRow = (entry, { toTop = true } = {}) => {
+        let row = tableBody.querySelector(
+          `tr[data-client-id="${entry.client_id}"]`
+        );
+        if (!row) row = buildRow(entry);
+        fillRow(row, entry);
+        tableBody.querySelector(".admin-table__empty")?.remove();
+        if (toTop) {
+          tableBody.prepend(row);
+        } else if (!row.isConnected) {
+          tableBody.appendChild(row);
+        }
+      };
+
+      const loadMore = () => {
+        const before = moreButton?.dataset.nextBefore;
+        if (!before) return;
+        moreButton.disabled = true;
+        const url = new URL(table.dataset.inboxUrl, window.location.origin);
+        url.searchParams.set("before", before);
+        app.helpers
+          .fetchJSON(url.toString())
+          .then((data) => {
+            (data?.clients || []).forEach((entry) =>
+              upsertRow(entry, { toTop: false })
+            );
+            moreButton.dataset.nextBefore = data?.next_before || "";
+            moreButton.hidden = !data?.has_more;
+            refreshTotal();
+            app.ui.initializeRelativeTime();
+          })
+          .catch((error) => console.error("Failed to load chat inbox:", error))
+          .finally(() => {
+            moreButton.disabled = false;
+          });
+      };
+
+      moreButton?.addEventListener("click", loadMore);
+
+      const socket = app.helpers.safeSocket();
+      if (!socket) return;
+      socket.on("connect", () => {
+        socket.emit("join", { room: "admin_inbox" });
+      });
+      socket.on("inbox_update", (entry) => {
+        if (!entry?.client_id) return;
+        upsertRow(entry);
+        refreshTotal();
+        app.ui.initializeRelativeTime();
+      });
+    },
+
     initializeMenu() {
       const toggleButton = document.querySelector(
         airocupApp.constants.SELECTORS.ADMIN_HEADER_MOBILE_TOGGLE
@@ -1641,6 +2033,9 @@ const airocupApp = {
       const cityCanvas = document.querySelector(
         airocupApp.constants.SELECTORS.CITY_CHART
       );
+      const metricsCanvas = document.querySelector(
+        airocupApp.constants.SELECTORS.SERVER_METRICS_CHART
+      );
 
       const createChart = (canvas, chartData, type, label, indexAxis = "x") => {
         if (!canvas) return;
@@ -1683,6 +2078,27 @@ const airocupApp = {
           const data = await airocupApp.helpers.fetchJSON(endpoint);
           createChart(cityCanvas, data, "bar", "تعداد شرکت‌کنندگان", "y");
         }
+        if (metricsCanvas) {
+          const endpoint =
+            metricsCanvas.dataset.endpoint || "/API/admin/ServerMetrics";
+          const data = await airocupApp.helpers.fetchJSON(endpoint);
+          new Chart(metricsCanvas.getContext("2d"), {
+            type: "line",
+            data: {
+              labels: data.labels,
+              datasets: [
+                { label: "CPU %", data: data.cpu_percent, borderColor: "#3182ce" },
+                { label: "RAM %", data: data.ram_percent, borderColor: "#805ad5" },
+              ],
+            },
+            options: {
+              responsive: true,
+              maintainAspectRatio: false,
+              elements: { point: { radius: 0 } },
+              scales: { y: { min: 0, max: 100 } },
+            },
+          });
+        }
       } catch (error) {
         console.error("Failed to load chart data:", error);
         airocupApp.ui.createFlash("error", "خطا در بارگذاری داده‌های نمودار.");